@@ -0,0 +1,411 @@
+'''
+    Асинхронный интерфейс СУБД SQLMY для asyncio
+
+    Операции соединений sqlmy выполняются в исполнителе - пуле потоков
+    ограниченного размера, поэтому файловые операции СУБД не останавливают
+    цикл событий. Результат выборки курсора получается асинхронным
+    итератором (async for) порциями по CURSOR_ARRAY_SIZE записей
+
+    Пользователь СУБД может:
+        1) Выбрать базу данных для функций модуля - setDB
+        2) Исполнить запрос - exec
+        3) Построчно получить результат выборки - cursor
+        4) Загрузить записи в таблицу из файла CSV или JSON Lines - load
+        5) Открыть своё соединение (для транзакций, подготовленных запросов) - connect
+
+    Функции модуля выполняют запросы соединениями пула sqlmy.Pool выбранной БД,
+    поэтому одновременные выборки разных задач выполняются разными соединениями
+    под разделяемой блокировкой БД, а не ждут друг друга в одном соединении.
+    Открытый курсор держит разделяемую блокировку БД, пока он не закрыт
+    (async with, close), изменения БД ждут закрытия курсоров
+'''
+
+
+import asyncio
+import concurrent.futures
+import functools
+import sqlmy
+
+
+
+# Число потоков исполнителя, в которых выполняются запросы
+EXECUTOR_WORKERS = 4
+
+
+# Исполнитель запросов, создаётся при первом запросе (см. getExecutor)
+executor = None
+
+
+# Исполнитель получения записей курсоров: курсор держит блокировку БД,
+# поэтому записи получаются не в общем исполнителе, все потоки которого
+# могут ждать снятия этой блокировки
+cursor_executor = None
+
+
+# Пул соединений БД, выбранной для функций модуля (см. setDB)
+pool = None
+
+
+
+
+
+def getExecutor():
+    '''
+        Получение исполнителя запросов, при первом вызове он создаётся
+
+        return - исполнитель (concurrent.futures.ThreadPoolExecutor)
+    '''
+
+    global executor, cursor_executor
+
+    if executor == None:
+        executor = concurrent.futures.ThreadPoolExecutor(EXECUTOR_WORKERS, 'sqlaio')
+        cursor_executor = concurrent.futures.ThreadPoolExecutor(1, 'sqlaio-cursor')
+
+    return executor
+
+
+
+async def run(function, *args, isCursor=False):
+    '''
+        Выполнение блокирующей функции sqlmy в исполнителе
+
+        function - функция
+        args - аргументы функции
+        isCursor - True - получение записей курсора или его закрытие (см. cursor_executor)
+
+        return - результат функции
+    '''
+
+    getExecutor()
+    return await asyncio.get_running_loop().run_in_executor(
+        cursor_executor if isCursor else executor, functools.partial(function, *args))
+
+
+
+class Cursor:
+    '''
+        Асинхронный курсор для построчного получения результата выборки,
+        записи получаются из курсора sqlmy порциями
+
+        schema - имена выбираемых полей
+    '''
+
+    def __init__(self, cursor, release=None):
+        self.schema = cursor.schema
+        self._cursor = cursor
+        self._release = release
+        self._records = []
+
+
+    def __aiter__(self):
+        return self
+
+
+    async def __anext__(self):
+        if self._records == []:
+            self._records = await self.fetchmany()
+            if self._records == []:
+                raise StopAsyncIteration
+
+        return self._records.pop(0)
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+    async def fetchone(self):
+        '''
+            Получение следующей записи
+
+            return - кортеж значений полей или None, если записи закончились
+        '''
+
+        records = await self.fetchmany(1)
+        return records[0] if records != [] else None
+
+
+    async def fetchmany(self, size=sqlmy.CURSOR_ARRAY_SIZE):
+        '''
+            Получение следующих записей
+
+            size - наибольшее число записей
+
+            return - список кортежей значений полей
+        '''
+
+        records = self._records[:size]
+        del self._records[:size]
+        if len(records) < size and self._cursor != None:
+            records += await run(self._cursor.fetchmany, size - len(records), isCursor=True)
+            if len(records) < size:
+                await self.close()
+
+        return records
+
+
+    async def fetchall(self):
+        '''
+            Получение всех оставшихся записей
+
+            return - список кортежей значений полей
+        '''
+
+        records = self._records
+        self._records = []
+        if self._cursor != None:
+            records += await run(self._cursor.fetchall, isCursor=True)
+            await self.close()
+
+        return records
+
+
+    async def close(self):
+        '''
+            Завершение выборки, освобождение блокировки БД
+
+            return None
+        '''
+
+        if self._cursor == None:
+            return
+
+        cursor = self._cursor
+        self._cursor = None
+        self._records = []
+        await run(cursor.close, isCursor=True)
+        if self._release != None:
+            await run(self._release, isCursor=True)
+
+
+
+class Statement:
+    '''
+        Асинхронный подготовленный запрос (см. sqlmy.Statement)
+
+        query - текст запроса
+        params - число параметров
+    '''
+
+    def __init__(self, statement):
+        self.query = statement.query
+        self.params = statement.params
+        self._statement = statement
+
+
+    async def execute(self, *params):
+        '''
+            Выполнение запроса
+
+            params - значения параметров
+
+            return - для SELECT - результат выборки (см. sqlmy.exec), иначе None
+        '''
+
+        return await run(self._statement.execute, *params)
+
+
+    async def cursor(self, *params):
+        '''
+            Выполнение запроса SELECT с построчным получением результата
+
+            params - значения параметров
+
+            return - курсор (см. Cursor)
+        '''
+
+        return Cursor(await run(self._statement.cursor, *params))
+
+
+
+class Connection:
+    '''
+        Асинхронное соединение с СУБД (см. sqlmy.Connection),
+        операции соединения выполняются в исполнителе по очереди
+
+        database_name - имя выбранной БД или None
+    '''
+
+    def __init__(self, connection):
+        self._connection = connection
+
+
+    @property
+    def database_name(self):
+        return self._connection.database_name
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+    async def setDB(self, database_name):
+        '''
+            Выбор базы данных для выполнения запросов
+
+            database_name - имя базы данных
+
+            return None
+        '''
+
+        await run(self._connection.setDB, database_name)
+
+
+    async def exec(self, querys):
+        '''
+            Парсинг SQL запросов (см. sqlmy.exec)
+
+            querys - SQL запросы, разделённые ;
+
+            return - результат выборки для SELECT, иначе None
+        '''
+
+        return await run(self._connection.exec, querys)
+
+
+    async def cursor(self, query):
+        '''
+            Выполнение запроса SELECT с построчным получением результата
+
+            query - один запрос SELECT
+
+            return - курсор (см. Cursor)
+        '''
+
+        return Cursor(await run(self._connection.cursor, query))
+
+
+    async def load(self, table_name, path, file_format=None):
+        '''
+            Массовая загрузка записей в таблицу текущей БД из файла (см. sqlmy.load)
+
+            return - число загруженных записей
+        '''
+
+        return await run(self._connection.load, table_name, path, file_format)
+
+
+    async def prepare(self, query):
+        '''
+            Подготовка запроса с параметрами ? (см. sqlmy.prepare)
+
+            query - один SQL запрос
+
+            return - подготовленный запрос (см. Statement)
+        '''
+
+        return Statement(await run(self._connection.prepare, query))
+
+
+    async def close(self):
+        '''
+            Закрытие соединения (см. sqlmy.Connection.close)
+
+            return None
+        '''
+
+        await run(self._connection.close)
+
+
+
+async def connect(database_name=None):
+    '''
+        Открытие соединения с СУБД
+
+        database_name - имя выбираемой базы данных или None
+
+        return - соединение (см. Connection)
+    '''
+
+    return Connection(await run(sqlmy.Connection, database_name))
+
+
+
+async def setDB(database_name, size=EXECUTOR_WORKERS, idle_timeout=sqlmy.POOL_IDLE_TIMEOUT):
+    '''
+        Выбор базы данных для функций модуля: создание пула соединений БД,
+        пул прежней БД закрывается
+
+        database_name - имя базы данных
+        size - наибольшее число соединений пула
+        idle_timeout - время простоя соединения пула в секундах
+
+        return None
+    '''
+
+    global pool
+
+    new_pool = sqlmy.Pool(database_name, size, idle_timeout)
+
+    # Проверка, что БД существует
+    await run(lambda: new_pool.release(new_pool.acquire()))
+
+    if pool != None:
+        await run(pool.close)
+    pool = new_pool
+
+
+
+async def exec(querys):
+    '''
+        Парсинг SQL запросов соединением пула выбранной БД,
+        без выбранной БД - соединением по умолчанию sqlmy (см. sqlmy.exec)
+
+        querys - SQL запросы, разделённые ;
+
+        return - результат выборки для SELECT, иначе None
+    '''
+
+    if pool == None:
+        return await run(sqlmy.exec, querys)
+
+    return await run(pool.exec, querys)
+
+
+
+async def cursor(query):
+    '''
+        Выполнение запроса SELECT с построчным получением результата
+        соединением пула выбранной БД, соединение возвращается в пул
+        при закрытии курсора
+
+        query - один запрос SELECT
+
+        return - курсор (см. Cursor)
+    '''
+
+    if pool == None:
+        raise sqlmy.SQLMY_Exception('Не выбрана БД !')
+
+    query_pool = pool
+    connection = await run(query_pool.acquire)
+    try:
+        query_cursor = await run(connection.cursor, query)
+    except:
+        await run(query_pool.release, connection)
+        raise
+
+    return Cursor(query_cursor, functools.partial(query_pool.release, connection))
+
+
+
+async def load(table_name, path, file_format=None):
+    '''
+        Массовая загрузка записей в таблицу выбранной БД из файла (см. sqlmy.load)
+
+        return - число загруженных записей
+    '''
+
+    if pool == None:
+        return await run(sqlmy.load, table_name, path, file_format)
+
+    return await run(pool.load, table_name, path, file_format)
@@ -0,0 +1,210 @@
+'''
+    Замер пропускной способности чтения СУБД SQLMY
+    при одновременной работе нескольких соединений
+
+    Каждый читатель открывает своё соединение (см. sqlmy.connect)
+    и выполняет выборки с условием по полю без индекса, кеш результатов
+    выборок отключается, чтобы замерялось чтение таблицы, читатели
+    запускаются в потоках одного процесса и в отдельных процессах.
+    Выборки соединений и потоков, и процессов выполняются одновременно
+    под разделяемой блокировкой БД, но байт-код Python потоки одного
+    процесса исполняют по очереди (GIL), поэтому в потоках параллельно
+    идёт только ожидание ввода-вывода, а разбор записей - в отдельных процессах
+
+    Запуск:
+        python sqlbench.py [число записей] [длительность замера в секундах] [TEXT|PAGE]
+'''
+
+
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import sqldb
+import sqlmy
+
+
+
+# Имя БД для замера, создаётся в текущем каталоге и удаляется после замера
+BENCH_DB_NAME = 'sqlbench'
+
+
+# Число одновременных читателей в замерах
+BENCH_READERS = (1, 2, 4, 8)
+
+
+# Число записей, вставляемых одним запросом INSERT
+BENCH_INSERT_SIZE = 1000
+
+
+# Число различных значений поля выборки
+BENCH_VALUES = 100
+
+
+
+
+
+
+def createBenchDB(records, storage):
+    '''
+        Создание БД для замера с таблицей bench
+
+        records - число записей таблицы
+        storage - формат хранения БД: TEXT или PAGE
+
+        return None
+    '''
+
+    dropBenchDB()
+
+    connection = sqlmy.connect()
+    connection.exec('CREATE DATABASE {0} {1}'.format(BENCH_DB_NAME, storage))
+    connection.exec('CREATE TABLE bench (id integer primary_key, val integer, name string)')
+    for start in range(0, records, BENCH_INSERT_SIZE):
+        connection.exec('INSERT INTO bench (id, val, name) VALUES ' + ', '.join(
+            "({0}, {1}, 'name {0}')".format(i, i % BENCH_VALUES)
+            for i in range(start, min(start + BENCH_INSERT_SIZE, records))))
+    connection.close()
+
+
+
+def dropBenchDB():
+    '''
+        Удаление БД замера и её файла блокировки
+
+        return None
+    '''
+
+    for path in [BENCH_DB_NAME + ext for ext in ('.db', '.dbp', '.wal', '.lock')]:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+
+
+def readBench(ready, duration, seed):
+    '''
+        Выполнение выборок своим соединением в течение замера,
+        замер начинается, когда все читатели открыли соединения
+
+        ready - барьер читателей (threading.Barrier, multiprocessing.Barrier)
+        duration - длительность замера в секундах
+        seed - начальное значение генератора значений условия
+
+        return - число выполненных выборок
+    '''
+
+    # Повторяющиеся выборки иначе читались бы из кеша результатов,
+    # общего для соединений процесса
+    sqldb.RESULT_CACHE_MAX_SIZE = 0
+
+    values = random.Random(seed)
+    with sqlmy.connect(BENCH_DB_NAME) as connection:
+        statement = connection.prepare('SELECT bench.id, bench.name FROM bench WHERE bench.val = ?')
+
+        ready.wait()
+        end_time = time.time() + duration
+        count = 0
+        while time.time() < end_time:
+            statement.execute(values.randrange(BENCH_VALUES))
+            count += 1
+
+    return count
+
+
+
+def processReader(ready, duration, seed, counts):
+    '''
+        Читатель в отдельном процессе
+
+        ready, duration, seed - см. readBench
+        counts - разделяемый массив чисел выборок читателей (multiprocessing.Array)
+
+        return None
+    '''
+
+    counts[seed] = readBench(ready, duration, seed)
+
+
+
+def threadsBench(readers, duration):
+    '''
+        Замер выборок читателей в потоках одного процесса
+
+        readers - число читателей
+        duration - длительность замера в секундах
+
+        return - число выборок в секунду
+    '''
+
+    ready = threading.Barrier(readers)
+    counts = [0] * readers
+
+    def reader(i):
+        counts[i] = readBench(ready, duration, i)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return sum(counts) / duration
+
+
+
+def processesBench(readers, duration):
+    '''
+        Замер выборок читателей в отдельных процессах
+
+        readers - число читателей
+        duration - длительность замера в секундах
+
+        return - число выборок в секунду
+    '''
+
+    ready = multiprocessing.Barrier(readers)
+    counts = multiprocessing.Array('i', readers)
+
+    processes = [multiprocessing.Process(target=processReader, args=(ready, duration, i, counts))
+                 for i in range(readers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    return sum(counts) / duration
+
+
+
+def main(argv):
+    '''
+        Замер чтения при разном числе читателей
+
+        argv - аргументы командной строки
+
+        return None
+    '''
+
+    records = int(argv[1]) if len(argv) > 1 else 10000
+    duration = float(argv[2]) if len(argv) > 2 else 2
+    storage = argv[3].upper() if len(argv) > 3 else 'TEXT'
+
+    createBenchDB(records, storage)
+    try:
+        print('записей: {0}, формат: {1}, замер: {2} с'.format(records, storage, duration))
+        print('{0:>10} {1:>16} {2:>16}'.format('читателей', 'потоки, 1/с', 'процессы, 1/с'))
+        for readers in BENCH_READERS:
+            print('{0:>10} {1:>16.1f} {2:>16.1f}'.format(
+                readers, threadsBench(readers, duration), processesBench(readers, duration)))
+    finally:
+        dropBenchDB()
+
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -2,8 +2,11 @@
 	Реализация функционала работы СУБД
 	на уровне файлов
 
-	БД представляется в виде файла,
-	который имеет следующую структуру:
+	БД представляется в виде каталога db_name.db, в котором
+	находятся файл схем таблиц catalog и отдельный файл для каждой таблицы
+	(table_name.db), поэтому изменение таблицы затрагивает только её файл
+
+	Файл схем таблиц catalog имеет следующую структуру:
 
 	TABLE_NAME = table_name_1
 	#SCHEMA
@@ -11,833 +14,5276 @@
 		(attr_name, attr_type, attr_attr),
 		(...)
 	}
+	#STATS
+	{
+		ROWS = число записей
+		(attr_name, число различных значений, число null, min, max),
+		(...)
+	}
+
+	Раздел #STATS есть только у таблиц, для которых собрана статистика (см. analyze)
+
+	Файл таблицы table_name_1.db содержит тело таблицы:
+
 	#BODY
 	{
 		((attr_val_1, attr_name_1), (attr_val_2, attr_name_2)),
 		((...), (...))
 	}
 
+	В памяти запись таблицы - кортеж значений полей в виде, в котором они
+	хранятся в БД ('null', '5', '\'vlad\''), в порядке полей схемы таблицы:
+	имена полей хранятся только в схеме, поля записи выбираются по номеру (см. recordParse)
+
 	Доступны ограничения: 
 		Primary Key, 
 		Unique, 
 		null (пишется в нижнем регистре)
 
+	Новые записи не вставляются в тело таблицы сразу, а дописываются
+	в конец файла-хвоста таблицы (table_name.tail), каждая строка которого имеет вид:
+
+	((attr_val_1, attr_name_1), (attr_val_2, attr_name_2))
+
+	При чтении записи хвоста подмешиваются в конец тела таблицы,
+	а при любой перезаписи файла таблицы (или при переполнении хвоста)
+	хвост уплотняется - переносится в раздел #BODY
+
+	БД в прежнем формате (все таблицы в одном файле db_name.db и общий хвост
+	db_name.tail) при выборе переводится в каталог - splitDB
+
+	БД может храниться и в двоичном страничном формате (db_name.dbp, см. sqlpage),
+	формат выбирается при создании БД, текстовую БД можно преобразовать
+	в страничную - convertDB. Все функции модуля работают с обоими форматами
+
+	Изменения, выполненные между begin и commit, накапливаются в памяти,
+	rollback их отбрасывает. Изменение схемы БД фиксирует транзакцию.
+	Изменение вне транзакции выполняется отдельной транзакцией
+
+	При фиксации транзакции её изменения дописываются одной записью
+	в журнал (db_name.db/wal, для страничной БД - db_name.wal)
+	и сбрасываются на диск, каждая строка журнала имеет вид:
+
+	I	table_name_1	((attr_val_1, attr_name_1), (attr_val_2, attr_name_2))
+	D	table_name_1	номер удалённой записи
+	U	table_name_1	номер обновлённой записи	((...), (...))
+	COMMIT
+
+	Изменения из журнала хранятся в памяти и подмешиваются при чтении таблиц,
+	при переполнении журнала они переносятся в файлы БД (checkpoint),
+	после чего журнал очищается. При выборе БД изменения из журнала
+	восстанавливаются (recoverDB)
+
+	Состояние работы с БД (выбор БД, каталог, индексы, транзакция) хранится
+	отдельно для каждого потока (session), соединения sqlmy загружают в поток
+	своё состояние (setSessionState), поэтому соединения разных потоков
+	работают одновременно, а их работу с одной БД согласует блокировка
+	файла db_name.lock (lockDB)
+
+	По полю таблицы можно построить вторичный индекс (createIndex) - файл
+	index_name.idx в каталоге БД (db_name.index_name.idx для страничной БД),
+	который начинается заголовком
+
+	TABLE_NAME = table_name_1
+	ATTR_NAME = attr_name_1
+
+	и далее содержит строки "значение<TAB>номер записи в теле таблицы",
+	отсортированные по значению; новые записи дописываются в конец файла
+	отдельной отсортированной серией. Индекс поддерживается при изменении
+	записей и используется для поиска записей по условиям =, <, >
+
+	Таблица, которую читают целиком, хранится в памяти в колоночном кеше
+	(readColumns): поля integer - массивами чисел с маской null, остальные -
+	номерами значений в словаре различных значений поля. Условия where
+	проверяются сразу для всей колонки, кеш сбрасывается при изменении таблицы
+
+	Полное чтение большой таблицы текстовой БД в запросе select без соединений
+	выполняется параллельно (parallelScan): тело таблицы делится на части
+	по границам строк, части разбираются, отбираются по условиям и
+	проецируются в пуле процессов, результаты объединяются в порядке частей
+
+	Выборка выполняется по плану (planSelect): способ чтения каждой таблицы,
+	порядок соединения таблиц по оценкам числа их записей и способ
+	соединения - вложенными циклами, поиском по индексу поля соединения
+	или хеш-соединением. Из записей таблиц сразу отбираются только нужные
+	поля. План с оценочным и действительным числом записей узлов
+	выводит запрос EXPLAIN SELECT (explain)
+
+	Статистика таблицы (число записей, для каждого поля - число различных
+	значений, число null, наименьшее и наибольшее значения integer)
+	собирается запросом ANALYZE (analyze) и хранится в каталоге. При фиксации
+	изменений статистика приблизительно уточняется по изменённым записям
+	(updateStats) и записывается в каталог при переносе изменений из журнала.
+	По статистике оцениваются доли записей, удовлетворяющих условиям, и число
+	записей соединений, а COUNT(*) получает число записей без чтения таблицы (count)
+
+	Результаты выборок select хранятся в общем для соединений процесса кеше
+	результатов вместе с версиями прочитанных таблиц (tableVersion) и
+	возвращаются повторно, пока версии не изменились. Версия таблицы
+	меняется только при изменении самой таблицы, поэтому изменение одной
+	таблицы не сбрасывает результаты выборок из других таблиц
+
 	ВАЖАНО:
 	    - принято решение откзаться от внешних ключей ввиду избежать сильного увеличения кода
-	    - прянято решение отказаться от раздела where в операторе select, чтобы уменьшить размер кода
 '''
 
 
+import array
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import multiprocessing
 import os
+import pickle
 import re
+import shutil
+import sys
+import tempfile
+import threading
+import sqlpage
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+
+
+# Пул процессов параллельного чтения таблиц (см. parallelScan),
+# создаётся при первом параллельном чтении и не зависит от выбранной БД
+scan_executor = None
+
+
+# Блокировка создания пула процессов параллельного чтения для потоков процесса
+scan_executor_lock = threading.Lock()
+
+
+# Кеш результатов выборок (см. select), общий для всех соединений процесса:
+# результат хранится с версиями прочитанных таблиц (см. tableVersion),
+# давно не использованные результаты вытесняются первыми
+# пример: {
+# 	('/path/db_name', "(...)") : {    # путь к БД, запрос (см. select)
+# 		'versions' : {'table_name_1' : (...)},
+# 		'result'   : {'schema' : [...], 'body' : [...]},
+# 		'size'     : 4096             # оценка размера результата в байтах
+# 	}
+# }
+result_cache = collections.OrderedDict()
+
+
+# Суммарный размер результатов в кеше результатов в байтах
+result_cache_size = 0
+
 
+# Блокировка кеша результатов: соединения разных потоков читают
+# и пополняют его одновременно
+result_cache_lock = threading.Lock()
 
 
-# Имя текущей БД
-current_db_name = None
+# Журнал сообщений модуля: отброшенные при восстановлении БД строки журнала изменений
+logger = logging.getLogger(__name__)
 
 
-# Расширение файла БД
+# Расширение каталога БД и файлов таблиц в нём
 DB_EXTENSION = '.db'
 
 
-# Имя временной БД, которая используется как промежуточная
-# Для выполнения некоторых операций
-DB_TEMP_NAME = 'temp.db'
+# Имя файла схем таблиц в каталоге БД
+DB_CATALOG_NAME = 'catalog'
 
 
-# Шаблон имени таблицы для регулярных выражений
-TABLE_NAME_PATTERN = r'[\w_]+'
+# Расширение файла страничной БД
+DB_PAGE_EXTENSION = '.dbp'
 
 
+# Форматы хранения БД: текстовый и страничный
+DB_STORAGE_TEXT = 'text'
+DB_STORAGE_PAGE = 'page'
 
 
+# Формат хранения новых БД
+DB_STORAGE = DB_STORAGE_TEXT
 
-class SQL_DB_Exception(Exception):
-	'''
-		Исключение для отлова ошибок работы с файлами БД
-	'''
-	
-	def __init__(self, message, tmp_db=None):
-		global DB_TEMP_NAME
 
-		if tmp_db != None:
-			tmp_db.__exit__()
-			os.remove(DB_TEMP_NAME)
+# Расширение файла вторичного индекса
+DB_INDEX_EXTENSION = '.idx'
 
-		super().__init__(message)
 
+# Расширение файла хвоста таблицы, в который дописываются новые записи
+DB_TAIL_EXTENSION = '.tail'
 
 
+# Размер хвоста таблицы в байтах, при превышении которого он уплотняется
+TAIL_MAX_SIZE = 1024 * 1024
 
 
-def setDB(db_name):
-	'''
-	    Выбор БД для выполнения запросов
+# Имя журнала в каталоге БД и расширение журнала страничной БД
+DB_WAL_NAME = 'wal'
+DB_WAL_EXTENSION = '.wal'
 
-	    db_name - имя БД
 
-	    return None
-	'''
+# Размер журнала в байтах, при превышении которого
+# изменения из него переносятся в файлы БД
+WAL_MAX_SIZE = 4 * 1024 * 1024
 
-	global current_db_name
 
-	if not os.path.isfile(db_name + DB_EXTENSION):
-		raise SQL_DB_Exception('БД с именем \'{0}\' не существует !'.format(db_name))
-	
-	current_db_name = db_name
+# Расширение файла блокировки БД (db_name.lock), на который соединения
+# (см. sqlmy.Connection) ставят разделяемую блокировку для чтения
+# и исключительную для изменения БД, в файле хранится номер версии БД
+DB_LOCK_EXTENSION = '.lock'
 
 
+# Расширение временного файла, в который перезаписывается файл таблицы
+# (файл схем) и который затем заменяет его
+DB_TEMP_EXTENSION = '.tmp'
 
-def serializeAttr(attr):
-	'''
-		Сериализация атрибутов поля таблицы
 
-		attr - атрибуты поля = {
-   		 	     'primary key' : True/False,
-	   		 	 'unique'      : True/False,
-	   		 	 'null'        : True/False
-			   }
+# Доли записей, удовлетворяющих условию с операцией, для оценки
+# числа записей выборки при выборе плана (см. planSelect)
+CONDITION_SELECTIVITY = {'=' : 0.1, '<>' : 0.9, '<' : 0.3, '>' : 0.3}
 
-		return - сериализованные атрибуты поля,
-				 пример: 'pk:1;u:0;n:0'
-	'''
 
-	return 'pk:{0};u:{1};n:{2}'.format(
-		   int(attr['primary key']), int(attr['unique']), int(attr['null']))
+# Наибольшая оценка числа записей присоединяемой таблицы,
+# при которой она соединяется вложенными циклами (см. planJoin)
+NESTED_LOOP_MAX_RECORDS = 16
 
 
+# Наибольшее число записей, которые соединение держит в памяти:
+# если хеш-таблица получается больше, записи соединяются слиянием,
+# сортируясь частями такого размера во временных файлах (см. joinTables)
+JOIN_HASH_MAX_RECORDS = 500000
 
-def unserializeAttr(attr):
-	'''
-		Дисериализация атрибутов поля таблицы
 
-		attr - атрибуты поля = 'pk:0/1;u:0/1;n:0/1'
+# Число записей в блоке временного файла отсортированной части при соединении
+# слиянием: в памяти при слиянии держится по блоку от каждой части
+JOIN_RUN_BLOCK_RECORDS = 1000
 
-		return - дисериализованные атрибуты поля,
-				 пример: {
-	   		 	     'primary key' : True,
-		   		 	 'unique'      : False,
-		   		 	 'null'        : False
-			     }
-	'''
 
-	return {
-		'primary key' : bool(int(attr[3])),
-		'unique'      : bool(int(attr[7])),
-		'null'        : bool(int(attr[11]))
-	}
+# Наибольшее отношение оценки числа соединяемых записей к числу записей
+# присоединяемой таблицы, при котором записи таблицы ищутся
+# по индексу поля соединения (см. planJoin)
+INDEX_JOIN_MAX_RATIO = 0.01
 
 
+# Наибольший размер тела таблицы в байтах, при котором таблица
+# хранится в колоночном кеше (см. readColumns), 0 - кеш не используется
+COLUMN_CACHE_MAX_SIZE = 64 * 1024 * 1024
 
-def recordParse(record):
-	'''
-		Парсинг записи таблицы
 
-		record - запись из тела таблицы
+# Число записей, значения которых выбираются из колоночного кеша за один шаг
+COLUMN_SCAN_CHUNK = 65536
 
-		return - атрибуты записи в удобной структуре,
-			     пример:
-			     record = ((name, vlad), (id, 5), (ord_number, 3255))
-			     return = (
-			     	{
-						'attr_name'  : 'name',
-						'value'      : 'vlad'
-			     	},
-			     	{
-						'attr_name'  : 'id',
-						'value'      : '5'
-			     	},
-			     	{
-						'attr_name'  : 'ord_number',
-						'value'      : '3255'
-			     	}
-			     )
-	'''
 
-	attrs = [attr for attr in record[2:-2].split("), (")]
-	result = [{'attr_name':attr.split(', ')[0], 'value':attr.split(', ')[1]} for attr in attrs]
-	return tuple(result)
+# Размер тела таблицы в байтах, начиная с которого записи таблицы
+# разбираются параллельно в пуле процессов (см. parallelScan)
+PARALLEL_SCAN_MIN_SIZE = 16 * 1024 * 1024
 
 
+# Число процессов параллельного чтения таблиц, None - по числу ядер процессора
+PARALLEL_SCAN_WORKERS = None
 
-def recordUnparse(struct):
-	'''
-		Преобразование структуры атрибутов в запись таблицы
 
-		struct - структура с атрибутами
+# Число частей, на которые делится тело таблицы, на один процесс:
+# части меньше - процессы загружены равномернее
+PARALLEL_SCAN_PARTS = 4
 
-		return - запись тела таблицы,
-			     пример:
-			     struct = (
-			     	{
-						'attr_name'  : 'name',
-						'value'      : 'vlad'
-			     	},
-			     	{
-						'attr_name'  : 'id',
-						'value'      : '5'
-			     	},
-			     	{
-						'attr_name'  : 'ord_number',
-						'value'      : '3255'
-			     	}
-			     )
-			     return = ((name, vlad), (id, 5), (ord_number, 3255))
-	'''
 
-	result = ', '.join(['('+attr['attr_name']+', '+str(attr['value'])+')' for attr in struct])
-	return '('+result+')'
+# Наибольший суммарный размер результатов в кеше результатов выборок
+# в байтах (см. select), 0 - кеш не используется
+RESULT_CACHE_MAX_SIZE = 64 * 1024 * 1024
 
 
+# Форматы файлов для массовой загрузки записей (см. load)
+LOAD_FORMAT_CSV = 'csv'
+LOAD_FORMAT_JSONL = 'jsonl'
 
-def readTableSchema(table_name):
-	'''
-		Считать схему из таблицы
 
-		table_name - имя таблицы
+# Шаблон имени таблицы для регулярных выражений
+TABLE_NAME_PATTERN = r'[\w_]+'
 
-		return - схема таблицы
-				 [
-					 {'name' : 'name_attr',
-					  'type' : 'type_attr' (integer/string),
-					  'attr' : {
-						 'primary key' : True/False,
-						 'unique'      : True/False,
-						 'null'        : True/False
-					  }
-					 }, {...}
-				 ]
-	'''
 
-	global current_db_name
+# Шаблон блока таблицы в отображённом в память файле схем:
+# имя таблицы, строка схемы и, если собрана статистика, число записей
+# и строка статистики полей
+TABLE_BLOCK_PATTERN = re.compile(rb'^TABLE_NAME = ([^\r\n]+?)[ \t]*\r?\n'
+								 rb'#SCHEMA\s*\{\s*(\([^\r\n]*\))\s*\}'
+								 rb'(?:\s*#STATS\s*\{\s*ROWS = (\d+)\s*(\([^\r\n]*\))\s*\})?', re.M)
 
-	# Если БД не выбрана
-	if current_db_name == None:
-		raise SQL_DB_Exception('Не выбрана БД !')
 
-	# Поиск таблицы
-	isTableFind = False
-	isSchemaRead = False
-	with open(current_db_name + DB_EXTENSION, 'r') as db:
-		for line in db:
-			# Проверка существования таблицы в БД
-			if 'TABLE_NAME = ' + table_name == line.strip():
-				isTableFind = True
-				isSchemaRead = True
-			elif isSchemaRead and (line.startswith('\t(')):
-				# Чтение схемы
-				table_schema = []
-				# Убрать лишние пробелы
-				line = re.sub(r' ', '', line.strip())
-				# Вставить между атрибутами разделитель
-				line = re.sub(r'\),\(', '|', line)[1:-1]
-				for attr in line.split('|'):
-					attr = attr.split(',')
-					table_schema.append({
-						'name' : attr[0].strip(),
-						'type' : attr[1].strip(),
-						'attr' : unserializeAttr(attr[2].strip())
-					})
-				# Схема найдена
-				break
+# Шаблон записи тела таблицы в отображённом в память файле таблицы
+RECORD_PATTERN = re.compile(rb'^[ \t]*(\(\(.*\)\))[ \t\r]*$', re.M)
 
-	# Если таблица не найдена
-	if not isTableFind:
-		raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.
-							   format(table_name))
 
-	return table_schema
+# Шаблон поля записи: имя поля и значение, строка в кавычках читается
+# целиком и может содержать '), (' (кавычек в значениях не бывает)
+RECORD_ATTR_PATTERN = re.compile(r"\(([\w_]+), ('[^']*'|[^,()'\r\n]*)\)")
 
 
+# Шаблон записи целиком для проверки записей журнала изменений
+RECORD_CHECK_PATTERN = re.compile(r"\(\([\w_]+, (?:'[^']*'|[^,()'\r\n]*)\)"
+								  r"(?:, \([\w_]+, (?:'[^']*'|[^,()'\r\n]*)\))*\)")
 
-def attrIsInteger(table_schema, attr_name):
-	'''
-		Проверка: тип поля integer ?
 
-		table_schema - схема таблицы
-		attr_name - имя поля
 
-		return - True/False
-	'''
 
-	for attr in table_schema:
-		if attr['name'] == attr_name and attr['type'] == 'integer':
-			return True
 
-	return False
+class SQL_DB_Exception(Exception):
+	'''
+		Исключение для отлова ошибок работы с файлами БД
+	'''
+	
+	def __init__(self, message, tmp_db=None):
+		if tmp_db != None:
+			tmp_db.close()
+			os.remove(tmp_db.name)
 
+		super().__init__(message)
 
 
-def attrIsUnique(table_schema, attr_name):
+
+class SessionVariable:
+	'''
+		Переменная состояния соединения с СУБД (см. Session):
+		значение хранится в словаре состояния, загруженном в поток
 	'''
-		Проверка: является ли поле уникальным
 
-		table_schema - схема таблицы
-		attr_name - имя поля
+	def __set_name__(self, owner, name):
+		self.name = name
 
-		return - True/False
+	def __get__(self, session, owner):
+		return session.state[self.name]
+
+	def __set__(self, session, value):
+		session.state[self.name] = value
+
+
+
+class Session(threading.local):
+	'''
+		Состояние соединения с СУБД текущего потока: выбор БД, её каталог,
+		индексы, изменения журнала и транзакция. Переменные читаются
+		и изменяются как атрибуты (session.current_db_name) в словаре
+		состояния, загруженном в поток (см. setSessionState). Новый поток
+		начинает с состояния, в котором БД не выбрана
 	'''
 
-	for attr in table_schema:
-		if attr['name'] == attr_name and attr['attr']['unique']:
-			return True
+	# Имя текущей БД
+	current_db_name = SessionVariable()
+
+	# Формат хранения текущей БД: DB_STORAGE_TEXT/DB_STORAGE_PAGE
+	current_db_storage = SessionVariable()
+
+	# Каталог таблиц текущей БД: схемы таблиц из файла схем,
+	# для страничной БД - каталог из файла БД (см. sqlpage.readDirectory)
+	# пример: {
+	# 	'table_name_1' : {
+	# 		'schema' : [...],  # см. readTableSchema
+	# 		'stats'  : {...}   # см. analyze, None - статистика не собрана
+	# 	}
+	# }
+	catalog = SessionVariable()
+
+	# Отметка файла схем (файла страничной БД) - время изменения, размер,
+	# по которой построен каталог, если файл был изменён извне - каталог строится заново
+	catalog_stamp = SessionVariable()
+
+	# Хеш-индексы уникальных полей (primary key, unique) таблиц текущей БД,
+	# строятся при первом обращении к таблице
+	# пример: {'table_name_1' : {'attr_name_1' : {'1', '2', ...}}}
+	unique_indexes = SessionVariable()
+
+	# Текущая транзакция: изменения таблиц накапливаются в памяти
+	# и записываются в журнал одной записью при фиксации (см. commit)
+	# пример: {
+	# 	'isExplicit' : True,         # начата явно (BEGIN) или пакет одного exec
+	# 	'tables'     : {
+	# 		'table_name_1' : {
+	# 			'inserted' : [...],  # вставленные записи (см. recordParse)
+	# 			'deleted'  : {3},    # номера удалённых записей таблицы (см. readNumberedRecords)
+	# 			'updated'  : {5 : (...)}  # обновлённые записи таблицы по номерам
+	# 		}
+	# 	}
+	# }
+	transaction = SessionVariable()
+
+	# Изменения таблиц текущей БД, зафиксированные в журнале, но ещё
+	# не перенесённые в файлы БД (см. checkpoint), в виде образов таблиц,
+	# вставленные записи нумеруются после записей тела таблицы: -1, -2, ...,
+	# offset - размер журнала после последней фиксации, изменившей таблицу,
+	# stats - статистика таблицы с учётом изменений (см. updateStats), None - не собрана
+	# пример: {'table_name_1' : {'inserted' : [...], 'deleted' : {3, -1}, 'updated' : {}, 'offset' : 512, 'stats' : None}}
+	journal_tables = SessionVariable()
+
+	# Вторичные индексы текущей БД (см. createIndex), None - ещё не считаны,
+	# значения индекса загружаются в память при первом обращении
+	# пример: {
+	# 	'index_name_1' : {
+	# 		'table_name' : 'table_name_1',
+	# 		'attr_name'  : 'attr_name_1',
+	# 		'keys'       : [1, 5, 5, ...],  # отсортированные значения (строки - без кавычек),
+	# 		                                # None - значения не загружены
+	# 		'rows'       : [4, 0, 2, ...],  # номера записей для значений из keys
+	# 		'nulls'      : [1, 3]           # номера записей со значением null
+	# 	}
+	# }
+	secondary_indexes = SessionVariable()
+
+	# Открытые файлы текущей текстовой БД: отображённые в память файлы таблиц
+	# и прочитанные хвосты таблиц, по отметке файла они читаются заново,
+	# только если файл был заменён или изменён (см. cachedFile)
+	# пример: {'db_name.db/table_name_1.db' : ((inode, время изменения в нс, размер), mmap)}
+	file_cache = SessionVariable()
+
+	# Колоночный кеш таблиц текущей БД (см. readColumns): записи таблицы,
+	# разложенные по полям, кеш таблицы строится при первом полном чтении
+	# таблицы и сбрасывается при изменении таблицы
+	# пример: {
+	# 	'table_name_1' : {
+	# 		'count'   : 3,
+	# 		'columns' : [
+	# 			{'values' : array('q', [1, 2, 0]), 'nulls' : b'\x00\x00\x01'},  # integer
+	# 			{'codes' : b'\x00\x01\x00', 'dictionary' : ["'a'", 'null']}     # остальные поля
+	# 		]
+	# 	}
+	# }
+	column_cache = SessionVariable()
+
+	def __init__(self):
+		self.state = sessionState(True)
 
-	return False
 
 
 
-def attrIsNull(table_schema, attr_name):
+
+def setDB(db_name):
 	'''
-		Проверка: может ли поле принимать null
+	    Выбор БД для выполнения запросов
 
-		table_schema - схема таблицы
-		attr_name - имя поля
+	    db_name - имя БД
 
-		return - True/False
+	    return None
 	'''
 
-	for attr in table_schema:
-		if attr['name'] == attr_name and attr['attr']['null']:
-			return True
+	# Смена БД завершает транзакцию
+	if session.transaction != None:
+		commit()
 
-	return False
+	storage = dbStorage(db_name)
+	if storage == None:
+		raise SQL_DB_Exception('БД с именем \'{0}\' не существует !'.format(db_name))
 
+	# БД в прежнем формате переводится в каталог
+	if os.path.isfile(db_name + DB_EXTENSION):
+		splitDB(db_name)
+	
+	# Изменения прежней БД, не перенесённые в её файлы, остаются в её журнале
+	session.current_db_name = db_name
+	session.current_db_storage = storage
+	resetCatalog()
+	recoverDB()
 
 
-def attrIsString(table_schema, attr_name):
+
+def dbStorage(db_name):
 	'''
-		Проверка: тип поля string ?
+		Определение формата хранения БД по существующему каталогу (файлу)
 
-		table_schema - схема таблицы
-		attr_name - имя поля
+		db_name - имя БД
 
-		return - True/False
+		return - DB_STORAGE_TEXT/DB_STORAGE_PAGE, None - если БД не существует
 	'''
 
-	for attr in table_schema:
-		if attr['name'] == attr_name and attr['type'] == 'string':
-			return True
+	if os.path.exists(db_name + DB_EXTENSION):
+		return DB_STORAGE_TEXT
+	elif os.path.isfile(db_name + DB_PAGE_EXTENSION):
+		return DB_STORAGE_PAGE
 
-	return False
+	return None
 
 
 
-def attrIsPrimaryKey(table_schema, attr_name):
+def sessionState(isNew=False):
 	'''
-		Проверка: является ли поле первичным ключом
+		Получение состояния соединения с СУБД, загруженного в текущий поток,
+		для его восстановления после работы другого соединения (см. sqlmy.Connection)
 
-		table_schema - схема таблицы
-		attr_name - имя поля
+		isNew - True - состояние нового соединения, в котором БД не выбрана
 
-		return - True/False
+		return - словарь значений переменных состояния (см. Session),
+				 сам словарь состояния потока, а не его копия
 	'''
 
-	for attr in table_schema:
-		if attr['name'] == attr_name and attr['attr']['primary key']:
-			return True
+	if isNew:
+		return {
+			'current_db_name'    : None,
+			'current_db_storage' : None,
+			'catalog'            : None,
+			'catalog_stamp'      : None,
+			'unique_indexes'     : {},
+			'transaction'        : None,
+			'journal_tables'     : {},
+			'secondary_indexes'  : None,
+			'file_cache'         : {},
+			'column_cache'       : {}
+		}
 
-	return False
+	return session.state
 
 
 
-def createTable(table_name, table_schema):
+def setSessionState(state):
 	'''
-		Создание таблицы в текущей БД
+		Загрузка состояния соединения с СУБД в текущий поток,
+		изменения состояния записываются в этот же словарь
+
+		state - состояние соединения (см. sessionState)
 
-		table_name - имя таблицы
-		table_schema - схема таблицы:
-					   [
-					   		{name : 'name_attr',
-					   		 type : 'type_attr' (integer/string),
-					   		 attr : {
-					   		 	'primary key' : True/False,
-					   		 	'unique'      : True/False,
-					   		 	'null'        : True/False
-					   		 }
-					   		}, {...}
-					   ]
 		return None
 	'''
 
-	global current_db_name
+	session.state = state
 
-	# Если БД не выбрана
-	if current_db_name == None:
-		raise SQL_DB_Exception('Не выбрана БД !')
 
-	with open(current_db_name + DB_EXTENSION, 'r+') as db:
-		# Проверка существования таблицы в БД
-		for line in db:
-			if 'TABLE_NAME = ' + table_name == line.strip():
-				raise SQL_DB_Exception('Таблица \'{0}\' уже существует !'.format(
-									   table_name))
-		# Создание таблицы в БД
-		db.seek(0, 2)
-		db.write('TABLE_NAME = ' + table_name + '\n#SCHEMA\n{\n\t');
-		comma_count = len(table_schema) - 1
-		for attr in table_schema:
-			db.write('({0}, {1}, {2}){3}'.format(
-					 attr['name'], attr['type'], serializeAttr(attr['attr']),
-					 ', ' if comma_count > 0 else ''))
-			comma_count -= 1
-		db.write('\n}\n#BODY\n{\n}\n')
 
+# Состояние соединения с СУБД текущего потока (см. Session)
+session = Session()
 
 
-def createDB(db_name):
-	'''
-		Создание файла БД и установка имени текущей БД
 
-		db_name - имя БД
+def refreshDB():
+	'''
+		Сброс каталога, индексов и изменений журнала текущей БД
+		после её изменения другим соединением, изменения журнала
+		считываются заново; если БД удалена - она перестаёт быть текущей
 
 		return None
 	'''
 
-	global current_db_name
+	if session.current_db_name == None:
+		return
 
-	# Проверка существования файла БД
-	if os.path.isfile(db_name + DB_EXTENSION):
-		raise SQL_DB_Exception('БД \'{0}\' уже существует !'.format(
-							   db_name))
+	session.current_db_storage = dbStorage(session.current_db_name)
+	if session.current_db_storage == None:
+		session.current_db_name = None
 
-	with open(db_name + DB_EXTENSION, 'w'):
-		if current_db_name == None:
-			current_db_name = db_name
+	resetCatalog()
+	if session.current_db_name == None:
+		session.journal_tables.clear()
+	else:
+		recoverDB()
 
 
 
-def dropTable(table_name):
+def lockPath(db_name):
 	'''
-		Удаление таблицы из текущей БД
+		Путь к файлу блокировки БД, файл не удаляется вместе с БД,
+		чтобы ожидающие блокировку соединения не разошлись с новыми
 
-		table_name - имя удаляемой таблицы
+		db_name - имя БД
 
-		return None
+		return - путь к файлу блокировки
 	'''
 
-	global current_db_name
+	return db_name + DB_LOCK_EXTENSION
 
-	# Если БД не выбрана
-	if current_db_name == None:
-		raise SQL_DB_Exception('Не выбрана БД !')
 
-	# Копирование всех таблиц во временную БД, кроме, удаляемой
-	isCopyLine = True
-	isTableFind = False
-	with open(current_db_name + DB_EXTENSION, 'r') as db,\
-	     open(DB_TEMP_NAME, 'w') as tmp_db:
-		for line in db:
-			# Если достигли удаляемую таблицу
-			if 'TABLE_NAME = ' + table_name == line.strip():
-				isCopyLine = False
-				isTableFind = True
-			elif not isCopyLine and (re.search(r'TABLE_NAME = ' + TABLE_NAME_PATTERN, line)):
-				isCopyLine = True
-			# Не копировать удаляемую таблицу
-			if isCopyLine:
-				tmp_db.write(line)
 
-	# Переименовываем временную БД в текущую
-	os.remove(current_db_name + DB_EXTENSION)
-	os.rename(DB_TEMP_NAME, current_db_name + DB_EXTENSION)
+def openLock(db_name):
+	'''
+		Открытие (создание) файла блокировки БД
 
-	# Если удаляемая таблица не найдена
-	if not isTableFind:
-		raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table_name))
+		db_name - имя БД
+
+		return - открытый файл блокировки
+	'''
 
+	fd = os.open(lockPath(db_name), os.O_RDWR | os.O_CREAT, 0o666)
+	return open(fd, 'r+', encoding='utf-8')
 
 
-def dropDB(db_name):
+
+def lockDB(lock, isExclusive):
 	'''
-		Удаление файла БД
+		Установка блокировки БД: разделяемой - для чтения, её могут
+		держать одновременно несколько соединений, или исключительной -
+		для изменения; блокировка ожидается, если её держит другое соединение.
+		Блокировка устанавливается на открытый файл, поэтому действует
+		и между потоками, и между процессами; без fcntl (Windows)
+		соединения разных процессов не согласуются
 
-		db_name - имя БД
+		lock - открытый файл блокировки (см. openLock)
+		isExclusive - True - исключительная блокировка, иначе - разделяемая
 
-		return None
+		return - номер версии БД
 	'''
 
-	global current_db_name
+	if fcntl != None:
+		fcntl.flock(lock.fileno(), fcntl.LOCK_EX if isExclusive else fcntl.LOCK_SH)
 
-	# Попытка удалить БД
-	try:
-		os.remove(db_name + DB_EXTENSION)
-	except FileNotFoundError:
-		raise SQL_DB_Exception('БД \'{0}\' не существует !'.format(
-							   db_name))
-	except:
-		raise SQL_DB_Exception('Произошёл сбой при удалении БД \'{0}\' !'.format(
-							   db_name))
+	lock.seek(0)
+	version = lock.read().strip()
 
-	# Если удалена текущая БД
-	if current_db_name == db_name:
-		current_db_name = None
+	return int(version) if version.isdigit() else 0
+
+
+
+def unlockDB(lock, isWritten):
+	'''
+		Снятие блокировки БД, после изменения БД
+		номер её версии увеличивается
+
+		lock - открытый файл блокировки
+		isWritten - True - БД изменялась под исключительной блокировкой
+
+		return - номер версии БД
+	'''
+
+	lock.seek(0)
+	version = lock.read().strip()
+	version = int(version) if version.isdigit() else 0
+
+	if isWritten:
+		version += 1
+		lock.seek(0)
+		lock.truncate()
+		lock.write(str(version))
+		lock.flush()
+
+	if fcntl != None:
+		fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+	return version
+
+
+
+def dbPath():
+	'''
+		Путь к файлу текущей БД: файлу страничной БД
+		или файлу схем таблиц текстовой БД
+
+		return - путь к файлу БД
+	'''
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		return session.current_db_name + DB_PAGE_EXTENSION
+
+	return os.path.join(session.current_db_name + DB_EXTENSION, DB_CATALOG_NAME)
+
+
+
+def tablePath(table_name, extension=DB_EXTENSION):
+	'''
+		Путь к файлу таблицы текущей текстовой БД
+
+		table_name - имя таблицы
+		extension - расширение файла: DB_EXTENSION - файл таблицы,
+					DB_TAIL_EXTENSION - хвост таблицы
+
+		return - путь к файлу в каталоге БД
+	'''
+
+	return os.path.join(session.current_db_name + DB_EXTENSION, table_name + extension)
+
+
+
+def serializeAttr(attr):
+	'''
+		Сериализация атрибутов поля таблицы
+
+		attr - атрибуты поля = {
+   		 	     'primary key' : True/False,
+	   		 	 'unique'      : True/False,
+	   		 	 'null'        : True/False
+			   }
+
+		return - сериализованные атрибуты поля,
+				 пример: 'pk:1;u:0;n:0'
+	'''
+
+	return 'pk:{0};u:{1};n:{2}'.format(
+		   int(attr['primary key']), int(attr['unique']), int(attr['null']))
+
+
+
+def unserializeAttr(attr):
+	'''
+		Дисериализация атрибутов поля таблицы
+
+		attr - атрибуты поля = 'pk:0/1;u:0/1;n:0/1'
+
+		return - дисериализованные атрибуты поля,
+				 пример: {
+	   		 	     'primary key' : True,
+		   		 	 'unique'      : False,
+		   		 	 'null'        : False
+			     }
+	'''
+
+	return {
+		'primary key' : bool(int(attr[3])),
+		'unique'      : bool(int(attr[7])),
+		'null'        : bool(int(attr[11]))
+	}
+
+
+
+def attrPositions(table_schema):
+	'''
+		Номера полей в записях таблицы
+
+		table_schema - схема таблицы
+
+		return - номера полей по именам, пример: {'name' : 0, 'id' : 1}
+	'''
+
+	return {attr['name'] : i for i, attr in enumerate(table_schema)}
+
+
+
+def recordParse(record, positions):
+	'''
+		Парсинг записи таблицы
+
+		record - запись из тела таблицы
+		positions - номера полей таблицы по именам (см. attrPositions)
+
+		return - кортеж значений полей в порядке полей схемы,
+				 отсутствующие в записи поля - 'null'
+			     пример:
+			     record = ((name, 'vlad'), (id, 5))
+			     positions = {'id' : 0, 'name' : 1, 'ord_number' : 2}
+			     return = ('5', '\'vlad\'', 'null')
+	'''
+
+	values = ['null'] * len(positions)
+	for attr_name, value in RECORD_ATTR_PATTERN.findall(record):
+		values[positions[attr_name]] = value
+
+	return tuple(values)
+
+
+
+def recordUnparse(record, table_schema):
+	'''
+		Преобразование кортежа значений полей в запись таблицы
+
+		record - кортеж значений полей (см. recordParse)
+		table_schema - схема таблицы
+
+		return - запись тела таблицы,
+			     пример:
+			     record = ('5', '\'vlad\'', 'null')
+			     return = ((id, 5), (name, 'vlad'), (ord_number, null))
+	'''
+
+	return '(' + ', '.join(['(' + attr['name'] + ', ' + value + ')'
+							for attr, value in zip(table_schema, record)]) + ')'
+
+
+
+def serializeValue(value):
+	'''
+		Преобразование значения python в вид, в котором оно хранится в текстовой БД
+
+		value - значение поля: None, int() или str()
+
+		return - значение поля: 'null', '5', '\'vlad\''
+	'''
+
+	if value == None:
+		return 'null'
+	elif isinstance(value, str):
+		return '\'' + value + '\''
+
+	return str(value)
+
+
+
+def recordToRow(record):
+	'''
+		Преобразование записи в кортеж значений для страничной БД
+
+		record - кортеж значений полей (см. recordParse)
+
+		return - кортеж значений python в порядке полей схемы
+	'''
+
+	return tuple(map(unserializeValue, record))
+
+
+
+def rowToRecord(row):
+	'''
+		Преобразование кортежа значений страничной БД в запись
+
+		row - кортеж значений python в порядке полей схемы
+
+		return - кортеж значений полей (см. recordParse)
+	'''
+
+	return tuple(map(serializeValue, row))
+
+
+
+def readTail(table_name):
+	'''
+		Считать записи хвоста таблицы текущей БД
+
+		table_name - имя таблицы
+
+		return - записи хвоста
+				 пример: ['((id, 1), (name, \'vlad\'))', ...]
+	'''
+
+	try:
+		return cachedFile(tablePath(table_name, DB_TAIL_EXTENSION), readLines)
+	except FileNotFoundError:
+		return []
+
+
+
+def readLines(path):
+	'''
+		Чтение непустых строк файла
+
+		path - путь к файлу
+
+		return - список строк без пробельных символов по краям
+	'''
+
+	with open(path, 'r') as db:
+		return [line.strip() for line in db if line.strip() != '']
+
+
+
+def mergeTail(db, table_name):
+	'''
+		Чтение строк файла таблицы с подмешиванием записей хвоста
+
+		db - открытый файл таблицы
+		table_name - имя таблицы
+
+		return - генератор строк файла таблицы, в котором записи хвоста
+				 находятся в конце тела таблицы
+	'''
+
+	tail = readTail(table_name)
+	isBodyFind = False
+	for line in db:
+		if '#BODY' == line.strip():
+			isBodyFind = True
+		elif isBodyFind and ('}' == line.strip()):
+			# Дописать записи хвоста в конец тела таблицы
+			for record in tail:
+				yield '\t' + record + '\n'
+			isBodyFind = False
+		yield line
+
+
+
+def replaceTable(table_name):
+	'''
+		Замена файлов таблицы текущей БД временными, если они есть:
+		временный файл тела заменяет файл таблицы, временный хвост - хвост таблицы
+
+		table_name - имя таблицы
+
+		return None
+	'''
+
+	for extension in (DB_EXTENSION, DB_TAIL_EXTENSION):
+		if os.path.isfile(tablePath(table_name, extension + DB_TEMP_EXTENSION)):
+			os.replace(tablePath(table_name, extension + DB_TEMP_EXTENSION), tablePath(table_name, extension))
+
+
+
+def compactDB():
+	'''
+		Уплотнение текущей БД: перенос изменений из журнала
+		и записей хвостов в тела таблиц
+
+		return None
+	'''
+
+	checkpoint(True)
+
+
+
+def schemaParse(line):
+	'''
+		Парсинг схемы таблицы
+
+		line - строка раздела #SCHEMA
+			   пример: (id, integer, pk:1;u:0;n:0), (name, string, pk:0;u:0;n:1)
+
+		return - схема таблицы (см. readTableSchema)
+	'''
+
+	table_schema = []
+	# Убрать лишние пробелы
+	line = re.sub(r' ', '', line.strip())
+	# Вставить между атрибутами разделитель
+	line = re.sub(r'\),\(', '|', line)[1:-1]
+	for attr in line.split('|'):
+		attr = attr.split(',')
+		table_schema.append({
+			'name' : attr[0].strip(),
+			'type' : attr[1].strip(),
+			'attr' : unserializeAttr(attr[2].strip())
+		})
+
+	return table_schema
+
+
+
+def statsParse(rows, line, table_schema):
+	'''
+		Парсинг статистики таблицы
+
+		rows - число записей из раздела #STATS
+		line - строка статистики полей раздела #STATS
+			   пример: (id, 100, 0, 1, 100), (name, 12, 3, null, null)
+		table_schema - схема таблицы
+
+		return - статистика таблицы (см. analyze)
+	'''
+
+	attrs = {}
+	line = re.sub(r' ', '', line.strip())
+	line = re.sub(r'\),\(', '|', line)[1:-1]
+	for attr in line.split('|'):
+		attr = attr.split(',')
+		attrs[attr[0]] = {
+			'distinct' : int(attr[1]),
+			'nulls'    : int(attr[2]),
+			'min'      : None if attr[3] == 'null' else int(attr[3]),
+			'max'      : None if attr[4] == 'null' else int(attr[4])
+		}
+
+	# Поля без статистики (не должно быть) считаются пустыми
+	for attr in table_schema:
+		attrs.setdefault(attr['name'], {'distinct' : 0, 'nulls' : 0, 'min' : None, 'max' : None})
+
+	return {
+		'rows'  : int(rows),
+		'attrs' : attrs
+	}
+
+
+
+def catalogBlock(table_name, table):
+	'''
+		Блок таблицы в файле схем
+
+		table_name - имя таблицы
+		table - таблица из каталога (см. catalog)
+
+		return - строки блока таблицы
+	'''
+
+	block = 'TABLE_NAME = ' + table_name + '\n'
+	block += '#SCHEMA\n{\n\t' + ', '.join(['({0}, {1}, {2})'.format(
+			 attr['name'], attr['type'], serializeAttr(attr['attr']))
+			 for attr in table['schema']]) + '\n}\n'
+
+	stats = table['stats']
+	if stats != None:
+		attrs = []
+		for attr in table['schema']:
+			attr_stats = stats['attrs'][attr['name']]
+			attrs.append('({0}, {1}, {2}, {3}, {4})'.format(
+						 attr['name'], attr_stats['distinct'], attr_stats['nulls'],
+						 'null' if attr_stats['min'] == None else attr_stats['min'],
+						 'null' if attr_stats['max'] == None else attr_stats['max']))
+		block += '#STATS\n{\n\tROWS = ' + str(stats['rows']) + '\n\t' + ', '.join(attrs) + '\n}\n'
+
+	return block
+
+
+
+def writeCatalog(path, tables):
+	'''
+		Запись файла схем текстовой БД со сбросом на диск
+
+		path - путь к файлу
+		tables - таблицы БД (см. catalog)
+
+		return None
+	'''
+
+	with open(path, 'w') as db:
+		db.write(''.join(catalogBlock(table_name, table) for table_name, table in tables.items()))
+		syncFile(db)
+
+
+
+def dbStamp():
+	'''
+		Отметка файла текущей БД (файла схем текстовой БД)
+
+		return - (время изменения в нс, размер в байтах)
+	'''
+
+	stat = os.stat(dbPath())
+	return (stat.st_mtime_ns, stat.st_size)
+
+
+
+def pageWritten(tables):
+	'''
+		Обновление каталога после изменения страничной БД
+
+		tables - таблицы БД после изменения (см. sqlpage.readDirectory)
+
+		return None
+	'''
+
+	session.catalog = tables
+	session.catalog_stamp = dbStamp()
+
+
+
+def resetCatalog():
+	'''
+		Сброс каталога и индексов при смене текущей БД
+		или изменении файла БД извне
+
+		return None
+	'''
+
+	session.catalog = None
+	session.catalog_stamp = None
+	session.unique_indexes.clear()
+	session.secondary_indexes = None
+	session.file_cache.clear()
+	session.column_cache.clear()
+
+
+
+def closeDB():
+	'''
+		Отмена выбора текущей БД без изменения её файлов,
+		когда изменения журнала в памяти не соответствуют журналу на диске:
+		БД нужно выбрать заново, журнал при этом будет прочитан (см. setDB)
+
+		return None
+	'''
+
+	session.journal_tables = {}
+	session.current_db_name = None
+	session.current_db_storage = None
+	resetCatalog()
+
+
+
+def readCatalog():
+	'''
+		Получение каталога таблиц текущей БД,
+		файл схем (файл страничной БД) читается только если каталог
+		ещё не построен или устарел
+
+		return - каталог таблиц (см. catalog)
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	# Если файл БД изменён извне
+	stamp = dbStamp()
+	if session.catalog != None and stamp != session.catalog_stamp:
+		resetCatalog()
+
+	if session.catalog != None:
+		return session.catalog
+
+	# Каталог страничной БД хранится в её файле
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		session.catalog = sqlpage.readTables(dbPath())
+		session.catalog_stamp = stamp
+		return session.catalog
+
+	# Построение каталога за один проход по отображённому в память файлу схем,
+	# блоки таблиц ищутся регулярным выражением по байтам
+	tables = {}
+	with openMap(dbPath()) as buffer:
+		for match in TABLE_BLOCK_PATTERN.finditer(buffer):
+			table_schema = schemaParse(match.group(2).decode())
+			tables[match.group(1).decode()] = {
+				'schema' : table_schema,
+				'stats'  : None if match.group(3) == None else
+						   statsParse(match.group(3).decode(), match.group(4).decode(), table_schema)
+			}
+
+	session.catalog = tables
+	session.catalog_stamp = stamp
+	return session.catalog
+
+
+
+def readTableSchema(table_name):
+	'''
+		Считать схему из таблицы
+
+		table_name - имя таблицы
+
+		return - схема таблицы
+				 [
+					 {'name' : 'name_attr',
+					  'type' : 'type_attr' (integer/string),
+					  'attr' : {
+						 'primary key' : True/False,
+						 'unique'      : True/False,
+						 'null'        : True/False
+					  }
+					 }, {...}
+				 ]
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	# Поиск таблицы в каталоге
+	tables = readCatalog()
+
+	# Если таблица не найдена
+	if table_name not in tables:
+		raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.
+							   format(table_name))
+
+	return tables[table_name]['schema']
+
+
+
+def attrIsInteger(table_schema, attr_name):
+	'''
+		Проверка: тип поля integer ?
+
+		table_schema - схема таблицы
+		attr_name - имя поля
+
+		return - True/False
+	'''
+
+	for attr in table_schema:
+		if attr['name'] == attr_name and attr['type'] == 'integer':
+			return True
+
+	return False
+
+
+
+def attrIsUnique(table_schema, attr_name):
+	'''
+		Проверка: является ли поле уникальным
+
+		table_schema - схема таблицы
+		attr_name - имя поля
+
+		return - True/False
+	'''
+
+	for attr in table_schema:
+		if attr['name'] == attr_name and attr['attr']['unique']:
+			return True
+
+	return False
+
+
+
+def attrIsNull(table_schema, attr_name):
+	'''
+		Проверка: может ли поле принимать null
+
+		table_schema - схема таблицы
+		attr_name - имя поля
+
+		return - True/False
+	'''
+
+	for attr in table_schema:
+		if attr['name'] == attr_name and attr['attr']['null']:
+			return True
+
+	return False
+
+
+
+def attrIsString(table_schema, attr_name):
+	'''
+		Проверка: тип поля string ?
+
+		table_schema - схема таблицы
+		attr_name - имя поля
+
+		return - True/False
+	'''
+
+	for attr in table_schema:
+		if attr['name'] == attr_name and attr['type'] == 'string':
+			return True
+
+	return False
+
+
+
+def attrIsPrimaryKey(table_schema, attr_name):
+	'''
+		Проверка: является ли поле первичным ключом
+
+		table_schema - схема таблицы
+		attr_name - имя поля
+
+		return - True/False
+	'''
+
+	for attr in table_schema:
+		if attr['name'] == attr_name and attr['attr']['primary key']:
+			return True
+
+	return False
+
+
+
+def createTable(table_name, table_schema):
+	'''
+		Создание таблицы в текущей БД
+
+		table_name - имя таблицы
+		table_schema - схема таблицы:
+					   [
+					   		{name : 'name_attr',
+					   		 type : 'type_attr' (integer/string),
+					   		 attr : {
+					   		 	'primary key' : True/False,
+					   		 	'unique'      : True/False,
+					   		 	'null'        : True/False
+					   		 }
+					   		}, {...}
+					   ]
+		return None
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	# Изменение схемы БД завершает транзакцию
+	if session.transaction != None:
+		commit()
+
+	# Проверка существования таблицы в БД
+	tables = readCatalog()
+	if table_name in tables:
+		raise SQL_DB_Exception('Таблица \'{0}\' уже существует !'.format(
+							   table_name))
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		pageWritten(sqlpage.createTable(dbPath(), table_name, table_schema))
+		return
+
+	# Создание файла таблицы с пустым телом
+	with open(tablePath(table_name), 'w') as db:
+		db.write('#BODY\n{\n}\n')
+	if os.path.isfile(tablePath(table_name, DB_TAIL_EXTENSION)):
+		os.remove(tablePath(table_name, DB_TAIL_EXTENSION))
+
+	# Добавление схемы таблицы в файл схем и в каталог
+	tables[table_name] = {
+		'schema' : table_schema,
+		'stats'  : None
+	}
+	with open(dbPath(), 'a') as db:
+		db.write(catalogBlock(table_name, tables[table_name]))
+	session.catalog_stamp = dbStamp()
+
+
+
+def createDB(db_name, storage=None):
+	'''
+		Создание файла БД и установка имени текущей БД
+
+		db_name - имя БД
+		storage - формат хранения БД: DB_STORAGE_TEXT/DB_STORAGE_PAGE,
+				  None - DB_STORAGE
+
+		return None
+	'''
+
+	# Создание БД завершает транзакцию
+	if session.transaction != None:
+		commit()
+
+	if storage == None:
+		storage = DB_STORAGE
+	if storage not in (DB_STORAGE_TEXT, DB_STORAGE_PAGE):
+		raise SQL_DB_Exception('Неизвестный формат хранения БД \'{0}\' !'.format(storage))
+
+	# Проверка существования файла БД
+	if dbStorage(db_name) != None:
+		raise SQL_DB_Exception('БД \'{0}\' уже существует !'.format(
+							   db_name))
+
+	# Удаление журнала и индексов, оставшихся от одноимённой страничной БД
+	for path in [db_name + DB_WAL_EXTENSION, db_name + DB_PAGE_EXTENSION + DB_TEMP_EXTENSION]:
+		if os.path.isfile(path):
+			os.remove(path)
+	for path in indexFiles(db_name).values():
+		os.remove(path)
+
+	if storage == DB_STORAGE_PAGE:
+		sqlpage.createFile(db_name + DB_PAGE_EXTENSION)
+	else:
+		os.mkdir(db_name + DB_EXTENSION)
+		open(os.path.join(db_name + DB_EXTENSION, DB_CATALOG_NAME), 'w').close()
+
+	if session.current_db_name == None:
+		session.current_db_name = db_name
+		session.current_db_storage = storage
+		resetCatalog()
+		recoverDB()
+
+
+
+def dropTable(table_name):
+	'''
+		Удаление таблицы из текущей БД
+
+		table_name - имя удаляемой таблицы
+
+		return None
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	# Изменение схемы БД завершает транзакцию, изменения из журнала
+	# переносятся в файлы БД, чтобы в журнале не осталось записей удаляемой таблицы
+	checkpoint()
+
+	# Актуализация каталога перед перезаписью БД
+	tables = readCatalog()
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		if table_name not in tables:
+			raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table_name))
+		pageWritten(sqlpage.dropTable(dbPath(), table_name))
+		session.unique_indexes.pop(table_name, None)
+		session.column_cache.pop(table_name, None)
+		dropTableIndexes(table_name)
+		return
+
+	# Копирование схем всех таблиц во временный файл, кроме, удаляемой
+	isCopyLine = True
+	isTableFind = False
+	with open(dbPath(), 'r') as db,\
+	     open(dbPath() + DB_TEMP_EXTENSION, 'w') as tmp_db:
+		for line in db:
+			# Если достигли удаляемую таблицу
+			if 'TABLE_NAME = ' + table_name == line.strip():
+				isCopyLine = False
+				isTableFind = True
+			elif not isCopyLine and (re.search(r'TABLE_NAME = ' + TABLE_NAME_PATTERN, line)):
+				isCopyLine = True
+			# Не копировать удаляемую таблицу
+			if isCopyLine:
+				tmp_db.write(line)
+
+	# Если удаляемая таблица не найдена
+	if not isTableFind:
+		os.remove(dbPath() + DB_TEMP_EXTENSION)
+		raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table_name))
+
+	# Переименовываем временный файл в файл схем и удаляем файлы таблицы
+	os.replace(dbPath() + DB_TEMP_EXTENSION, dbPath())
+	for extension in (DB_EXTENSION, DB_TAIL_EXTENSION):
+		if os.path.isfile(tablePath(table_name, extension)):
+			os.remove(tablePath(table_name, extension))
+
+	tables.pop(table_name, None)
+	session.catalog_stamp = dbStamp()
+	session.unique_indexes.pop(table_name, None)
+	session.file_cache.clear()
+	session.column_cache.pop(table_name, None)
+	dropTableIndexes(table_name)
+
+
+
+def dropDB(db_name):
+	'''
+		Удаление каталога (файла) БД
+
+		db_name - имя БД
+
+		return None
+	'''
+
+	# Удаление БД завершает транзакцию
+	if session.transaction != None:
+		commit()
+
+	# Попытка удалить БД
+	try:
+		if dbStorage(db_name) == DB_STORAGE_PAGE:
+			os.remove(db_name + DB_PAGE_EXTENSION)
+		elif os.path.isdir(db_name + DB_EXTENSION):
+			# Каталог удаляется вместе с файлами таблиц, хвостами и индексами
+			shutil.rmtree(db_name + DB_EXTENSION)
+		else:
+			os.remove(db_name + DB_EXTENSION)
+	except FileNotFoundError:
+		raise SQL_DB_Exception('БД \'{0}\' не существует !'.format(
+							   db_name))
+	except:
+		raise SQL_DB_Exception('Произошёл сбой при удалении БД \'{0}\' !'.format(
+							   db_name))
+
+	# Удаление хвоста, журнала и индексов страничной БД или БД в прежнем формате
+	for path in [db_name + DB_TAIL_EXTENSION, db_name + DB_WAL_EXTENSION,
+				 db_name + DB_PAGE_EXTENSION + DB_TEMP_EXTENSION]:
+		if os.path.isfile(path):
+			os.remove(path)
+	for path in indexFiles(db_name).values():
+		os.remove(path)
+
+	# Если удалена текущая БД
+	if session.current_db_name == db_name:
+		session.current_db_name = None
+		session.current_db_storage = None
+		resetCatalog()
+		session.journal_tables.clear()
+
+
+
+def convertDB(db_name):
+	'''
+		Перевод текстовой БД в страничный формат хранения,
+		каталог текстовой БД удаляется, файлы индексов переносятся
+		к файлу страничной БД
+
+		db_name - имя БД
+
+		return None
+	'''
+
+	# Преобразование БД завершает транзакцию
+	if session.transaction != None:
+		commit()
+
+	if dbStorage(db_name) != DB_STORAGE_TEXT:
+		raise SQL_DB_Exception('Текстовой БД \'{0}\' не существует !'.format(db_name))
+	if os.path.isfile(db_name + DB_EXTENSION):
+		splitDB(db_name)
+
+	# Чтение исходной БД выполняется как текущей, изменения из её журнала
+	# переносятся в файлы БД, чтобы номера записей в индексах не изменились
+	prev_db_name = session.current_db_name
+	session.current_db_name = db_name
+	session.current_db_storage = DB_STORAGE_TEXT
+	resetCatalog()
+	recoverDB()
+	checkpoint()
+
+	page_path = db_name + DB_PAGE_EXTENSION
+	try:
+		sqlpage.createFile(page_path)
+		for table_name, table in readCatalog().items():
+			sqlpage.createTable(page_path, table_name, table['schema'])
+			sqlpage.appendRecords(page_path, table_name,
+								  map(recordToRow, readRecords(table_name)))
+		stats = {table_name : table['stats'] for table_name, table in readCatalog().items()
+				 if table['stats'] != None}
+		if stats != {}:
+			sqlpage.writeStats(page_path, stats)
+	except:
+		if os.path.isfile(page_path):
+			os.remove(page_path)
+		session.current_db_name = prev_db_name
+		session.current_db_storage = dbStorage(prev_db_name) if prev_db_name != None else None
+		resetCatalog()
+		if prev_db_name != None:
+			recoverDB()
+		raise
+
+	# Номера записей в индексах не меняются - записи переносятся по порядку
+	for index_name, path in indexFiles(db_name).items():
+		os.replace(path, db_name + '.' + index_name + DB_INDEX_EXTENSION)
+	shutil.rmtree(db_name + DB_EXTENSION)
+
+	# Восстановление текущей БД
+	session.current_db_name = prev_db_name if prev_db_name != None else db_name
+	session.current_db_storage = dbStorage(session.current_db_name)
+	resetCatalog()
+	recoverDB()
+
+
+
+def splitDB(db_name):
+	'''
+		Перевод текстовой БД из прежнего формата (все таблицы в одном
+		файле db_name.db, общий хвост db_name.tail) в каталог с файлом схем
+		и отдельными файлами таблиц, записи хвоста переносятся в тела таблиц,
+		файлы индексов - в каталог БД
+
+		db_name - имя БД
+
+		return None
+	'''
+
+	db_path = db_name + DB_EXTENSION
+	dir_path = db_path + DB_TEMP_EXTENSION
+
+	# Записи общего хвоста по таблицам
+	tail = {}
+	if os.path.isfile(db_name + DB_TAIL_EXTENSION):
+		with open(db_name + DB_TAIL_EXTENSION, 'r') as tail_db:
+			for line in tail_db:
+				if line.strip() != '':
+					table_name, record = line.strip().split('\t', 1)
+					tail.setdefault(table_name, []).append(record.strip())
+
+	# Каталог собирается рядом и заменяет файл БД после заполнения
+	if os.path.isdir(dir_path):
+		shutil.rmtree(dir_path)
+	os.mkdir(dir_path)
+
+	table_db = None
+	try:
+		with open(db_path, 'r') as db,\
+		     open(os.path.join(dir_path, DB_CATALOG_NAME), 'w') as catalog_db:
+			for line in db:
+				if line.startswith('TABLE_NAME = '):
+					table_name = line.split(' = ')[1].strip()
+				elif '#BODY' == line.strip():
+					# Тело таблицы переносится в её файл
+					table_db = open(os.path.join(dir_path, table_name + DB_EXTENSION), 'w')
+				elif table_db != None and ('}' == line.strip()):
+					for record in tail.pop(table_name, []):
+						table_db.write('\t' + record + '\n')
+					table_db.write(line)
+					table_db.close()
+					table_db = None
+					continue
+				(catalog_db if table_db == None else table_db).write(line)
+	except:
+		if table_db != None:
+			table_db.close()
+		shutil.rmtree(dir_path)
+		raise
+
+	for index_name, path in indexFiles(db_name).items():
+		os.replace(path, os.path.join(dir_path, index_name + DB_INDEX_EXTENSION))
+	if os.path.isfile(db_name + DB_TAIL_EXTENSION):
+		os.remove(db_name + DB_TAIL_EXTENSION)
+	os.remove(db_path)
+	os.rename(dir_path, db_path)
+
+
+
+def createIndex(index_name, table_name, attr_name):
+	'''
+		Создание вторичного индекса по полю таблицы текущей БД,
+		индекс строится за один проход по таблице
+
+		index_name - имя индекса
+		table_name - имя таблицы
+		attr_name - имя поля
+
+		return None
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	# Изменение схемы БД завершает транзакцию, изменения из журнала
+	# переносятся в файлы БД - индекс строится по номерам записей в файлах
+	checkpoint()
+
+	indexes = readIndexes()
+	if index_name in indexes:
+		raise SQL_DB_Exception('Индекс \'{0}\' уже существует !'.format(index_name))
+	checkAttr(table_name, readTableSchema(table_name), attr_name)
+
+	index = {
+		'table_name' : table_name,
+		'attr_name'  : attr_name,
+		'keys'       : None,
+		'rows'       : None,
+		'nulls'      : None
+	}
+	setIndexEntries(index, *buildIndex(index, readRecords(table_name)))
+	writeIndex(index_name, index)
+	indexes[index_name] = index
+
+
+
+def dropIndex(index_name):
+	'''
+		Удаление вторичного индекса текущей БД
+
+		index_name - имя индекса
+
+		return None
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	# Изменение схемы БД завершает транзакцию
+	if session.transaction != None:
+		commit()
+
+	indexes = readIndexes()
+	if index_name not in indexes:
+		raise SQL_DB_Exception('Индекс \'{0}\' не существует !'.format(index_name))
+
+	os.remove(indexPath(index_name))
+	indexes.pop(index_name)
+
+
+
+def readUniqueIndex(table_name, table_schema):
+	'''
+		Получение хеш-индекса уникальных полей таблицы,
+		при первом обращении индекс строится за один проход по таблице
+
+		table_name - имя таблицы
+		table_schema - схема таблицы
+
+		return - множества значений уникальных полей таблицы
+				 пример: {'attr_name_1' : {'1', '2', ...}}
+	'''
+
+	if table_name in session.unique_indexes:
+		return session.unique_indexes[table_name]
+
+	index = {attr['name'] : set() for attr in table_schema
+			 if attr['attr']['unique'] or attr['attr']['primary key']}
+
+	# Заполнение индекса значениями из тела таблицы
+	for attr_name, values in index.items():
+		values.update(readAttrValues(table_name, attr_name))
+
+	session.unique_indexes[table_name] = index
+	return index
+
+
+
+def indexRecord(table_name, table_schema, record, isRemove=False):
+	'''
+		Добавление (удаление) значений записи в хеш-индекс уникальных полей,
+		если индекс таблицы ещё не построен - ничего не делается
+
+		table_name - имя таблицы
+		table_schema - схема таблицы
+		record - запись (см. recordParse)
+		isRemove - True, если значения удаляются из индекса
+
+		return None
+	'''
+
+	index = session.unique_indexes.get(table_name)
+	if index == None:
+		return
+
+	for attr, value in zip(table_schema, record):
+		if attr['name'] in index:
+			if isRemove:
+				index[attr['name']].discard(value)
+			else:
+				index[attr['name']].add(value)
 
 
 
 def isUniqueValue(table_name, attr_name, attr_value):
 	'''
-		Проверка уникальности значения атрибута
+		Проверка уникальности значения атрибута
+
+		table_name - имя таблицы
+		attr_name  - имя атрибута
+		attr_value - значение атрибута
+
+		return - True, если значение атрибута уникально
+				     False, если не уникально
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	table_schema = readTableSchema(table_name)
+	index = readUniqueIndex(table_name, table_schema)
+	if attr_name not in index:
+		return True
+
+	# Значения integer в индексе хранятся в каноническом виде
+	if attrIsInteger(table_schema, attr_name):
+		try:
+			attr_value = int(attr_value)
+		except (TypeError, ValueError):
+			return True
+
+	return str(attr_value) not in index[attr_name]
+
+
+
+def indexFiles(db_name):
+	'''
+		Поиск файлов вторичных индексов БД: в каталоге текстовой БД,
+		рядом с файлом страничной БД (БД в прежнем формате)
+
+		db_name - имя БД
+
+		return - пути к файлам индексов по именам индексов
+				 пример: {'index_name_1' : 'school.db/index_name_1.idx'}
+	'''
+
+	if os.path.isdir(db_name + DB_EXTENSION):
+		directory, prefix = db_name + DB_EXTENSION, ''
+	else:
+		directory, prefix = os.path.split(db_name + '.')
+	files = {}
+	for file_name in os.listdir(directory or '.'):
+		index_name = file_name[len(prefix):-len(DB_INDEX_EXTENSION)]
+		if (file_name.startswith(prefix) and file_name.endswith(DB_INDEX_EXTENSION) and
+		    index_name != '' and '.' not in index_name):
+			files[index_name] = os.path.join(directory, file_name)
+
+	return files
+
+
+
+def indexPath(index_name):
+	'''
+		Путь к файлу вторичного индекса текущей БД
+
+		index_name - имя индекса
+
+		return - путь к файлу индекса
+	'''
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		return session.current_db_name + '.' + index_name + DB_INDEX_EXTENSION
+
+	return os.path.join(session.current_db_name + DB_EXTENSION, index_name + DB_INDEX_EXTENSION)
+
+
+
+def readIndexes():
+	'''
+		Получение вторичных индексов текущей БД,
+		при первом обращении считываются только заголовки файлов индексов
+
+		return - индексы (см. secondary_indexes)
+	'''
+
+	if session.secondary_indexes != None:
+		return session.secondary_indexes
+
+	indexes = {}
+	for index_name, path in indexFiles(session.current_db_name).items():
+		with open(path, 'r') as index_file:
+			table_name = index_file.readline().split(' = ', 1)[1].strip()
+			attr_name = index_file.readline().split(' = ', 1)[1].strip()
+		indexes[index_name] = {
+			'table_name' : table_name,
+			'attr_name'  : attr_name,
+			'keys'       : None,
+			'rows'       : None,
+			'nulls'      : None
+		}
+
+	session.secondary_indexes = indexes
+	return indexes
+
+
+
+def tableIndexes(table_name):
+	'''
+		Вторичные индексы таблицы текущей БД со значениями в памяти
+
+		table_name - имя таблицы
+
+		return - список пар (имя индекса, индекс)
+	'''
+
+	return [(index_name, loadIndex(index_name, index))
+			for index_name, index in readIndexes().items()
+			if index['table_name'] == table_name]
+
+
+
+def indexKey(value):
+	'''
+		Ключ индекса для значения поля
+
+		value - значение поля в виде, в котором оно хранится в БД (не null)
+
+		return - int() для integer, строка без кавычек для string
+	'''
+
+	return value[1:-1] if value[0] == '\'' else int(value)
+
+
+
+def setIndexEntries(index, entries, nulls):
+	'''
+		Замена значений индекса в памяти
+
+		index - индекс (см. secondary_indexes)
+		entries - пары (ключ, номер записи) в любом порядке,
+				  отсортированные серии сливаются за линейное время
+		nulls - номера записей со значением null
+
+		return None
+	'''
+
+	entries.sort()
+	index['keys'] = [key for key, _ in entries]
+	index['rows'] = [row_num for _, row_num in entries]
+	index['nulls'] = sorted(nulls)
+
+
+
+def loadIndex(index_name, index):
+	'''
+		Загрузка значений индекса из файла в память,
+		если они ещё не загружены
+
+		index_name - имя индекса
+		index - индекс (см. secondary_indexes)
+
+		return - индекс
+	'''
+
+	if index['keys'] != None:
+		return index
+
+	entries = []
+	nulls = []
+	with open(indexPath(index_name), 'r') as index_file:
+		# Пропуск заголовка
+		index_file.readline()
+		index_file.readline()
+		for line in index_file:
+			value, row_num = line.rstrip('\n').rsplit('\t', 1)
+			if value == 'null':
+				nulls.append(int(row_num))
+			else:
+				entries.append((indexKey(value), int(row_num)))
+
+	setIndexEntries(index, entries, nulls)
+	return index
+
+
+
+def indexLines(index, entries, nulls):
+	'''
+		Строки файла индекса
+
+		index - индекс (см. secondary_indexes)
+		entries - пары (ключ, номер записи)
+		nulls - номера записей со значением null
+
+		return - генератор строк
+	'''
+
+	for key, row_num in entries:
+		if isinstance(key, str):
+			yield '\'' + key + '\'\t' + str(row_num) + '\n'
+		else:
+			yield str(key) + '\t' + str(row_num) + '\n'
+	for row_num in nulls:
+		yield 'null\t' + str(row_num) + '\n'
+
+
+
+def writeIndex(index_name, index):
+	'''
+		Запись индекса в файл целиком одной отсортированной серией,
+		индекс записывается во временный файл, который заменяет файл индекса
+
+		index_name - имя индекса
+		index - индекс со значениями в памяти
+
+		return None
+	'''
+
+	with open(indexPath(index_name) + DB_TEMP_EXTENSION, 'w') as index_file:
+		index_file.write('TABLE_NAME = {0}\nATTR_NAME = {1}\n'.format(index['table_name'], index['attr_name']))
+		index_file.writelines(indexLines(index, zip(index['keys'], index['rows']), index['nulls']))
+	os.replace(indexPath(index_name) + DB_TEMP_EXTENSION, indexPath(index_name))
+
+
+
+def buildIndex(index, records, start=0):
+	'''
+		Построение значений индекса по записям таблицы
+
+		index - индекс (см. secondary_indexes)
+		records - записи таблицы (см. recordParse) по порядку
+		start - номер первой записи
+
+		return - (пары (ключ, номер записи), номера записей со значением null)
+	'''
+
+	position = attrPositions(readTableSchema(index['table_name']))[index['attr_name']]
+	entries = []
+	nulls = []
+	for row_num, record in enumerate(records, start):
+		value = record[position]
+		if value == 'null':
+			nulls.append(row_num)
+		else:
+			entries.append((indexKey(value), row_num))
+
+	return entries, nulls
+
+
+
+def rebuildIndexes(table_name):
+	'''
+		Построение индексов таблицы заново по её записям
+
+		table_name - имя таблицы
+
+		return None
+	'''
+
+	# Прежние значения индексов не загружаются - файлы индексов перезаписываются
+	for index_name, index in readIndexes().items():
+		if index['table_name'] == table_name:
+			setIndexEntries(index, *buildIndex(index, readRecords(table_name)))
+			writeIndex(index_name, index)
+
+
+
+def appendIndexes(table_name, records):
+	'''
+		Добавление в индексы таблицы записей, дописанных в конец её тела,
+		значения дописываются в конец файла индекса отдельной серией
+
+		table_name - имя таблицы
+		records - дописанные записи (см. recordParse)
+
+		return None
+	'''
+
+	for index_name, index in tableIndexes(table_name):
+		entries, nulls = buildIndex(index, records, len(index['rows']) + len(index['nulls']))
+		entries.sort()
+		for key, row_num in entries:
+			position = bisect.bisect_right(index['keys'], key)
+			index['keys'].insert(position, key)
+			index['rows'].insert(position, row_num)
+		index['nulls'].extend(nulls)
+		with open(indexPath(index_name), 'a') as index_file:
+			index_file.writelines(indexLines(index, entries, nulls))
+
+
+
+def patchIndexes(table_name, deleted, updated):
+	'''
+		Изменение индексов таблицы после удаления и обновления записей
+		без чтения таблицы: номера записей за удалёнными сдвигаются
+
+		table_name - имя таблицы
+		deleted - номера удалённых записей
+		updated - обновлённые записи по номерам (см. transaction)
+
+		return None
+	'''
+
+	deleted = sorted(deleted)
+	removed = set(deleted).union(updated)
+	positions = attrPositions(readTableSchema(table_name))
+	for index_name, index in tableIndexes(table_name):
+		entries = [(key, row_num - bisect.bisect_left(deleted, row_num))
+				   for key, row_num in zip(index['keys'], index['rows']) if row_num not in removed]
+		nulls = [row_num - bisect.bisect_left(deleted, row_num)
+				 for row_num in index['nulls'] if row_num not in removed]
+		for row_num, record in updated.items():
+			value = record[positions[index['attr_name']]]
+			row_num -= bisect.bisect_left(deleted, row_num)
+			if value == 'null':
+				nulls.append(row_num)
+			else:
+				entries.append((indexKey(value), row_num))
+		setIndexEntries(index, entries, nulls)
+		writeIndex(index_name, index)
+
+
+
+def dropTableIndexes(table_name):
+	'''
+		Удаление индексов удалённой таблицы
+
+		table_name - имя таблицы
+
+		return None
+	'''
+
+	indexes = readIndexes()
+	for index_name in [index_name for index_name, index in indexes.items()
+					   if index['table_name'] == table_name]:
+		os.remove(indexPath(index_name))
+		indexes.pop(index_name)
+
+
+
+def lookupIndex(index, condition, isInteger):
+	'''
+		Поиск номеров записей по индексу
+
+		index - индекс со значениями в памяти
+		condition - условие с операцией =, < или > (см. checkWhereCondition)
+		isInteger - True, если поле индекса типа integer
+
+		return - номера записей, значения которых удовлетворяют условию
+	'''
+
+	value = condition['value']
+	if value == 'null':
+		# Сравнение с null на < и > всегда ложно
+		return index['nulls'] if condition['operator'] == '=' else []
+
+	# Значение другого типа не равно ни одному значению поля
+	if isInteger:
+		try:
+			key = int(value)
+		except ValueError:
+			return []
+	elif len(value) > 1 and value[0] == '\'' and value[-1] == '\'':
+		key = value[1:-1]
+	else:
+		return []
+
+	keys = index['keys']
+	if condition['operator'] == '=':
+		start, end = bisect.bisect_left(keys, key), bisect.bisect_right(keys, key)
+	elif condition['operator'] == '<':
+		start, end = 0, bisect.bisect_left(keys, key)
+	else:
+		start, end = bisect.bisect_right(keys, key), len(keys)
+
+	return index['rows'][start:end]
+
+
+
+def indexConditions(table_name, where):
+	'''
+		Выбор условий, проверяемых по вторичным индексам таблицы:
+		в каждой группе условий достаточно одного условия по индексу
+
+		table_name - имя таблицы
+		where - условия в дизъюнктивной форме (см. select),
+				имена полей с именем таблицы или без него
+
+		return - список условий по одному на группу,
+				 None - если условия нельзя проверить по индексам
+	'''
+
+	if where == None:
+		return None
+
+	attr_names = {index['attr_name'] for index in readIndexes().values() if index['table_name'] == table_name}
+	if attr_names == set():
+		return None
+
+	index_conditions = []
+	for conditions in where:
+		for condition in conditions:
+			if condition['attr_name'].split('.')[-1] in attr_names and condition['operator'] in ('=', '<', '>'):
+				index_conditions.append(condition)
+				break
+		else:
+			return None
+
+	return index_conditions
+
+
+
+def indexRows(table_name, where):
+	'''
+		Поиск записей тела таблицы по вторичным индексам
+
+		table_name - имя таблицы
+		where - условия в дизъюнктивной форме (см. select),
+				имена полей с именем таблицы или без него
+
+		return - отсортированный список номеров записей, среди которых
+				 находятся все записи, удовлетворяющие условиям,
+				 None - если условия нельзя проверить по индексам
+	'''
+
+	index_conditions = indexConditions(table_name, where)
+	if index_conditions == None:
+		return None
+
+	indexes = {index['attr_name'] : index for _, index in tableIndexes(table_name)}
+	table_schema = readTableSchema(table_name)
+	rows = set()
+	for condition in index_conditions:
+		attr_name = condition['attr_name'].split('.')[-1]
+		rows.update(lookupIndex(indexes[attr_name], condition, attrIsInteger(table_schema, attr_name)))
+
+	return sorted(rows)
+
+
+
+def checkRecords(table_name, table_schema, records):
+	'''
+		Проверка коректности и соответствия значений атрибутов записей схеме,
+		каждое поле проверяется один раз по всем записям,
+		уникальность - по хеш-индексу таблицы и среди самих записей
+
+		table_name - имя таблицы
+		table_schema - схема таблицы
+		records - список вставляемых данных (см. insert)
+
+		return - проверенные записи, значения integer приведены
+				 к каноническому виду ('020' -> '20')
+	'''
+
+	# Хеш-индекс уникальных полей таблицы
+	index = readUniqueIndex(table_name, table_schema)
+	schema = {attr['name'] : attr for attr in table_schema}
+	records = [dict(values) for values in records]
+
+	names = {}
+	for values in records:
+		names.update(dict.fromkeys(values))
+
+	for name in names:
+		if name not in schema:
+			# Если поле не найдено в таблице
+			raise SQL_DB_Exception('Таблица \'{0}\' поле \'{1}\' не существует !'.format(table_name, name))
+		attr = schema[name]
+		# Проверка правильности типов данных integer,
+		# '01' и '1' хранятся и сравниваются как одно значение
+		if attr['type'] == 'integer':
+			for values in records:
+				if name in values and values[name] != 'null':
+					try:
+						values[name] = str(int(values[name]))
+					except (TypeError, ValueError):
+						raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа integer !'.format(table_name, name))
+		column = [values[name] for values in records if name in values]
+		# Проверка допустимости значения NULL
+		if not attr['attr']['null'] and ('null' in column):
+			raise SQL_DB_Exception('Таблица \'{0}\' поле \'{1}\' не может быть null !'.format(table_name, name))
+		# Проверка правильности типов данных string
+		if attr['type'] == 'string':
+			for value in column:
+				if ((value[0] != '\'' or value[-1] != '\'') and
+				    value != 'null'):
+					raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа string !'.format(table_name, name))
+		# Проверка уникальности значений, в том числе среди вставляемых записей
+		if name in index:
+			column = [str(value) for value in column]
+			if len(set(column)) != len(column) or not index[name].isdisjoint(column):
+				raise SQL_DB_Exception('Таблица \'{0}\' поле \'{1}\' должно быть уникальным !'.format(table_name, name))
+
+	return records
+
+
+
+def checkRecordSize(table_name, table_schema, records):
+	'''
+		Проверка, что записи страничной БД помещаются на страницу,
+		выполняется до записи в журнал: запись, которая не помещается
+		на страницу, нельзя перенести из журнала в файл БД
+
+		table_name - имя таблицы
+		table_schema - схема таблицы
+		records - записи (см. recordParse), итератор
+
+		return None
+	'''
+
+	if session.current_db_storage != DB_STORAGE_PAGE:
+		return
+
+	for record in records:
+		size = sqlpage.recordSize(recordToRow(record), table_schema)
+		if size > sqlpage.PAGE_DATA_SIZE:
+			raise SQL_DB_Exception('В таблице \'{0}\' запись размером {1} байт не помещается на страницу !'.format(table_name, size))
+
+
+
+def insert(table_name, values):
+	'''NOT_READY
+		Вставка данных в таблицу текущей БД
+
+		table_name - таблица, в которую происходит добавление
+		values - добавляемая запись,
+				 пример = {
+				 	'age'  : 20,
+				 	'name' : 'Вася'
+				 }
+
+		return None
+	'''
+
+	insertRecords(table_name, [values])
+
+
+
+def insertRecords(table_name, records):
+	'''
+		Вставка нескольких записей в таблицу текущей БД:
+		записи проверяются вместе и записываются одной записью в журнал,
+		при ошибке ни одна запись не вставляется
+
+		table_name - таблица, в которую происходит добавление
+		records - список добавляемых записей (см. insert)
+
+		return None
+	'''
+
+	# Вне транзакции вставка выполняется отдельной транзакцией
+	if session.transaction == None:
+		return autocommit(insertRecords, table_name, records)
+
+	# Считывание схемы таблицы,
+	# если таблица не найдена - будет выброшено исключение
+	table_schema = readTableSchema(table_name)
+	records = checkRecords(table_name, table_schema, records)
+	records = [tuple(str(values[attr['name']]) if attr['name'] in values else 'null' for attr in table_schema)
+			   for values in records]
+	checkRecordSize(table_name, table_schema, records)
+
+	# Записи добавляются в образ таблицы
+	transactionTable(table_name)['inserted'].extend(records)
+
+	# Добавление значений записей в индекс
+	for record in records:
+		indexRecord(table_name, table_schema, record)
+
+
+
+def checkAttr(table_name, table_schema, attr_name):
+	'''
+		Проверка существования поля в таблице
+
+		table_name - имя таблицы
+		table_schema - схема таблицы
+		attr_name - имя поля
+
+		return None
+	'''
+
+	if attr_name not in [attr['name'] for attr in table_schema]:
+		raise SQL_DB_Exception('В таблице \'{0}\' поля \'{1}\' не существует !'.format(table_name, attr_name))
+
+
+
+def matchWhere(record, where, positions):
+	'''
+		Проверка условия раздела where запросов delete и update для записи
+
+		record - запись (см. recordParse)
+		where - условие (см. delete) или None
+		positions - номера полей таблицы по именам (см. attrPositions)
+
+		return - True/False
+	'''
+
+	if where == None:
+		return True
+
+	return checkCondition(record[positions[where['attr_name']]], where)
+
+
+
+def checkSetValue(table_name, table_schema, set_val):
+	'''
+		Проверка раздела set запроса update
+
+		table_name - имя таблицы
+		table_schema - схема таблицы
+		set_val - устанавливаемое значение поля (см. update)
+
+		return - значение для операции set:
+				 для '=' - значение в виде, в котором оно хранится в БД,
+				 для остальных операций - int()
+	'''
+
+	attr_name = set_val['attr_name']
+	checkAttr(table_name, table_schema, attr_name)
+
+	if attrIsPrimaryKey(table_schema, attr_name):
+		raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' является первичным ключом, его обновлять нельзя !'.format(table_name, attr_name))
+	if attrIsUnique(table_schema, attr_name):
+		raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' является альтернативным ключом, его обновлять нельзя !'.format(table_name, attr_name))
+
+	dvalue = set_val['dvalue']
+	if set_val['operator'] == '=':
+		if dvalue == 'null':
+			if not attrIsNull(table_schema, attr_name):
+				raise SQL_DB_Exception('Таблица \'{0}\' поле \'{1}\' не может быть null !'.format(table_name, attr_name))
+		elif attrIsInteger(table_schema, attr_name):
+			# Если поле integer - новое значение должно быть тоже integer
+			try:
+				dvalue = str(int(dvalue))
+			except (TypeError, ValueError):
+				raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа integer !'.format(table_name, attr_name))
+		elif attrIsString(table_schema, attr_name):
+			# Если поле string - новое значение должно быть тоже string
+			if dvalue[0] != '\'' or dvalue[-1] != '\'':
+				raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа string !'.format(table_name, attr_name))
+		return dvalue
+
+	if attrIsString(table_schema, attr_name):
+		raise SQL_DB_Exception('В таблице \'{0}\' к полю \'{1}\' типа string нельзя применять данную операцию !'.format(table_name, attr_name))
+	try:
+		dvalue = int(dvalue)
+	except (TypeError, ValueError):
+		raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа integer !'.format(table_name, attr_name))
+	if set_val['operator'] == '/=' and dvalue == 0:
+		raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' нельзя делить на ноль !'.format(table_name, attr_name))
+
+	return dvalue
+
+
+
+def updateRecord(record, position, set_val, dvalue):
+	'''
+		Обновление значения поля записи
+
+		record - запись (см. recordParse)
+		position - номер обновляемого поля в записи
+		set_val - устанавливаемое значение поля (см. update)
+		dvalue - проверенное значение для операции set (см. checkSetValue)
+
+		return - обновлённая запись,
+				 арифметика над null даёт null,
+				 деление - целочисленное
+	'''
+
+	value = record[position]
+	if set_val['operator'] == '=':
+		value = dvalue
+	elif value != 'null':
+		value = int(value)
+		if set_val['operator'] == '*=':
+			value *= dvalue
+		elif set_val['operator'] == '+=':
+			value += dvalue
+		elif set_val['operator'] == '-=':
+			value -= dvalue
+		elif set_val['operator'] == '/=':
+			value //= dvalue
+		value = str(value)
+
+	return record[:position] + (value,) + record[position + 1:]
+
+
+
+def delete(table_name, where):
+	'''
+		Удаление данных из таблицы текущей БД
+
+		table_name - имя таблицы
+		where -	условие в разделе where SQL-запроса
+				пример:
+				{
+					'attr_name' : 'возраст',
+					'operator'  : '=',		# допустимые: '=' '<>'
+					'value'     : '20'
+				}
+
+		return None
+	'''
+
+	# Считывание схемы таблицы
+	table_schema = readTableSchema(table_name)
+
+	# Если поле в where не существует
+	if where != None:
+		checkAttr(table_name, table_schema, where['attr_name'])
+
+	# Вне транзакции удаление выполняется отдельной транзакцией
+	if session.transaction == None:
+		return autocommit(delete, table_name, where)
+
+	# Удаляемые записи (найденные по индексу, если он есть) отмечаются
+	# в образе таблицы по номерам, вставленные в транзакции - удаляются из образа
+	deleted_records = []
+	positions = attrPositions(table_schema)
+	rows = None if where == None or where['operator'] != '=' else indexRows(table_name, ((where,),))
+	image = transactionTable(table_name)
+	for row_num, record in readNumberedRecords(table_name, rows):
+		if row_num != None and matchWhere(record, where, positions):
+			image['deleted'].add(row_num)
+			image['updated'].pop(row_num, None)
+			deleted_records.append(record)
+	inserted = []
+	for record in image['inserted']:
+		(deleted_records if matchWhere(record, where, positions) else inserted).append(record)
+	image['inserted'] = inserted
+
+	# Удаление значений удалённых записей из индекса
+	for record in deleted_records:
+		indexRecord(table_name, table_schema, record, True)
+
+
+
+def update(table_name, set_val, where):
+	'''
+		Обновление данных в таблице текущей БД
+
+		table_name - имя таблицы
+		set_val - устанавливаемое значение поля
+				  пример:
+				  {
+						# Было ... set зарплата *= 20 ...
+						'attr_name' : 'зарплата',
+						'operator'	: '*=', 			# допустимые '=' '*=' '+=' '-=' '/='
+						'dvalue'    : '20'
+				  }	  
+		where -	условие в разделе where SQL-запроса
+				пример:
+				{
+					'attr_name' : 'возраст',
+					'operator'  : '=',		# допустимые: '=' '<>'
+					'value'     : '20'
+				}
+
+		return None
+	'''
+
+	# Считывание схемы таблицы
+	table_schema = readTableSchema(table_name)
+
+	# Проверка полей в where и set
+	if where != None:
+		checkAttr(table_name, table_schema, where['attr_name'])
+	dvalue = checkSetValue(table_name, table_schema, set_val)
+
+	# Вне транзакции обновление выполняется отдельной транзакцией
+	if session.transaction == None:
+		return autocommit(update, table_name, set_val, where)
+
+	# Обновлённые записи (найденные по индексу, если он есть) заносятся
+	# в образ таблицы по номерам, вставленные в транзакции - обновляются в образе
+	positions = attrPositions(table_schema)
+	position = positions[set_val['attr_name']]
+	rows = None if where == None or where['operator'] != '=' else indexRows(table_name, ((where,),))
+	image = transactionTable(table_name)
+	updated = {}
+	for row_num, record in readNumberedRecords(table_name, rows):
+		if row_num != None and matchWhere(record, where, positions):
+			updated[row_num] = updateRecord(record, position, set_val, dvalue)
+	inserted = [updateRecord(record, position, set_val, dvalue) if matchWhere(record, where, positions) else record
+				for record in image['inserted']]
+
+	# Образ таблицы изменяется, только если все обновлённые записи помещаются на страницу
+	checkRecordSize(table_name, table_schema, itertools.chain(updated.values(), inserted))
+	image['updated'].update(updated)
+	image['inserted'] = inserted
+
+
+
+def loadValue(attr, value, isText):
+	'''
+		Преобразование значения поля из файла загрузки
+		в вид, в котором оно хранится в БД
+
+		attr - поле из схемы таблицы
+		value - значение: строка CSV или значение JSON
+		isText - True, если значение - строка CSV
+				 (пустая строка - null, integer записывается цифрами)
+
+		return - значение поля: 'null', '5', '\'vlad\'',
+				 при несоответствии типу поля - исключение ValueError
+	'''
+
+	if value == None or (isText and value == ''):
+		return 'null'
+
+	if attr['type'] == 'integer':
+		if isText:
+			value = int(value)
+		if not isinstance(value, int) or isinstance(value, bool):
+			raise ValueError(value)
+		return str(value)
+
+	# Кавычки и переводы строк в значении нарушили бы формат БД
+	if not isinstance(value, str) or re.search(r"['\r\n]", value):
+		raise ValueError(value)
+	return '\'' + value + '\''
+
+
+
+def loadRecords(table_name, table_schema, path, file_format, attr_names):
+	'''
+		Построчное чтение и проверка записей файла загрузки,
+		уникальность значений проверяется по хеш-индексу таблицы,
+		в который добавляются значения прочитанных записей
+
+		table_name - имя таблицы
+		table_schema - схема таблицы
+		path - путь к файлу загрузки
+		file_format - LOAD_FORMAT_CSV/LOAD_FORMAT_JSONL
+		attr_names - имена полей столбцов CSV, None - первая строка файла
+
+		return - генератор записей (см. recordParse)
+	'''
+
+	schema = {attr['name'] : attr for attr in table_schema}
+	positions = attrPositions(table_schema)
+	required = [attr['name'] for attr in table_schema if not attr['attr']['null']]
+	index = readUniqueIndex(table_name, table_schema)
+	isText = file_format == LOAD_FORMAT_CSV
+
+	with open(path, 'r', encoding='utf-8', newline='') as load_file:
+		# Записи файла в виде (номер строки, {имя поля : значение})
+		if isText:
+			reader = csv.reader(load_file)
+			if attr_names == None:
+				attr_names = [name.strip() for name in next(reader, [])]
+			rows = ((reader.line_num, row) for row in reader if row != [])
+		else:
+			rows = ((line_num, line) for line_num, line in enumerate(load_file, 1) if line.strip() != '')
+
+		for line_num, row in rows:
+			error = 'Файл \'{0}\' строка {1}: '.format(path, line_num)
+			if isText:
+				if len(row) != len(attr_names):
+					raise SQL_DB_Exception(error + 'число значений не совпадает с числом полей !')
+				row = dict(zip(attr_names, row))
+			else:
+				try:
+					row = json.loads(row)
+				except ValueError:
+					raise SQL_DB_Exception(error + 'неправильный JSON !')
+				if not isinstance(row, dict):
+					raise SQL_DB_Exception(error + 'ожидался объект JSON !')
+
+			# Проверка значений по схеме таблицы
+			record = ['null'] * len(table_schema)
+			for name, value in row.items():
+				if name not in schema:
+					raise SQL_DB_Exception(error + 'таблица \'{0}\' поле \'{1}\' не существует !'.format(table_name, name))
+				attr = schema[name]
+				try:
+					value = loadValue(attr, value, isText)
+				except ValueError:
+					raise SQL_DB_Exception(error + 'поле \'{0}\' может принимать только значение типа {1} !'.format(name, attr['type']))
+				if value == 'null' and not attr['attr']['null']:
+					raise SQL_DB_Exception(error + 'поле \'{0}\' не может быть null !'.format(name))
+				if name in index and value in index[name]:
+					raise SQL_DB_Exception(error + 'поле \'{0}\' должно быть уникальным !'.format(name))
+				record[positions[name]] = value
+			for name in required:
+				if name not in row:
+					raise SQL_DB_Exception(error + 'поле \'{0}\' не может быть null !'.format(name))
+
+			record = tuple(record)
+			try:
+				checkRecordSize(table_name, table_schema, (record,))
+			except SQL_DB_Exception:
+				raise SQL_DB_Exception(error + 'запись не помещается на страницу !')
+			indexRecord(table_name, table_schema, record)
+			yield record
+
+
+
+def load(table_name, path, file_format=None, attr_names=None):
+	'''
+		Массовая загрузка записей в таблицу текущей БД из файла CSV или JSON Lines,
+		записи читаются и проверяются построчно за один проход и записываются
+		в журнал одной записью, при ошибке ни одна запись не загружается
+
+		table_name - имя таблицы
+		path - путь к файлу загрузки:
+			   CSV - первая строка содержит имена полей (если не задан attr_names),
+					 пустое значение - null
+			   JSON Lines - в каждой строке объект {"имя поля" : значение}
+		file_format - LOAD_FORMAT_CSV/LOAD_FORMAT_JSONL,
+					  None - по расширению файла (.csv - CSV, иначе - JSON Lines)
+		attr_names - имена полей столбцов CSV или None
+
+		return - число загруженных записей
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	if file_format == None:
+		file_format = LOAD_FORMAT_CSV if path.lower().endswith('.csv') else LOAD_FORMAT_JSONL
+	if file_format not in (LOAD_FORMAT_CSV, LOAD_FORMAT_JSONL):
+		raise SQL_DB_Exception('Неизвестный формат файла загрузки \'{0}\' !'.format(file_format))
+	if attr_names != None and file_format != LOAD_FORMAT_CSV:
+		raise SQL_DB_Exception('Имена полей задаются только для файла CSV !')
+	if not os.path.isfile(path):
+		raise SQL_DB_Exception('Файл \'{0}\' не существует !'.format(path))
+
+	# Вне транзакции загрузка выполняется отдельной транзакцией
+	if session.transaction == None:
+		return autocommit(load, table_name, path, file_format, attr_names)
+
+	table_schema = readTableSchema(table_name)
+	try:
+		records = list(loadRecords(table_name, table_schema, path, file_format, attr_names))
+	except:
+		# Индекс таблицы строится заново без значений незагруженных записей
+		session.unique_indexes.pop(table_name, None)
+		raise
+
+	# Записи добавляются в образ таблицы
+	transactionTable(table_name)['inserted'].extend(records)
+	return len(records)
+
+
+
+def transactionTable(table_name):
+	'''
+		Получение образа таблицы в текущей транзакции
+
+		table_name - имя таблицы
+
+		return - образ таблицы (см. transaction)
+	'''
+
+	return session.transaction['tables'].setdefault(table_name, {
+		'inserted' : [],
+		'deleted'  : set(),
+		'updated'  : {}
+	})
+
+
+
+def begin(isExplicit=True):
+	'''
+		Начало транзакции в текущей БД,
+		неявная транзакция (пакет запросов) перед этим фиксируется
+
+		isExplicit - True - транзакция начата явно (BEGIN),
+					 False - пакет запросов одного вызова exec
+
+		return None
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	if session.transaction != None:
+		if session.transaction['isExplicit']:
+			raise SQL_DB_Exception('Транзакция уже начата !')
+		commit()
+
+	session.transaction = {
+		'isExplicit' : isExplicit,
+		'tables'     : {}
+	}
+
+
+
+def autocommit(operation, *args):
+	'''
+		Выполнение изменения вне транзакции отдельной транзакцией
+
+		operation - функция изменения (insertRecords, delete, update, load)
+		args - аргументы функции
+
+		return - результат функции
+	'''
+
+	begin(False)
+	try:
+		result = operation(*args)
+	except:
+		rollback()
+		raise
+	commit()
+
+	return result
+
+
+
+def commit():
+	'''
+		Фиксация текущей транзакции: изменения таблиц дописываются
+		в журнал одной записью, которая сбрасывается на диск, и переносятся
+		в изменения журнала в памяти, при переполнении журнала
+		изменения переносятся в файлы БД (см. checkpoint)
+
+		return None
+	'''
+
+	if session.transaction == None:
+		return
+
+	tables = {table_name : image for table_name, image in session.transaction['tables'].items()
+			  if image['inserted'] != [] or image['deleted'] or image['updated']}
+	session.transaction = None
+	if tables == {}:
+		return
+
+	try:
+		writeJournal([line for table_name, image in tables.items()
+					  for line in journalLines(table_name, image)] + ['COMMIT\n'])
+	except:
+		# Индексы изменённых таблиц строятся заново
+		for table_name in tables:
+			session.unique_indexes.pop(table_name, None)
+		raise
+
+	offset = os.path.getsize(walPath())
+	for table_name, image in tables.items():
+		journalApply(table_name, image, offset)
+
+	if offset > WAL_MAX_SIZE:
+		checkpoint()
+
+
+
+def rollback():
+	'''
+		Откат текущей транзакции: образы таблиц отбрасываются
+
+		return None
+	'''
+
+	if session.transaction == None:
+		return
+
+	# Индексы изменённых таблиц строятся заново
+	for table_name in session.transaction['tables']:
+		session.unique_indexes.pop(table_name, None)
+	session.transaction = None
+
+
+
+def walPath():
+	'''
+		Путь к журналу текущей БД
+
+		return - путь к файлу журнала
+	'''
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		return session.current_db_name + DB_WAL_EXTENSION
+
+	return os.path.join(session.current_db_name + DB_EXTENSION, DB_WAL_NAME)
+
+
+
+def syncFile(db):
+	'''
+		Сброс записанного в файл на диск
+
+		db - открытый на запись файл
+
+		return None
+	'''
+
+	db.flush()
+	os.fsync(db.fileno())
+
+
+
+def syncDir(path):
+	'''
+		Сброс на диск изменений каталога файловой системы
+		(созданных, переименованных файлов), в Windows не требуется
+
+		path - путь к каталогу
+
+		return None
+	'''
+
+	if os.name != 'posix':
+		return
+
+	fd = os.open(path or '.', os.O_RDONLY)
+	try:
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+
+
+
+def journalLines(table_name, image):
+	'''
+		Строки журнала для изменений таблицы в транзакции
+
+		table_name - имя таблицы
+		image - образ таблицы (см. transaction)
+
+		return - генератор строк журнала
+	'''
+
+	table_schema = readTableSchema(table_name)
+	for row_num in sorted(image['deleted']):
+		yield 'D\t{0}\t{1}\n'.format(table_name, row_num)
+	for row_num, record in sorted(image['updated'].items()):
+		yield 'U\t{0}\t{1}\t{2}\n'.format(table_name, row_num, recordUnparse(record, table_schema))
+	for record in image['inserted']:
+		yield 'I\t{0}\t{1}\n'.format(table_name, recordUnparse(record, table_schema))
+
+
+
+def writeJournal(lines):
+	'''
+		Дописывание строк в журнал текущей БД со сбросом на диск,
+		при ошибке журнал обрезается до прежнего размера: недописанная
+		или не сброшенная на диск запись не должна остаться в журнале
+		и быть прочитана другими соединениями как зафиксированная
+
+		lines - строки журнала
+
+		return None
+	'''
+
+	path = walPath()
+	isNew = not os.path.isfile(path)
+	data = ''.join(lines).encode('utf-8')
+	# Без буфера: после ошибки закрытие файла не дописывает буфер в журнал
+	with open(path, 'ab', buffering=0) as wal:
+		size = wal.seek(0, os.SEEK_END)
+		try:
+			written = 0
+			while written < len(data):
+				written += wal.write(data[written:])
+			syncFile(wal)
+		except:
+			try:
+				wal.truncate(size)
+				os.fsync(wal.fileno())
+			except OSError:
+				# Журнал на диске может содержать запись, о которой
+				# соединение не знает, - БД открывается заново
+				closeDB()
+			raise
+
+	# Созданный файл журнала должен сохраниться в каталоге
+	if isNew:
+		syncDir(os.path.dirname(path))
+
+
+
+def journalApply(table_name, image, offset):
+	'''
+		Перенос изменений таблицы в изменения журнала в памяти
+
+		table_name - имя таблицы
+		image - образ таблицы (см. transaction)
+		offset - размер журнала после записи фиксации изменений
+
+		return None
+	'''
+
+	if table_name not in session.journal_tables:
+		session.journal_tables[table_name] = {
+			'inserted' : [],
+			'deleted'  : set(),
+			'updated'  : {},
+			'stats'    : readCatalog()[table_name]['stats']
+		}
+	journal = session.journal_tables[table_name]
+
+	# Статистика уточняется по изменениям до их наложения
+	if journal['stats'] != None:
+		journal['stats'] = updateStats(journal['stats'], image, readTableSchema(table_name))
+
+	journal['deleted'].update(image['deleted'])
+	for row_num in image['deleted']:
+		journal['updated'].pop(row_num, None)
+	journal['updated'].update(image['updated'])
+	journal['inserted'].extend(image['inserted'])
+	journal['offset'] = offset
+	session.column_cache.pop(table_name, None)
+
+
+
+def journalChanges(image):
+	'''
+		Изменения таблицы из журнала для переноса в файл таблицы
+
+		image - изменения таблицы (см. journal_tables)
+
+		return - (номера удалённых записей тела таблицы,
+				  обновлённые записи тела таблицы по номерам,
+				  вставленные записи без удалённых с учётом обновлений)
+	'''
+
+	deleted = {row_num for row_num in image['deleted'] if row_num >= 0}
+	updated = {row_num : record for row_num, record in image['updated'].items() if row_num >= 0}
+	inserted = [image['updated'].get(-1 - i, record) for i, record in enumerate(image['inserted'])
+				if -1 - i not in image['deleted']]
+
+	return deleted, updated, inserted
+
+
+
+def journalStats(tables):
+	'''
+		Статистика таблиц с изменениями из журнала для записи в каталог
+
+		tables - изменения таблиц (см. journal_tables)
+
+		return - статистика по именам таблиц (см. analyze),
+				 только для таблиц, статистика которых собрана
+	'''
+
+	return {table_name : image['stats'] for table_name, image in tables.items()
+			if image.get('stats') != None}
+
+
+
+def checkpoint(isCompact=False):
+	'''
+		Перенос изменений из журнала в файлы текущей БД (контрольная точка):
+		новые файлы таблиц записываются рядом со старыми и сбрасываются на диск,
+		затем в журнал дописывается отметка CHECKPOINT, после которой
+		новые файлы заменяют старые, а журнал очищается.
+		При сбое до отметки изменения восстанавливаются из журнала,
+		после отметки - замена файлов завершается при выборе БД (см. recoverDB)
+
+		Перенос завершает транзакцию
+
+		isCompact - True, если тела всех таблиц с непустыми хвостами
+					текстовой БД перезаписываются вместе с хвостами
+
+		return None
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	# Номера записей в образах транзакции после переноса устарели бы
+	if session.transaction != None:
+		commit()
+
+	tables = session.journal_tables
+	if isCompact and session.current_db_storage == DB_STORAGE_TEXT:
+		tables = dict(session.journal_tables)
+		for table_name in readCatalog():
+			tail_path = tablePath(table_name, DB_TAIL_EXTENSION)
+			if os.path.isfile(tail_path) and os.path.getsize(tail_path) > 0:
+				tables.setdefault(table_name, {
+					'inserted' : [],
+					'deleted'  : set(),
+					'updated'  : {}
+				})
+	if tables == {}:
+		return
+
+	try:
+		if session.current_db_storage == DB_STORAGE_PAGE:
+			checkpointPage(tables)
+		else:
+			checkpointText(tables, isCompact)
+	except:
+		removeTemps()
+		raise
+
+	writeJournal(['CHECKPOINT\t' + ' '.join(tables) + '\n'])
+	finishCheckpoint(tables)
+	session.journal_tables = {}
+
+	# Файл схем текстовой БД заменён файлом со статистикой перенесённых
+	# таблиц, каталог обновляется без перечитывания
+	stats = journalStats(tables)
+	if session.current_db_storage == DB_STORAGE_TEXT and stats != {}:
+		for table_name, table_stats in stats.items():
+			session.catalog[table_name]['stats'] = table_stats
+		session.catalog_stamp = dbStamp()
+
+	# В страничной БД значения из журнала переносятся значениями python (020 -> 20),
+	# поэтому кеш перенесённых таблиц строится заново
+	for table_name in tables:
+		session.column_cache.pop(table_name, None)
+
+	# Изменение вторичных индексов таблиц
+	for table_name, image in tables.items():
+		deleted, updated, inserted = journalChanges(image)
+		if deleted or updated:
+			patchIndexes(table_name, deleted, updated)
+		if inserted != []:
+			appendIndexes(table_name, inserted)
+
+	# Очистка журнала
+	with open(walPath(), 'w') as wal:
+		syncFile(wal)
+
+
+
+def checkpointText(tables, isCompact=False):
+	'''
+		Запись временных файлов таблиц текстовой БД с изменениями из журнала:
+		если записи только вставлялись - они дописываются к хвосту таблицы,
+		иначе тело таблицы перезаписывается вместе с хвостом,
+		удалённые и обновлённые по номерам записи заменяются без разбора остальных
+
+		tables - изменения таблиц (см. journal_tables)
+		isCompact - True, если тела таблиц перезаписываются всегда
+
+		return None
+	'''
+
+	for table_name, image in tables.items():
+		table_schema = readTableSchema(table_name)
+		deleted, updated, inserted = journalChanges(image)
+		lines = [recordUnparse(record, table_schema) + '\n' for record in inserted]
+		tail_path = tablePath(table_name, DB_TAIL_EXTENSION)
+		tail_size = os.path.getsize(tail_path) if os.path.isfile(tail_path) else 0
+
+		with open(tablePath(table_name, DB_TAIL_EXTENSION + DB_TEMP_EXTENSION), 'w') as tmp_tail:
+			if isCompact or deleted or updated or tail_size + sum(map(len, lines)) > TAIL_MAX_SIZE:
+				# Перезапись тела таблицы, хвост переносится в тело и становится пустым
+				isBodyFind = False
+				isRecord = False
+				with open(tablePath(table_name), 'r') as db,\
+				     open(tablePath(table_name, DB_EXTENSION + DB_TEMP_EXTENSION), 'w') as tmp_db:
+					for line in mergeTail(db, table_name):
+						if '#BODY' == line.strip():
+							isBodyFind = True
+						elif isBodyFind and ('{' == line.strip()):
+							isRecord = True
+							row_num = -1
+						elif isBodyFind and ('}' == line.strip()):
+							tmp_db.write(''.join('\t' + record for record in lines))
+							isBodyFind = False
+							isRecord = False
+						elif isRecord and line.strip() != '':
+							row_num += 1
+							if row_num in deleted:
+								continue
+							if row_num in updated:
+								line = '\t' + recordUnparse(updated[row_num], table_schema) + '\n'
+						tmp_db.write(line)
+					syncFile(tmp_db)
+			else:
+				# Дописывание вставленных записей к хвосту таблицы
+				if tail_size > 0:
+					with open(tail_path, 'r') as tail_db:
+						shutil.copyfileobj(tail_db, tmp_tail)
+				tmp_tail.writelines(lines)
+			syncFile(tmp_tail)
+
+	# Статистика перенесённых таблиц записывается во временный файл схем
+	stats = journalStats(tables)
+	tmp_path = dbPath() + DB_TEMP_EXTENSION
+	if stats != {}:
+		writeCatalog(tmp_path, {table_name : dict(table, stats=stats.get(table_name, table['stats']))
+								for table_name, table in readCatalog().items()})
+	elif os.path.isfile(tmp_path):
+		os.remove(tmp_path)
+
+
+
+def checkpointPage(tables):
+	'''
+		Запись временной копии файла страничной БД с изменениями из журнала,
+		неизменённые записи копируются без перекодирования
+
+		tables - изменения таблиц (см. journal_tables)
+
+		return None
+	'''
+
+	tmp_path = dbPath() + DB_TEMP_EXTENSION
+	shutil.copyfile(dbPath(), tmp_path)
+	for table_name, image in tables.items():
+		table_schema = readTableSchema(table_name)
+		deleted, updated, inserted = journalChanges(image)
+		rows = list(map(recordToRow, inserted))
+		if deleted or updated:
+			records = itertools.chain((recordToRow(updated[row_num]) if row_num in updated else row
+									   for row_num, row in enumerate(sqlpage.readRecords(dbPath(), table_name, isRaw=True))
+									   if row_num not in deleted),
+									  rows)
+			sqlpage.rewriteTable(tmp_path, table_name, records)
+		elif rows != []:
+			sqlpage.appendRecords(tmp_path, table_name, rows)
+
+	stats = journalStats(tables)
+	if stats != {}:
+		sqlpage.writeStats(tmp_path, stats)
+
+	with open(tmp_path, 'rb+') as tmp_db:
+		syncFile(tmp_db)
+
+
+
+def finishCheckpoint(table_names):
+	'''
+		Замена файлов текущей БД временными файлами, записанными
+		при переносе изменений из журнала, в текстовой БД - файлов таблиц
+		и файла схем со статистикой перенесённых таблиц
+
+		table_names - имена таблиц, изменения которых переносились
+
+		return None
+	'''
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		if os.path.isfile(dbPath() + DB_TEMP_EXTENSION):
+			os.replace(dbPath() + DB_TEMP_EXTENSION, dbPath())
+			pageWritten(sqlpage.readTables(dbPath()))
+		syncDir(os.path.dirname(dbPath()))
+		return
+
+	for table_name in table_names:
+		replaceTable(table_name)
+	if os.path.isfile(dbPath() + DB_TEMP_EXTENSION):
+		os.replace(dbPath() + DB_TEMP_EXTENSION, dbPath())
+	syncDir(session.current_db_name + DB_EXTENSION)
+
+
+
+def removeTemps():
+	'''
+		Удаление временных файлов текущей БД, оставшихся от прерванного
+		переноса изменений из журнала
+
+		return None
+	'''
+
+	paths = [dbPath() + DB_TEMP_EXTENSION]
+	if session.current_db_storage == DB_STORAGE_TEXT:
+		paths += [tablePath(table_name, extension + DB_TEMP_EXTENSION)
+				  for table_name in readCatalog() for extension in (DB_EXTENSION, DB_TAIL_EXTENSION)]
+
+	for path in paths:
+		if os.path.isfile(path):
+			os.remove(path)
+
+
+
+def journalRecord(record):
+	'''
+		Проверка формата записи из журнала изменений
+
+		record - запись в журнале (см. recordUnparse)
+
+		return - запись, при неправильном формате - исключение ValueError
+	'''
+
+	if RECORD_CHECK_PATTERN.fullmatch(record) == None:
+		raise ValueError(record)
+	return record
+
+
+
+def recoverDB():
+	'''
+		Восстановление изменений текущей БД из журнала при её выборе:
+		если в журнале есть отметка CHECKPOINT - завершается прерванный
+		перенос изменений в файлы БД, иначе зафиксированные транзакции
+		переносятся в изменения журнала в памяти, а недописанная
+		последняя транзакция отбрасывается. Испорченная строка последней
+		транзакции отбрасывается вместе с транзакцией, испорченная строка
+		перед зафиксированными транзакциями - исключение, БД перестаёт
+		быть текущей
+
+		return None
+	'''
+
+	session.journal_tables = {}
+	path = walPath()
+	if not os.path.isfile(path):
+		return
+
+	with open(path, 'rb') as wal:
+		lines = wal.readlines()
+
+	for line in lines:
+		if line.startswith(b'CHECKPOINT\t') and line.endswith(b'\n'):
+			# Файлы переноса уже сброшены на диск, индексы строятся заново
+			table_names = line.decode('utf-8').split('\t', 1)[1].split()
+			finishCheckpoint(table_names)
+			tables = readCatalog()
+			for table_name in table_names:
+				if table_name in tables:
+					rebuildIndexes(table_name)
+			with open(path, 'w') as wal:
+				syncFile(wal)
+			return
+
+	removeTemps()
+
+	images = {}
+	positions = {}
+	size = 0
+	committed_size = 0
+	for i, line in enumerate(lines):
+		# Недописанная строка - конец журнала
+		if not line.endswith(b'\n'):
+			break
+		if line == b'COMMIT\n':
+			size += len(line)
+			for table_name, image in images.items():
+				journalApply(table_name, image, size)
+			images = {}
+			committed_size = size
+			continue
+
+		try:
+			operation, table_name, value = line.decode('utf-8').rstrip('\n').split('\t', 2)
+			if table_name not in positions:
+				positions[table_name] = attrPositions(readTableSchema(table_name))
+			if operation == 'I':
+				change = ('inserted', recordParse(journalRecord(value), positions[table_name]))
+			elif operation == 'D':
+				change = ('deleted', int(value))
+			elif operation == 'U':
+				row_num, record = value.split('\t', 1)
+				change = ('updated', (int(row_num), recordParse(journalRecord(record), positions[table_name])))
+			else:
+				raise ValueError(operation)
+		except (ValueError, KeyError, SQL_DB_Exception):
+			# После испорченной строки есть зафиксированные транзакции -
+			# отбросить их нельзя
+			if b'COMMIT\n' in lines[i+1:]:
+				closeDB()
+				raise SQL_DB_Exception('Испорченная строка журнала \'{0}\' со смещением {1} !'.format(path, size))
+			logger.warning('Испорченная строка журнала %s со смещением %d: '
+						   'незафиксированная транзакция отброшена', path, size)
+			break
+		size += len(line)
+
+		image = images.setdefault(table_name, {
+			'inserted' : [],
+			'deleted'  : set(),
+			'updated'  : {}
+		})
+		if change[0] == 'inserted':
+			image['inserted'].append(change[1])
+		elif change[0] == 'deleted':
+			image['deleted'].add(change[1])
+		else:
+			image['updated'][change[1][0]] = change[1][1]
+
+	# Отбрасывание недописанной транзакции
+	if committed_size != os.path.getsize(path):
+		os.truncate(path, committed_size)
+
+
+
+def unserializeValue(value):
+	'''
+		Преобразование значения поля из вида, в котором оно хранится в БД, в значение python
+
+		value - значение поля
+
+		return - null -> None, integer -> int(), string -> str() без кавычек вокруг
+	'''
+
+	if value == 'null':
+		return None
+	elif value[0] == '\'' and value[-1] == '\'':
+		return value[1:-1]
+	else:
+		return int(value)
+
+
+
+def tableSize(table_name):
+	'''
+		Размер тела таблицы в байтах (без учёта хвоста)
+
+		table_name - имя таблицы
+
+		return - размер тела таблицы
+	'''
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		return readCatalog()[table_name]['pages'] * sqlpage.PAGE_SIZE
+	return os.path.getsize(tablePath(table_name))
+
+
+
+def openMap(path):
+	'''
+		Отображение файла БД в память только для чтения
+
+		path - путь к файлу БД
+
+		return - отображённый в память файл (mmap), используется в with,
+				 пустой файл отобразить нельзя - для него пустая строка байт
+	'''
+
+	with open(path, 'rb') as db:
+		if os.fstat(db.fileno()).st_size == 0:
+			return contextlib.nullcontext(b'')
+		return mmap.mmap(db.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+
+def mapFile(path):
+	'''
+		Отображение файла БД в память только для чтения для кеша
+		открытых файлов (см. cachedFile), отображение закрывается,
+		когда на него не остаётся ссылок
+
+		path - путь к файлу БД
+
+		return - отображённый в память файл (mmap),
+				 для пустого файла - пустая строка байт
+	'''
+
+	with open(path, 'rb') as db:
+		if os.fstat(db.fileno()).st_size == 0:
+			return b''
+		return mmap.mmap(db.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+
+def cachedFile(path, read):
+	'''
+		Получение прочитанного файла текущей БД из кеша открытых файлов,
+		файл читается заново, только если он был заменён (os.replace)
+		или изменён. В Windows отображённый в память файл нельзя заменить,
+		поэтому файлы не кешируются
+
+		path - путь к файлу
+		read - функция чтения файла по пути: mapFile, readLines
+
+		return - прочитанный файл
+	'''
+
+	if os.name != 'posix':
+		return read(path)
+
+	try:
+		stat = os.stat(path)
+	except FileNotFoundError:
+		session.file_cache.pop(path, None)
+		raise
+
+	stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+	cached = session.file_cache.get(path)
+	if cached != None and cached[0] == stamp:
+		return cached[1]
+
+	content = read(path)
+	session.file_cache[path] = (stamp, content)
+
+	return content
+
+
+
+def readBodyLines(table_name, rows=None):
+	'''
+		Построчное чтение тела таблицы текущей БД вместе с записями хвоста,
+		записи выделяются регулярным выражением по байтам в отображённом
+		в память файле таблицы без построчного чтения файла
+
+		table_name - имя таблицы
+		rows - отсортированные номера записей (сначала тело, затем хвост),
+			   которые нужно прочитать, None - все записи
+
+		return - генератор записей тела таблицы в виде строк
+	'''
+
+	# Если таблица не найдена - будет выброшено исключение
+	readTableSchema(table_name)
+	tail = readTail(table_name)
+
+	buffer = cachedFile(tablePath(table_name), mapFile)
+	start = buffer.find(b'{') + 1
+	end = buffer.rfind(b'}', start)
+	if rows == None:
+		# Записи тела таблицы
+		for match in RECORD_PATTERN.finditer(buffer, start, end):
+			yield match.group(1).decode()
+		# Записи хвоста
+		yield from tail
+		return
+
+	# Декодируются только записи с заданными номерами
+	wanted = iter(rows)
+	row = next(wanted, None)
+	for row_num, record in enumerate(itertools.chain(RECORD_PATTERN.finditer(buffer, start, end), tail)):
+		if row == None:
+			return
+		if row_num == row:
+			yield record if isinstance(record, str) else record.group(1).decode()
+			row = next(wanted, None)
+
+
+
+def readTableRecords(table_name, rows=None):
+	'''
+		Чтение записей таблицы из файла БД без учёта текущей транзакции
+		независимо от формата хранения
+
+		table_name - имя таблицы
+		rows - отсортированные номера записей, которые нужно прочитать,
+			   None - все записи
+
+		return - итератор пар (номер записи, запись (см. recordParse))
+	'''
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		records = map(rowToRecord, sqlpage.readRecords(dbPath(), table_name, rows))
+	else:
+		positions = attrPositions(readTableSchema(table_name))
+		records = (recordParse(record, positions) for record in readBodyLines(table_name, rows))
+
+	return enumerate(records) if rows == None else zip(rows, records)
+
+
+
+def tableImages(table_name):
+	'''
+		Изменения таблицы текущей БД, не перенесённые в файлы БД:
+		из журнала и из текущей транзакции
+
+		table_name - имя таблицы
+
+		return - список пар (образ таблицы, True - изменения из журнала)
+	'''
+
+	images = []
+	if table_name in session.journal_tables:
+		images.append((session.journal_tables[table_name], True))
+	if session.transaction != None and table_name in session.transaction['tables']:
+		images.append((session.transaction['tables'][table_name], False))
+
+	return images
+
+
+
+def overlayRecords(records, image, isJournal):
+	'''
+		Наложение изменений на записи таблицы
+
+		records - итератор пар (номер записи, запись (см. recordParse))
+		image - образ таблицы (см. transaction, journal_tables)
+		isJournal - True - изменения из журнала, вставленные записи
+					нумеруются -1, -2, ..., иначе номер вставленных записей - None
+
+		return - генератор пар (номер записи, запись)
+	'''
+
+	deleted = image['deleted']
+	updated = image['updated']
+	for row_num, record in records:
+		if row_num not in deleted:
+			yield row_num, updated.get(row_num, record)
+	for i, record in enumerate(image['inserted']):
+		if not isJournal:
+			yield None, record
+		elif -1 - i not in deleted:
+			yield -1 - i, updated.get(-1 - i, record)
+
+
+
+def readNumberedRecords(table_name, rows=None):
+	'''
+		Построчное чтение записей таблицы текущей БД с учётом изменений
+		из журнала и текущей транзакции
+
+		table_name - имя таблицы
+		rows - отсортированные номера записей тела таблицы (см. indexRows),
+			   которые нужно прочитать, None - все записи;
+			   обновлённые и вставленные записи читаются всегда
+
+		return - генератор пар (номер записи, запись (см. recordParse)):
+				 записи тела таблицы нумеруются с 0, вставленные записи
+				 из журнала - -1, -2, ..., вставленные в транзакции - None
+	'''
+
+	images = tableImages(table_name)
+	if rows != None:
+		updated = [row_num for image, _ in images for row_num in image['updated'] if row_num >= 0]
+		if updated != []:
+			rows = sorted(set(rows).union(updated))
+
+	records = readTableRecords(table_name, rows)
+	for image, isJournal in images:
+		records = overlayRecords(records, image, isJournal)
+
+	yield from records
+
+
+
+def readRecords(table_name, rows=None):
+	'''
+		Построчное чтение записей таблицы текущей БД
+		независимо от формата хранения
+
+		table_name - имя таблицы
+		rows - номера записей, которые нужно прочитать (см. readNumberedRecords)
+
+		return - генератор записей (см. recordParse)
+	'''
+
+	for _, record in readNumberedRecords(table_name, rows):
+		yield record
+
+
+
+def readAttrValues(table_name, attr_name):
+	'''
+		Чтение значений одного поля всех записей таблицы текущей БД,
+		в текстовой БД значения выделяются регулярным выражением
+		прямо из отображённого в память файла таблицы без разбора записей
+
+		table_name - имя таблицы
+		attr_name - имя поля
+
+		return - генератор значений поля в виде, в котором они хранятся в БД
+	'''
+
+	# Если таблица не найдена - будет выброшено исключение
+	positions = attrPositions(readTableSchema(table_name))
+	position = positions[attr_name]
+
+	# Записи, вставленные в журнале и текущей транзакции
+	images = tableImages(table_name)
+	inserted = [record for image, _ in images for record in image['inserted']]
+
+	if (session.current_db_storage == DB_STORAGE_PAGE or
+	    any(image['deleted'] or image['updated'] for image, _ in images)):
+		for record in readRecords(table_name):
+			yield record[position]
+		return
+
+	tail = readTail(table_name)
+	# Строки в кавычках пропускаются целиком: внутри них может быть ', (имя, '
+	pattern = re.compile(rb"'[^'\r\n]*'|(?:^[ \t]*\(\(|, \()" + re.escape(attr_name.encode()) +
+						 rb", ('[^'\r\n]*'|[^,()'\r\n]*)\)", re.M)
+
+	# Значения поля в теле таблицы
+	buffer = cachedFile(tablePath(table_name), mapFile)
+	start = buffer.find(b'{') + 1
+	end = buffer.rfind(b'}', start)
+	for match in pattern.finditer(buffer, start, end):
+		if match.group(1) != None:
+			yield match.group(1).decode()
+
+	# Значения поля в записях хвоста и вставленных записях
+	for record in itertools.chain((recordParse(record, positions) for record in tail), inserted):
+		yield record[position]
+
+
+
+def tableAttrNames(table_name):
+	'''
+		Имена полей записей таблицы текущей БД для выборки
+
+		table_name - имя таблицы
+
+		return - список имён полей в виде table_name.attr_name в порядке полей схемы
+	'''
+
+	return [table_name + '.' + attr['name'] for attr in readTableSchema(table_name)]
+
+
+
+def wherePositions(where, attr_names):
+	'''
+		Привязка условий where к номерам полей записей выборки
+
+		where - проверенные условия в дизъюнктивной форме (см. select)
+		attr_names - имена полей записей в виде table_name.attr_name
+
+		return - группы пар (номер поля в записи, условие)
+	'''
+
+	positions = {attr_name : i for i, attr_name in enumerate(attr_names)}
+	return tuple(tuple((positions[condition['attr_name']], condition) for condition in conditions)
+				 for conditions in where)
+
+
+
+def filterRecords(records, where):
+	'''
+		Отбор записей по условиям
+
+		records - записи (см. recordParse), итератор
+		where - условия, привязанные к номерам полей (см. wherePositions), или None
+
+		return - генератор отобранных записей
+	'''
+
+	for record in records:
+		if where == None or checkWhere(record, where):
+			yield record
+
+
+
+def encodeColumn(values, isInteger):
+	'''
+		Колонка колоночного кеша по значениям поля всех записей таблицы
+
+		values - значения поля в виде, в котором они хранятся в БД, по порядку записей
+		isInteger - True, если поле integer
+
+		return - колонка (см. column_cache): для поля integer, все значения
+				 которого записаны числом без лишних знаков, - массив чисел
+				 и маска null (None - null нет), иначе - номера значений
+				 в словаре различных значений поля (байты, если различных
+				 значений не больше 256)
+	'''
+
+	if isInteger:
+		try:
+			numbers = array.array('q', [0 if value == 'null' else int(value) for value in values])
+		except (ValueError, OverflowError):
+			numbers = None
+		# Значения вида 020 сравниваются как строки - поле хранится словарём
+		if numbers != None and all(value == 'null' or str(number) == value
+								   for value, number in zip(values, numbers)):
+			nulls = bytes(map('null'.__eq__, values))
+			return {
+				'values' : numbers,
+				'nulls'  : nulls if 1 in nulls else None
+			}
+
+	dictionary = list(dict.fromkeys(values))
+	codes = map({value : i for i, value in enumerate(dictionary)}.__getitem__, values)
+	return {
+		'codes'      : bytes(codes) if len(dictionary) <= 256 else array.array('I', codes),
+		'dictionary' : dictionary
+	}
+
+
+
+def useColumns(table_name):
+	'''
+		Проверка, что таблица текущей БД читается из колоночного кеша (см. readColumns)
+
+		table_name - имя таблицы
+
+		return - True/False
+	'''
+
+	if COLUMN_CACHE_MAX_SIZE == 0 or (session.transaction != None and table_name in session.transaction['tables']):
+		return False
+
+	return table_name in session.column_cache or tableSize(table_name) <= COLUMN_CACHE_MAX_SIZE
+
+
+
+def readColumns(table_name):
+	'''
+		Получение записей таблицы текущей БД из колоночного кеша,
+		при первом обращении кеш таблицы строится за одно чтение таблицы.
+		Кеш не используется для таблицы, изменённой в текущей транзакции,
+		и для таблицы с телом больше COLUMN_CACHE_MAX_SIZE
+
+		table_name - имя таблицы
+
+		return - кеш таблицы (см. column_cache) или None
+	'''
+
+	if not useColumns(table_name):
+		return None
+	if table_name in session.column_cache:
+		return session.column_cache[table_name]
+
+	table_schema = readTableSchema(table_name)
+	records = list(readRecords(table_name))
+	columns = list(zip(*records)) if records != [] else [()] * len(table_schema)
+	session.column_cache[table_name] = {
+		'count'   : len(records),
+		'columns' : [encodeColumn(values, attr['type'] == 'integer')
+					 for attr, values in zip(table_schema, columns)]
+	}
+
+	return session.column_cache[table_name]
+
+
+
+def conditionMask(column, condition, count):
+	'''
+		Проверка условия сразу для всех значений колонки
+
+		column - колонка колоночного кеша (см. encodeColumn)
+		condition - проверенное условие (см. checkWhereCondition)
+		count - число записей
+
+		return - битовая маска записей, для которых условие выполняется (int)
+	'''
+
+	# Условие проверяется один раз для каждого значения словаря
+	if 'codes' in column:
+		matches = bytes(checkCondition(value, condition) for value in column['dictionary'])
+		if isinstance(column['codes'], bytes):
+			return int.from_bytes(column['codes'].translate(matches.ljust(256, b'\x00')), 'little')
+		return int.from_bytes(bytes(map(matches.__getitem__, column['codes'])), 'little')
+
+	values = column['values']
+	nulls = int.from_bytes(column['nulls'], 'little') if column['nulls'] != None else 0
+	operator = condition['operator']
+
+	# null равен только null, сравнение с null ложно
+	if condition['value'] == 'null':
+		if operator == '=':
+			return nulls
+		elif operator == '<>':
+			return int.from_bytes(b'\x01' * count, 'little') ^ nulls
+		return 0
+
+	value = int(condition['value'])
+	if operator == '<>':
+		return int.from_bytes(bytes(map(value.__ne__, values)), 'little') | nulls
+
+	compare = {'=' : value.__eq__, '<' : value.__gt__, '>' : value.__lt__}[operator]
+	return int.from_bytes(bytes(map(compare, values)), 'little') & ~nulls
+
+
+
+def columnValues(column, rows, isRecord):
+	'''
+		Значения колонки для записей с заданными номерами
+
+		column - колонка колоночного кеша (см. encodeColumn)
+		rows - номера записей (список или range)
+		isRecord - True - значения в виде, в котором они хранятся в БД,
+				   False - значения python (см. unserializeValue)
+
+		return - список значений
+	'''
+
+	if 'codes' in column:
+		dictionary = column['dictionary']
+		if not isRecord:
+			if 'python' not in column:
+				column['python'] = list(map(unserializeValue, dictionary))
+			dictionary = column['python']
+		return list(map(dictionary.__getitem__, map(column['codes'].__getitem__, rows)))
+
+	values = list(map(column['values'].__getitem__, rows))
+	if isRecord:
+		values = list(map(str, values))
+	if column['nulls'] != None:
+		for i in itertools.compress(range(len(values)), map(column['nulls'].__getitem__, rows)):
+			values[i] = 'null' if isRecord else None
+
+	return values
+
+
+
+def columnScan(table_name, where, schema=None):
+	'''
+		Чтение записей таблицы текущей БД из колоночного кеша, если условия
+		не проверяются по индексам: условия проверяются по колонкам,
+		значения выбираются только из нужных колонок
+
+		table_name - имя таблицы
+		where - условия отбора записей в дизъюнктивной форме (см. select) или None
+		schema - имена выбираемых полей, None - все поля
+
+		return - генератор кортежей значений python полей schema,
+				 если schema = None - генератор записей (см. recordParse);
+				 None, если кеш для таблицы не используется
+	'''
+
+	attr_names = tableAttrNames(table_name)
+	if schema != None and not set(schema).issubset(attr_names):
+		return None
+	if indexRows(table_name, where) != None:
+		return None
+
+	columns = readColumns(table_name)
+	if columns == None:
+		return None
+
+	if where != None:
+		where = wherePositions(where, attr_names)
+	if schema == None:
+		return columnRows(columns, where, range(len(attr_names)), True)
+
+	return columnRows(columns, where, [attr_names.index(attr_name) for attr_name in schema], False)
+
+
+
+def columnRows(columns, where, fields, isRecord):
+	'''
+		Отбор записей кеша таблицы по условиям и выбор значений полей
+		порциями по COLUMN_SCAN_CHUNK записей
+
+		columns - кеш таблицы (см. column_cache)
+		where - условия, привязанные к номерам полей (см. wherePositions), или None
+		fields - номера выбираемых полей
+		isRecord - см. columnValues
+
+		return - генератор кортежей значений полей
+	'''
+
+	count = columns['count']
+	rows = range(count)
+	if where != None:
+		# Маски условий группы объединяются AND, маски групп - OR
+		full = int.from_bytes(b'\x01' * count, 'little')
+		mask = 0
+		for conditions in where:
+			group_mask = full
+			for position, condition in conditions:
+				group_mask &= conditionMask(columns['columns'][position], condition, count)
+			mask |= group_mask
+		rows = list(itertools.compress(rows, mask.to_bytes(count, 'little')))
+
+	for start in range(0, len(rows), COLUMN_SCAN_CHUNK):
+		chunk = rows[start:start + COLUMN_SCAN_CHUNK]
+		yield from zip(*[columnValues(columns['columns'][i], chunk, isRecord) for i in fields])
+
+
+
+def scanWorkers():
+	'''
+		Число процессов параллельного чтения таблиц
+
+		return - PARALLEL_SCAN_WORKERS или число ядер процессора
+	'''
+
+	if PARALLEL_SCAN_WORKERS != None:
+		return PARALLEL_SCAN_WORKERS
+
+	return os.cpu_count() or 1
+
+
+
+def getScanExecutor():
+	'''
+		Получение пула процессов параллельного чтения таблиц,
+		при первом вызове он создаётся. Где возможно, процессы
+		порождаются fork - им не нужно заново импортировать главный модуль
+
+		return - пул процессов (concurrent.futures.ProcessPoolExecutor)
+	'''
+
+	global scan_executor
+
+	with scan_executor_lock:
+		if scan_executor == None:
+			if 'fork' in multiprocessing.get_all_start_methods():
+				context = multiprocessing.get_context('fork')
+			else:
+				context = multiprocessing.get_context()
+			scan_executor = concurrent.futures.ProcessPoolExecutor(scanWorkers(), context)
+
+	return scan_executor
+
+
+
+def scanPart(path, start, end, positions, where, fields):
+	'''
+		Чтение части тела таблицы в процессе пула параллельного чтения:
+		разбор записей, отбор по условиям и отбор полей выборки
+
+		path - абсолютный путь к файлу таблицы
+		start, end - смещения начала и конца части в файле таблицы,
+					 начало части - начало строки
+		positions - номера полей таблицы по именам (см. attrPositions)
+		where - условия, привязанные к номерам полей (см. wherePositions), или None
+		fields - номера выбираемых полей в записи
+
+		return - список кортежей значений полей (см. selectValues)
+	'''
+
+	with openMap(path) as buffer:
+		records = (recordParse(match.group(1).decode(), positions)
+				   for match in RECORD_PATTERN.finditer(buffer, start, end))
+		return list(selectValues(filterRecords(records, where), fields))
+
+
+
+def useParallelScan(table_name, where):
+	'''
+		Проверка, что таблица текущей БД читается параллельно (см. parallelScan)
+
+		table_name - имя таблицы
+		where - условия отбора записей в дизъюнктивной форме (см. select) или None
+
+		return - True/False
+	'''
+
+	return (session.current_db_storage == DB_STORAGE_TEXT and tableImages(table_name) == [] and
+			scanWorkers() >= 2 and tableSize(table_name) >= PARALLEL_SCAN_MIN_SIZE and
+			indexConditions(table_name, where) == None)
+
+
+
+def parallelScan(table_name, where, schema):
+	'''
+		Параллельное чтение записей таблицы текущей БД для выборки без соединений.
+		Выполняется только для текстовой БД, если тело таблицы не меньше
+		PARALLEL_SCAN_MIN_SIZE, у таблицы нет изменений в журнале и текущей
+		транзакции, а условия не проверяются по индексам
+
+		table_name - имя таблицы
+		where - условия отбора записей в дизъюнктивной форме (см. select) или None
+		schema - имена выбираемых полей
+
+		return - генератор кортежей значений полей в порядке записей таблицы
+				 или None, если таблица читается последовательно (см. scanRecords)
+	'''
+
+	attr_names = tableAttrNames(table_name)
+	if not useParallelScan(table_name, where) or not set(schema).issubset(attr_names):
+		return None
+
+	# Деление тела таблицы на части по границам строк
+	path = tablePath(table_name)
+	buffer = cachedFile(path, mapFile)
+	start = buffer.find(b'{') + 1
+	end = buffer.rfind(b'}', start)
+	parts_count = scanWorkers() * PARALLEL_SCAN_PARTS
+	bounds = [start]
+	for i in range(1, parts_count):
+		bound = buffer.find(b'\n', start + (end - start) * i // parts_count, end)
+		if bound == -1:
+			break
+		if bound + 1 > bounds[-1]:
+			bounds.append(bound + 1)
+	bounds.append(end)
+
+	if where != None:
+		where = wherePositions(where, attr_names)
+	return scanParts(os.path.abspath(path), list(zip(bounds, bounds[1:])),
+					 attrPositions(readTableSchema(table_name)), where,
+					 [attr_names.index(attr_name) for attr_name in schema], readTail(table_name))
+
+
+
+def scanParts(path, parts, positions, where, fields, tail):
+	'''
+		Разбор частей тела таблицы в пуле процессов и объединение результатов
+
+		path - абсолютный путь к файлу таблицы
+		parts - смещения начала и конца частей тела таблицы
+		positions, where, fields - см. scanPart
+		tail - записи хвоста таблицы, разбираются в текущем процессе
+
+		return - генератор кортежей значений полей: записи частей по порядку,
+				 затем записи хвоста
+	'''
+
+	executor = getScanExecutor()
+	futures = [executor.submit(scanPart, path, start, end, positions, where, fields)
+			   for start, end in parts]
+	try:
+		for future in futures:
+			yield from future.result()
+	finally:
+		# Выборка прервана - ещё не начатые части не читаются
+		for future in futures:
+			future.cancel()
+
+	records = (recordParse(record, positions) for record in tail)
+	yield from selectValues(filterRecords(records, where), fields)
+
+
+
+def joinTables(body1, position1, body2, position2):
+	'''
+		Inner join записей двух таблиц по равенству полей
+
+		Хеш-соединение: по второй (меньшей) таблице строится хеш-таблица,
+		записи первой таблицы читаются построчно и ищутся в ней.
+		Если во второй таблице больше JOIN_HASH_MAX_RECORDS записей,
+		выполняется соединение слиянием (см. mergeJoin)
+
+		body1 - записи первой таблицы (см. recordParse), итератор
+		body2 - записи второй таблицы, итератор
+		position1, position2 - номера полей соединения в записях таблиц
+
+		return - генератор записей соединения, каждая запись - record1 + record2
+	'''
+
+	body2 = iter(body2)
+	records2 = list(itertools.islice(body2, JOIN_HASH_MAX_RECORDS + 1))
+	if len(records2) > JOIN_HASH_MAX_RECORDS:
+		yield from mergeJoin(body1, position1, itertools.chain(records2, body2), position2)
+		return
+
+	hash_table = {}
+	for record in records2:
+		hash_table.setdefault(record[position2], []).append(record)
+	for record1 in body1:
+		for record2 in hash_table.get(record1[position1], ()):
+			yield record1 + record2
+
+
+
+def sortRuns(records, position, runs):
+	'''
+		Сортировка записей по полю частями по JOIN_HASH_MAX_RECORDS записей:
+		отсортированные части сбрасываются во временные файлы (см. readRun)
+		и сливаются при чтении, единственная часть остаётся в памяти
+
+		records - записи (см. recordParse), итератор
+		position - номер поля сортировки
+		runs - временные файлы частей (дополняется), закрываются вызывающим
+
+		return - итератор записей, отсортированных по полю
+	'''
+
+	key = lambda record: record[position]
+	size = max(JOIN_HASH_MAX_RECORDS, 1)
+	records = iter(records)
+	run = sorted(itertools.islice(records, size), key=key)
+	record = next(records, None)
+	if record == None:
+		return iter(run)
+
+	records = itertools.chain((record,), records)
+	files = []
+	while run != []:
+		run_file = tempfile.TemporaryFile()
+		runs.append(run_file)
+		files.append(run_file)
+		for i in range(0, len(run), JOIN_RUN_BLOCK_RECORDS):
+			pickle.dump(run[i:i + JOIN_RUN_BLOCK_RECORDS], run_file)
+		run_file.seek(0)
+		run = sorted(itertools.islice(records, size), key=key)
+
+	return heapq.merge(*map(readRun, files), key=key)
+
+
+
+def readRun(run_file):
+	'''
+		Чтение отсортированной части записей из временного файла,
+		записи хранятся блоками по JOIN_RUN_BLOCK_RECORDS записей
+
+		run_file - временный файл части (см. sortRuns)
+
+		return - генератор записей
+	'''
+
+	while True:
+		try:
+			yield from pickle.load(run_file)
+		except EOFError:
+			return
+
+
+
+def mergeJoin(body1, position1, body2, position2):
+	'''
+		Inner join записей двух таблиц по равенству полей слиянием:
+		записи обеих таблиц сортируются по полю соединения (см. sortRuns),
+		в памяти держатся сортируемая часть и записи второй таблицы
+		с текущим значением поля соединения
+
+		body1 - записи первой таблицы (см. recordParse), итератор
+		body2 - записи второй таблицы, итератор
+		position1, position2 - номера полей соединения в записях таблиц
+
+		return - генератор записей соединения, каждая запись - record1 + record2
+	'''
+
+	runs = []
+	try:
+		groups1 = itertools.groupby(sortRuns(body1, position1, runs), key=lambda record: record[position1])
+		groups2 = itertools.groupby(sortRuns(body2, position2, runs), key=lambda record: record[position2])
+		group1 = next(groups1, None)
+		group2 = next(groups2, None)
+		while group1 != None and group2 != None:
+			if group1[0] < group2[0]:
+				group1 = next(groups1, None)
+			elif group1[0] > group2[0]:
+				group2 = next(groups2, None)
+			else:
+				records2 = list(group2[1])
+				for record1 in group1[1]:
+					for record2 in records2:
+						yield record1 + record2
+				group1 = next(groups1, None)
+				group2 = next(groups2, None)
+	finally:
+		for run_file in runs:
+			run_file.close()
+
+
+
+def nestedLoopJoin(body1, position1, body2, position2):
+	'''
+		Inner join записей двух таблиц по равенству полей вложенными циклами:
+		для каждой записи первой таблицы просматриваются все записи второй,
+		выполняется для маленькой второй таблицы, для которой хеш-таблица
+		не окупается
+
+		body1 - записи первой таблицы (см. recordParse), итератор
+		body2 - записи второй таблицы, список
+		position1, position2 - номера полей соединения в записях таблиц
+
+		return - генератор записей соединения, каждая запись - record1 + record2
+	'''
+
+	for record1 in body1:
+		key = record1[position1]
+		for record2 in body2:
+			if record2[position2] == key:
+				yield record1 + record2
+
+
+
+def checkWhereCondition(condition, table_names):
+	'''
+		Проверка условия раздела where оператора select
+		и приведение его значения к виду, в котором оно хранится в БД
+
+		condition - условие
+					пример:
+					{
+						'attr_name' : 'table1.attr1',
+						'operator'  : '>',
+						'value'     : '020'
+					}
+		table_names - имена таблиц запроса
+
+		return - проверенное условие
+				 пример:
+				 {
+					'attr_name' : 'table1.attr1',
+					'operator'  : '>',
+					'value'     : '20'
+				 }
+	'''
+
+	table_name, attr_name = condition['attr_name'].split('.')
+	if table_name not in table_names:
+		raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table_name))
+
+	table_schema = readTableSchema(table_name)
+	if attr_name not in [attr['name'] for attr in table_schema]:
+		raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' не существует !'.format(table_name, attr_name))
+
+	value = condition['value']
+	if value != 'null':
+		if attrIsInteger(table_schema, attr_name):
+			try:
+				value = str(int(value))
+			except ValueError:
+				raise SQL_DB_Exception('Поле \'{0}\' и значение {1} имеют разные типы !'.format(condition['attr_name'], value))
+		elif value[0] != '\'' or value[-1] != '\'':
+			raise SQL_DB_Exception('Поле \'{0}\' и значение {1} имеют разные типы !'.format(condition['attr_name'], value))
+
+	return {
+		'attr_name' : condition['attr_name'],
+		'operator'  : condition['operator'],
+		'value'     : value
+	}
+
+
+
+def checkCondition(value, condition):
+	'''
+		Проверка выполнения условия для значения поля
+
+		value - значение поля в виде, в котором оно хранится в БД
+		condition - проверенное условие (см. checkWhereCondition)
+
+		return - True/False
+	'''
+
+	if condition['operator'] == '=':
+		return value == condition['value']
+	elif condition['operator'] == '<>':
+		return value != condition['value']
+
+	# Сравнение с null всегда ложно
+	if value == 'null' or condition['value'] == 'null':
+		return False
+
+	if value[0] == '\'':
+		value, cond_value = value[1:-1], condition['value'][1:-1]
+	else:
+		value, cond_value = int(value), int(condition['value'])
+
+	if condition['operator'] == '<':
+		return value < cond_value
+	else:
+		return value > cond_value
+
+
+
+def checkWhere(record, where):
+	'''
+		Проверка выполнения условий раздела where для записи
+
+		record - запись выборки (см. recordParse)
+		where - условия, привязанные к номерам полей записи (см. wherePositions)
+
+		return - True/False
+	'''
+
+	for conditions in where:
+		for position, condition in conditions:
+			if not checkCondition(record[position], condition):
+				break
+		else:
+			return True
+
+	return False
+
+
+
+def analyze(table_name=None):
+	'''
+		Сбор статистики таблиц текущей БД (ANALYZE) и запись её в каталог.
+		Перед сбором изменения из журнала переносятся в файлы БД, поэтому
+		статистика в каталоге описывает файлы БД, а последующие изменения
+		уточняют её при фиксации (см. journalApply)
+
+		Сбор статистики завершает транзакцию
+
+		table_name - имя таблицы, None - все таблицы БД
+
+		return None
+
+		Статистика таблицы:
+		пример:
+		{
+			'rows'  : 100,                 # число записей
+			'attrs' : {
+				'attr_name_1' : {
+					'distinct' : 95,       # число различных значений, кроме null
+					'nulls'    : 5,        # число null
+					'min'      : 1,        # наименьшее и наибольшее значения integer,
+					'max'      : 120       # для остальных полей - None
+				}
+			}
+		}
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	checkpoint()
+
+	tables = readCatalog()
+	if table_name == None:
+		table_names = list(tables)
+	else:
+		# Если таблица не найдена - будет выброшено исключение
+		readTableSchema(table_name)
+		table_names = [table_name]
+
+	stats = {table_name : collectStats(table_name) for table_name in table_names}
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		pageWritten(sqlpage.writeStats(dbPath(), stats))
+		return
+
+	# Файл схем перезаписывается через временный файл
+	tables = {table_name : dict(table, stats=stats.get(table_name, table['stats']))
+			  for table_name, table in tables.items()}
+	writeCatalog(dbPath() + DB_TEMP_EXTENSION, tables)
+	os.replace(dbPath() + DB_TEMP_EXTENSION, dbPath())
+	for table_name, table_stats in stats.items():
+		session.catalog[table_name]['stats'] = table_stats
+	session.catalog_stamp = dbStamp()
+
+
+
+def collectStats(table_name):
+	'''
+		Сбор статистики таблицы текущей БД за одно чтение её записей
+
+		table_name - имя таблицы
+
+		return - статистика таблицы (см. analyze)
+	'''
+
+	table_schema = readTableSchema(table_name)
+	values = [set() for _ in table_schema]
+	nulls = [0] * len(table_schema)
+	rows = 0
+	for record in readRecords(table_name):
+		rows += 1
+		for i, value in enumerate(record):
+			if value == 'null':
+				nulls[i] += 1
+			else:
+				values[i].add(value)
+
+	attrs = {}
+	for i, attr in enumerate(table_schema):
+		attr_values = values[i]
+		isInteger = attr['type'] == 'integer'
+		# Значения integer сравниваются числами: 020 и 20 - одно значение
+		if isInteger:
+			attr_values = set(map(int, attr_values))
+		attrs[attr['name']] = {
+			'distinct' : len(attr_values),
+			'nulls'    : nulls[i],
+			'min'      : min(attr_values) if isInteger and attr_values != set() else None,
+			'max'      : max(attr_values) if isInteger and attr_values != set() else None
+		}
+
+	return {
+		'rows'  : rows,
+		'attrs' : attrs
+	}
+
+
+
+def updateStats(stats, image, table_schema):
+	'''
+		Уточнение статистики таблицы по зафиксированным изменениям без чтения
+		таблицы: число записей меняется точно, остальное - приблизительно.
+		Значения удалённых записей неизвестны, поэтому число null среди них
+		оценивается по доле null в таблице, а наименьшее и наибольшее значения
+		не сужаются. Новое значение integer вне [min, max] - новое различное
+		значение, остальные значения считаются новыми с долей различных
+		значений в таблице
+
+		stats - статистика таблицы (см. analyze)
+		image - образ таблицы (см. transaction)
+		table_schema - схема таблицы
+
+		return - новая статистика таблицы
+	'''
+
+	rows = stats['rows']
+	new_rows = max(rows + len(image['inserted']) - len(image['deleted']), 0)
+
+	# Обновлённая запись - удаление прежней записи и вставка новой
+	removed = min(len(image['deleted']) + len(image['updated']), rows)
+	added = image['inserted'] + list(image['updated'].values())
+
+	attrs = {}
+	for i, attr in enumerate(table_schema):
+		attr_stats = stats['attrs'][attr['name']]
+		isInteger = attr['type'] == 'integer'
+
+		nulls = attr_stats['nulls'] - (round(attr_stats['nulls'] * removed / rows) if rows > 0 else 0)
+		values = set()
+		for record in added:
+			if record[i] == 'null':
+				nulls += 1
+			else:
+				values.add(int(record[i]) if isInteger else record[i])
+		nulls = min(max(nulls, 0), new_rows)
+
+		low, high = attr_stats['min'], attr_stats['max']
+		new_values = {value for value in values if low == None or value < low or value > high} if isInteger else set()
+		distinct = attr_stats['distinct'] + len(new_values) +\
+				   round((len(values) - len(new_values)) * attr_stats['distinct'] / max(rows - attr_stats['nulls'], 1))
+		if attr['attr']['primary key'] or attr['attr']['unique']:
+			distinct = new_rows - nulls
+		distinct = min(max(distinct, len(values)), new_rows - nulls)
+
+		if new_rows == nulls:
+			low, high = None, None
+		elif isInteger and values != set():
+			low = min(values) if low == None else min(low, min(values))
+			high = max(values) if high == None else max(high, max(values))
+
+		attrs[attr['name']] = {
+			'distinct' : distinct,
+			'nulls'    : nulls,
+			'min'      : low,
+			'max'      : high
+		}
+
+	return {
+		'rows'  : new_rows,
+		'attrs' : attrs
+	}
+
+
+
+def tableStats(table_name):
+	'''
+		Статистика таблицы текущей БД с учётом изменений из журнала
+
+		table_name - имя таблицы
+
+		return - статистика таблицы (см. analyze), None - статистика не собрана
+	'''
+
+	if table_name in session.journal_tables:
+		return session.journal_tables[table_name]['stats']
+
+	return readCatalog()[table_name]['stats']
+
+
+
+def attrStats(attr_name):
+	'''
+		Статистика поля таблицы текущей БД
+
+		attr_name - имя поля с именем таблицы: table_name.attr_name
+
+		return - (число записей таблицы, статистика поля (см. analyze)),
+				 None - статистика таблицы не собрана
+	'''
+
+	table_name, attr_name = attr_name.split('.')
+	stats = tableStats(table_name)
+	if stats == None:
+		return None
+
+	return stats['rows'], stats['attrs'][attr_name]
+
+
+
+def countRows(table_name):
+	'''
+		Точное число записей таблицы текущей БД без разбора записей:
+		по статистике таблицы, для страничной БД - по каталогу, иначе записи
+		тела таблицы подсчитываются регулярным выражением в отображённом
+		в память файле; с учётом изменений из журнала и текущей транзакции
+
+		table_name - имя таблицы
+
+		return - число записей
+	'''
+
+	stats = tableStats(table_name)
+	if stats != None:
+		count = stats['rows']
+	elif session.current_db_storage == DB_STORAGE_PAGE:
+		count = readCatalog()[table_name]['rows']
+	else:
+		buffer = cachedFile(tablePath(table_name), mapFile)
+		start = buffer.find(b'{') + 1
+		end = buffer.rfind(b'}', start)
+		count = sum(1 for _ in RECORD_PATTERN.finditer(buffer, start, end)) + len(readTail(table_name))
+
+	# Статистика уже учитывает изменения из журнала
+	for image, isJournal in tableImages(table_name):
+		if not isJournal or stats == None:
+			count += len(image['inserted']) - len(image['deleted'])
+
+	return count
+
+
+
+def count(table_name):
+	'''
+		Число записей таблицы текущей БД (SELECT COUNT(*)) без чтения таблицы (см. countRows)
+
+		table_name - имя таблицы
+
+		return - результат выборки (см. select)
+				 пример: {'schema' : ['COUNT(*)'], 'body' : [(100,)]}
+	'''
+
+	# Если таблица не найдена - будет выброшено исключение
+	readTableSchema(table_name)
+
+	return {
+		'schema' : ['COUNT(*)'],
+		'body'   : [(countRows(table_name),)]
+	}
+
+
+
+def estimateRows(table_name):
+	'''
+		Оценка числа записей таблицы текущей БД без её чтения: для страничной
+		БД и таблицы со статистикой - точное число записей (см. countRows),
+		иначе - по числу строк в начале файла таблицы и числу записей хвоста,
+		с учётом изменений из журнала и текущей транзакции
+
+		table_name - имя таблицы
+
+		return - оценка числа записей
+	'''
+
+	if session.current_db_storage == DB_STORAGE_PAGE or tableStats(table_name) != None:
+		return countRows(table_name)
+
+	buffer = cachedFile(tablePath(table_name), mapFile)
+	sample = buffer[:65536]
+	if len(sample) < len(buffer):
+		count = sample.count(b'\n') * len(buffer) // len(sample)
+	else:
+		# Кроме строк #BODY, { и }
+		count = max(sample.count(b'\n') - 3, 0)
+	count += len(readTail(table_name))
+
+	for image, _ in tableImages(table_name):
+		count += len(image['inserted']) - len(image['deleted'])
+
+	return max(count, 0)
+
+
+
+def conditionSelectivity(condition):
+	'''
+		Оценка доли записей таблицы, удовлетворяющих условию:
+		условию = по уникальному полю удовлетворяет не больше одной записи,
+		по статистике поля (см. analyze) доля оценивается по доле null,
+		числу различных значений и положению значения integer в [min, max],
+		без статистики - см. CONDITION_SELECTIVITY
+
+		condition - проверенное условие (см. checkWhereCondition)
+
+		return - доля записей от 0 до 1
+	'''
+
+	table_name, attr_name = condition['attr_name'].split('.')
+	operator = condition['operator']
+	value = condition['value']
+	if operator == '=' and value != 'null':
+		for attr in readTableSchema(table_name):
+			if attr['name'] == attr_name and (attr['attr']['unique'] or attr['attr']['primary key']):
+				return 1 / max(estimateRows(table_name), 1)
+
+	stats = attrStats(condition['attr_name'])
+	if stats == None or stats[0] == 0:
+		return CONDITION_SELECTIVITY[operator]
+
+	rows, attr_stats = stats
+	not_null = 1 - attr_stats['nulls'] / rows
+	low, high = attr_stats['min'], attr_stats['max']
+
+	# Сравнение < и > с null всегда ложно
+	if value == 'null':
+		selectivity = {'=' : 1 - not_null, '<>' : not_null}.get(operator, 0.0)
+	elif operator in ('=', '<>'):
+		selectivity = not_null / max(attr_stats['distinct'], 1)
+		if low != None and not low <= int(value) <= high:
+			selectivity = 0.0
+		if operator == '<>':
+			selectivity = not_null - selectivity
+	elif low != None:
+		# Значения integer считаются равномерно распределёнными в [min, max]
+		value = int(value)
+		if low == high:
+			fraction = float(value > low if operator == '<' else value < high)
+		elif operator == '<':
+			fraction = (value - low) / (high - low)
+		else:
+			fraction = (high - value) / (high - low)
+		selectivity = not_null * min(max(fraction, 0.0), 1.0)
+	else:
+		selectivity = not_null * CONDITION_SELECTIVITY[operator]
+
+	return min(max(selectivity, 0.0), 1.0)
+
+
+
+def whereSelectivity(where):
+	'''
+		Оценка доли записей, удовлетворяющих условиям (см. conditionSelectivity)
+
+		where - условия в дизъюнктивной форме (см. select) или None
+
+		return - доля записей от 0 до 1
+	'''
+
+	if where == None:
+		return 1.0
+
+	selectivity = 0.0
+	for conditions in where:
+		group_selectivity = 1.0
+		for condition in conditions:
+			group_selectivity *= conditionSelectivity(condition)
+		selectivity += group_selectivity
+
+	return min(selectivity, 1.0)
+
+
+
+def whereText(where):
+	'''
+		Запись условий в виде раздела where SQL-запроса для плана выборки
+
+		where - условия в дизъюнктивной форме (см. select)
+
+		return - строка условий
+	'''
+
+	return ' OR '.join(' AND '.join('{0} {1} {2}'.format(condition['attr_name'], condition['operator'], condition['value'])
+									for condition in conditions)
+					   for conditions in where)
+
+
+
+def planScan(table_name, where, attr_names):
+	'''
+		Узел плана чтения таблицы: выбор способа чтения (по индексу,
+		из колоночного кеша или последовательно) и оценка числа записей
+
+		table_name - имя таблицы
+		where - условия отбора записей таблицы в дизъюнктивной форме (см. select) или None
+		attr_names - имена полей, нужных выборке, остальные поля не выбираются
+
+		return - узел плана (см. planSelect)
+	'''
+
+	table_attr_names = tableAttrNames(table_name)
+	attr_names = [attr_name for attr_name in table_attr_names if attr_name in attr_names]
+
+	if indexConditions(table_name, where) != None:
+		access = 'index'
+	elif useColumns(table_name):
+		access = 'column cache'
+	else:
+		access = 'scan'
+
+	rows = estimateRows(table_name)
+
+	return {
+		'operator'   : 'scan',
+		'table_name' : table_name,
+		'where'      : where,
+		'access'     : access,
+		'fields'     : [table_attr_names.index(attr_name) for attr_name in attr_names],
+		'attr_names' : attr_names,
+		'rows'       : rows,
+		'estimate'   : round(rows * whereSelectivity(where)),
+		'actual'     : 0
+	}
+
+
+
+def joinEstimate(node, table_node, attr1_name, attr2_name):
+	'''
+		Оценка числа записей соединения: по статистике полей соединения
+		(см. analyze) - каждая запись стороны с меньшим числом различных
+		значений поля находит записи с тем же значением в другой стороне,
+		без статистики - каждое значение поля соединения меньшей стороны
+		встречается в большей один раз
+
+		node - узел соединяемых записей
+		table_node - узел присоединяемой таблицы
+		attr1_name, attr2_name - поля соединения в записях узлов
+
+		return - оценка числа записей
+	'''
+
+	stats1 = attrStats(attr1_name)
+	stats2 = attrStats(attr2_name)
+	if stats1 == None or stats2 == None:
+		return round(node['estimate'] * table_node['estimate'] / max(node['estimate'], table_node['estimate'], 1))
+
+	# Различных значений в отобранных записях не больше, чем самих записей
+	distinct1 = min(stats1[1]['distinct'], node['estimate'])
+	distinct2 = min(stats2[1]['distinct'], table_node['estimate'])
+
+	return round(node['estimate'] * table_node['estimate'] / max(distinct1, distinct2, 1))
+
+
+
+def planJoin(node, table_node, attr1_name, attr2_name):
+	'''
+		Узел плана соединения записей с таблицей и выбор способа соединения:
+		маленькая таблица соединяется вложенными циклами, таблица с индексом
+		поля соединения, из которой нужна малая часть записей (по статистике
+		поля - с учётом числа записей на одно значение), - поиском
+		записей по индексу, иначе - хеш-соединением (см. joinTables),
+		хеш-таблица строится по меньшей стороне, записи большей читаются построчно
+
+		node - узел соединяемых записей
+		table_node - узел присоединяемой таблицы ('scan')
+		attr1_name, attr2_name - поля соединения в записях узлов
+
+		return - узел плана (см. planSelect)
+	'''
+
+	# Число различных значений поля соединения таблицы, без статистики
+	# значения считаются уникальными
+	stats = attrStats(attr2_name)
+	keys = table_node['rows'] if stats == None else stats[1]['distinct']
+
+	table_name = table_node['table_name']
+	if table_node['estimate'] <= NESTED_LOOP_MAX_RECORDS:
+		operator = 'nested loop'
+	elif (attr2_name.split('.')[1] in [index['attr_name'] for index in readIndexes().values() if index['table_name'] == table_name] and
+		  node['estimate'] <= keys * INDEX_JOIN_MAX_RATIO):
+		operator = 'index join'
+		table_node['access'] = 'index lookup'
+	else:
+		operator = 'hash join'
+
+	# Хеш-таблица по соединяемым записям: записи соединения начинаются полями таблицы
+	isBuildInput = operator == 'hash join' and node['estimate'] < table_node['estimate']
+
+	return {
+		'operator'     : operator,
+		'input'        : node,
+		'table'        : table_node,
+		'positions'    : (node['attr_names'].index(attr1_name), table_node['attr_names'].index(attr2_name)),
+		'condition'    : attr1_name + ' = ' + attr2_name,
+		'isBuildInput' : isBuildInput,
+		'attr_names'   : (table_node['attr_names'] + node['attr_names'] if isBuildInput else
+						  node['attr_names'] + table_node['attr_names']),
+		'estimate'     : joinEstimate(node, table_node, attr1_name, attr2_name),
+		'actual'       : 0
+	}
+
+
+
+def planSelect(tables, on, where=None):
+	'''
+		Построение плана выборки: проверка запроса, выбор способа чтения
+		таблиц, порядка и способа их соединения по оценкам числа записей.
+		Соединение начинается с таблицы с наименьшей оценкой, к соединённым
+		записям по очереди присоединяются связанные с ними таблицы,
+		начиная с меньших (см. planJoin). Из записей таблиц сразу отбираются
+		только поля, нужные выборке, соединению и условиям where
+
+		tables, on, where - см. select
+
+		return - план выборки
+				 пример:
+				 {
+					'schema' : [...],                  # имена выбираемых полей
+					'root'   : {                       # корневой узел
+						'operator'   : 'hash join',    # 'scan', 'nested loop', 'index join',
+						                               # 'hash join', 'filter'
+						'input'      : {...},          # узел соединяемых (отбираемых) записей
+						'table'      : {               # узел присоединяемой таблицы
+							'operator'   : 'scan',
+							'table_name' : 'table2',
+							'where'      : (...),      # условия таблицы или None
+							'access'     : 'index',    # 'column cache', 'parallel scan', 'scan',
+							                           # 'index lookup' - по индексу поля соединения
+							'fields'     : [0, 2],     # номера выбираемых полей в записи таблицы
+							'attr_names' : [...],
+							'rows'       : 1000,       # оценка числа записей таблицы
+							'estimate'   : 100,
+							'actual'     : 0
+						},
+						'positions'  : (1, 0),         # номера полей соединения в записях узлов
+						'condition'  : 'table1.attr1 = table2.attr1',
+						'isBuildInput' : False,        # для 'hash join': True - хеш-таблица строится
+						                               # по соединяемым записям, иначе - по таблице
+						'attr_names' : [...],          # имена полей записей узла
+						'estimate'   : 100,            # оценка числа записей узла
+						'actual'     : 0               # число записей при выполнении (см. explain)
+					}
+				 }
+	'''
+
+	# Если БД не выбрана
+	if session.current_db_name == None:
+		raise SQL_DB_Exception('Не выбрана БД !')
+
+	# Заполнение схемы
+	schema = []
+	for table in tables:
+		table_schema = readTableSchema(table['table_name'])
+		for attr_name in table['attrs']:
+			table_name = attr_name.split('.')[0]
+			if table_name != table['table_name']:
+				raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table_name))
+			if attr_name.split('.')[1] not in [attr['name'] for attr in table_schema]:
+				raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' не существует !'.format(table_name, attr_name))
+			schema.append(attr_name)
+
+	# Заполнение имён выбираемых и объединяемых таблиц
+	table_names = []
+	for table_name in [table['table_name'] for table in tables] + [attr.split('.')[0] for attrs in (on or ()) for attr in attrs]:
+		if table_name not in table_names:
+			# Проверка существования таблицы
+			readTableSchema(table_name)
+			table_names.append(table_name)
+
+	# Проверка условий в where и распределение их по таблицам:
+	# записи таблицы отбрасываются при чтении, если не выполняется
+	# ни одна из групп условий, относящихся к этой таблице
+	table_where = {table_name : None for table_name in table_names}
+	where_tables = set()
+	if where != None:
+		where = tuple(tuple(checkWhereCondition(condition, table_names) for condition in conditions)
+					  for conditions in where)
+		for conditions in where:
+			for condition in conditions:
+				where_tables.add(condition['attr_name'].split('.')[0])
+		for table_name in where_tables:
+			groups = tuple(tuple(condition for condition in conditions
+								 if condition['attr_name'].split('.')[0] == table_name)
+						   for conditions in where)
+			if () not in groups:
+				table_where[table_name] = groups
+
+	# Поля, нужные выборке, соединению и условиям where нескольких таблиц
+	attr_names = set(schema)
+	attr_names.update(attr_name for attrs in (on or ()) for attr_name in attrs)
+	if len(where_tables) > 1:
+		attr_names.update(condition['attr_name'] for conditions in where for condition in conditions)
+
+	if on == None:
+		root = planScan(table_names[0], table_where[table_names[0]], attr_names)
+		if root['access'] == 'scan' and useParallelScan(table_names[0], table_where[table_names[0]]):
+			root['access'] = 'parallel scan'
+	else:
+		# Проверка совместимости типов полей
+		for attr1_name, attr2_name in on:
+			table1_schema = readTableSchema(attr1_name.split('.')[0])
+			table2_schema = readTableSchema(attr2_name.split('.')[0])
+			if (not (attrIsInteger(table1_schema, attr1_name.split('.')[1]) and attrIsInteger(table2_schema, attr2_name.split('.')[1])) and
+			    not (attrIsString(table1_schema, attr1_name.split('.')[1])  and attrIsString(table2_schema, attr2_name.split('.')[1]))):
+				raise SQL_DB_Exception('Поля \'{0}\' и \'{1}\' имеют разные типы !'.format(attr1_name, attr2_name))
+
+		scans = {}
+		for attrs in on:
+			for attr_name in attrs:
+				table_name = attr_name.split('.')[0]
+				if table_name not in scans:
+					scans[table_name] = planScan(table_name, table_where[table_name], attr_names)
+
+		# Соединение начинается с таблицы с наименьшей оценкой числа записей
+		root = min(scans.values(), key=lambda node: node['estimate'])
+		joined_tables = {root['table_name']}
+		edges = [tuple(edge) for edge in on]
+		while edges != []:
+			# Условия между уже соединёнными таблицами отбирают записи
+			for attr1_name, attr2_name in [edge for edge in edges if {edge[0].split('.')[0], edge[1].split('.')[0]} <= joined_tables]:
+				root = {
+					'operator'   : 'filter',
+					'input'      : root,
+					'positions'  : (root['attr_names'].index(attr1_name), root['attr_names'].index(attr2_name)),
+					'condition'  : attr1_name + ' = ' + attr2_name,
+					'attr_names' : root['attr_names'],
+					'estimate'   : round(root['estimate'] * CONDITION_SELECTIVITY['=']),
+					'actual'     : 0
+				}
+				edges.remove((attr1_name, attr2_name))
+
+			# Присоединяется наименьшая из таблиц, связанных с уже соединёнными
+			candidates = []
+			for attr1_name, attr2_name in edges:
+				if attr2_name.split('.')[0] in joined_tables:
+					attr1_name, attr2_name = attr2_name, attr1_name
+				if attr1_name.split('.')[0] in joined_tables:
+					candidates.append((scans[attr2_name.split('.')[0]]['estimate'], (attr1_name, attr2_name)))
+			if candidates == [] and edges != []:
+				raise SQL_DB_Exception('Таблицы \'{0}\' и \'{1}\' не связаны с предыдущими !'.format(
+									   edges[0][0].split('.')[0], edges[0][1].split('.')[0]))
+			if candidates == []:
+				break
+
+			_, (attr1_name, attr2_name) = min(candidates, key=lambda candidate: candidate[0])
+			table_name = attr2_name.split('.')[0]
+			root = planJoin(root, scans[table_name], attr1_name, attr2_name)
+			joined_tables.add(table_name)
+			edges.remove((attr1_name, attr2_name) if (attr1_name, attr2_name) in edges else (attr2_name, attr1_name))
+
+	# Отбор соединённых записей по условиям в where, связывающим несколько таблиц
+	if len(where_tables) > 1:
+		root = {
+			'operator'   : 'filter',
+			'input'      : root,
+			'where'      : wherePositions(where, root['attr_names']),
+			'condition'  : whereText(where),
+			'attr_names' : root['attr_names'],
+			'estimate'   : round(root['estimate'] * whereSelectivity(where)),
+			'actual'     : 0
+		}
+
+	return {
+		'schema' : schema,
+		'root'   : root
+	}
+
+
+
+def scanRecords(node, rows=None):
+	'''
+		Чтение записей таблицы по узлу плана: записи отбираются по условиям
+		таблицы, из них выбираются только нужные поля
 
-		table_name - имя таблицы
-		attr_name  - имя атрибута
-		attr_value - значение атрибута
+		node - узел плана 'scan' (см. planSelect)
+		rows - номера записей тела таблицы, которые нужно прочитать
+			   (см. readNumberedRecords), None - по способу чтения узла
 
-		return - True, если значение атрибута уникально
-				     False, если не уникально
+		return - итератор записей из выбранных полей
 	'''
 
-	global current_db_name
+	table_name = node['table_name']
+	attr_names = tableAttrNames(table_name)
+	where = node['where']
+	if where != None:
+		where = wherePositions(where, attr_names)
 
-	# Если БД не выбрана
-	if current_db_name == None:
-		raise SQL_DB_Exception('Не выбрана БД !')
+	if rows == None and node['access'] == 'column cache':
+		columns = readColumns(table_name)
+		if columns != None:
+			return columnRows(columns, where, node['fields'], True)
 
-	# Поиск таблицы
-	isFindTable = False
-	isRead = False
-	with open(current_db_name + DB_EXTENSION, 'r') as db:
-		for line in db:
-			if 'TABLE_NAME = ' + table_name == line.strip():
-				isFindTable = True
-			elif isFindTable and (line.strip() == '#BODY'):
-				isRead = True
-			elif isRead and line.strip().startswith('(('):
-				# Убрать лишние пробелы
-				line = re.sub(r' ', '', line.strip())
-				# Вставить между парами разделитель
-				line = re.sub(r'\),\(', '|', line)[2:-2]
-				for attr in line.split('|'):
-					name, value = attr.split(',')
-					if (attr_name == name) and (attr_value == value):
-						return False
-			elif isRead and line.strip() == '}':
-				break
+	# Если условия проверяются по индексам - читаются только найденные записи
+	if rows == None:
+		rows = indexRows(table_name, node['where'])
+	records = readRecords(table_name, rows)
+	if where != None:
+		records = filterRecords(records, where)
+	if len(node['fields']) < len(attr_names):
+		records = projectRecords(records, node['fields'])
 
-	return True
+	return records
 
 
 
-def insert_record(db, table_name, table_schema, values):
+def projectRecords(records, fields):
 	'''
-		Вставка записи
+		Выбор полей записей
 
-		db - файл БД для записи
-		table_name - имя таблицы для записи
-		table_schema - схема таблицы
-		values - вставляемые данные
+		records - записи (см. recordParse), итератор
+		fields - номера выбираемых полей
 
-		return None
+		return - генератор записей из выбранных полей
 	'''
 
-	# Проверка коректности и соответствия значений атрибутов схеме
-	for name, value in values.items():
-		for attr in table_schema:
-			if attr['name'] == name:
-				# Проверка допустимости значения NULL
-				if not attr['attr']['null'] and (value == 'null'):
-					raise SQL_DB_Exception('Таблица \'{0}\' поле \'{1}\' не может быть null !'.format(table_name, name), db)
-				# Проверка уникальности значения
-				if ((attr['attr']['unique'] or attr['attr']['primary key']) and
-				    not isUniqueValue(table_name, name, value)):
-					raise SQL_DB_Exception('Таблица \'{0}\' поле \'{1}\' должно быть уникальным !'.format(table_name, name), db)
-				# Проверка правильности типов данных
-				if attrIsInteger(table_schema, name):
-					try:
-						value = int(value)
-					except:
-						if attrIsNull(table_schema, name) and value != 'null':
-							raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа integer !'.format(table_name, name), db)
-				elif attrIsString(table_schema, name):
-					if ((value[0] != '\'' or value[-1] != '\'') and
-					    (attrIsNull(table_schema, name) and value != 'null')):
-						raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа string !'.format(table_name, name), db)
-				# Если все данные верны
-				break
+	for record in records:
+		yield tuple([record[i] for i in fields])
+
+
+
+def countRecords(records, node):
+	'''
+		Подсчёт записей узла плана при их получении (см. explain)
+
+		records - записи узла, итератор
+		node - узел плана, число записей накапливается в 'actual'
+
+		return - генератор тех же записей
+	'''
+
+	for record in records:
+		node['actual'] += 1
+		yield record
+
+
+
+def planRecords(node, isCount=False, rows=None):
+	'''
+		Выполнение узла плана выборки
+
+		node - узел плана (см. planSelect)
+		isCount - True - записи узлов подсчитываются (см. countRecords)
+		rows - для узла 'scan' - номера читаемых записей (см. scanRecords)
+
+		return - итератор записей узла, поля - node['attr_names']
+	'''
+
+	operator = node['operator']
+	if operator == 'scan':
+		records = scanRecords(node, rows)
+	elif operator == 'filter':
+		records = planRecords(node['input'], isCount)
+		if 'where' in node:
+			records = filterRecords(records, node['where'])
 		else:
-			# Если поле не найдено в таблице
-			raise SQL_DB_Exception('Таблица \'{0}\' поле \'{1}\' не существует !'.format(table_name, name), db)
+			position1, position2 = node['positions']
+			records = (record for record in records if record[position1] == record[position2])
+	else:
+		records = planRecords(node['input'], isCount)
+		position1, position2 = node['positions']
+		table_node = node['table']
+		table_rows = None
+		if operator == 'index join':
+			# Из таблицы читаются записи со значениями поля соединения,
+			# которые есть в соединяемых записях
+			records = list(records)
+			attr_name = table_node['attr_names'][position2]
+			table_rows = indexRows(table_node['table_name'],
+								   tuple(({'attr_name' : attr_name, 'operator' : '=', 'value' : key},)
+										 for key in {record[position1] for record in records}))
+		table_records = planRecords(table_node, isCount, table_rows)
+		if operator == 'nested loop':
+			records = nestedLoopJoin(records, position1, list(table_records), position2)
+		elif node['isBuildInput']:
+			records = joinTables(table_records, position2, records, position1)
+		else:
+			records = joinTables(records, position1, table_records, position2)
 
-	# Запись значений
-	db.write('\t(')
-	comma_count = len(values) - 1
-	for name, value in values.items():
-		db.write('({0}, {1}){2}'.format(name, value,
-				 ', ' if comma_count > 0 else ''))
-		comma_count -= 1
-	db.write(')\n')
+	if isCount:
+		records = countRecords(records, node)
 
+	return records
 
 
-def insert(table_name, values):
-	'''NOT_READY
-		Вставка данных в таблицу текущей БД
 
-		table_name - таблица, в которую происходит добавление
-		values - добавляемая запись,
-				 пример = {
-				 	'age'  : 20,
-				 	'name' : 'Вася'
-				 }
+def planValues(plan, isCount=False):
+	'''
+		Выполнение плана выборки
 
-		return None
+		plan - план выборки (см. planSelect)
+		isCount - True - записи узлов подсчитываются (см. countRecords)
+
+		return - генератор кортежей значений python выбираемых полей
 	'''
 
-	global current_db_name
+	schema = plan['schema']
+	root = plan['root']
 
-	# Если БД не выбрана
-	if current_db_name == None:
-		raise SQL_DB_Exception('Не выбрана БД !')
+	# Таблица без соединений читается из колоночного кеша или параллельно,
+	# записи сразу преобразуются в кортежи значений
+	values = None
+	if root['operator'] == 'scan' and root['access'] == 'column cache':
+		values = columnScan(root['table_name'], root['where'], schema)
+	elif root['operator'] == 'scan' and root['access'] == 'parallel scan':
+		values = parallelScan(root['table_name'], root['where'], schema)
+	if values != None:
+		return countRecords(values, root) if isCount else values
 
-	# Считывание схемы таблицы
-	table_schema = readTableSchema(table_name)
+	records = planRecords(root, isCount)
 
-	# Поиск таблицы, в которую происходит вставка
-	# Запись результатов в промежуточную таблицу
-	isTableFind = False
-	isBodyFind = False
-	isInsert = False
-	isInsertOk = False
-	with open(current_db_name + DB_EXTENSION, 'r') as db,\
-	     open(DB_TEMP_NAME, 'w') as tmp_db:
-		for line in db:
-			# Если нашли заданую таблицу
-			if 'TABLE_NAME = ' + table_name == line.strip():
-				isTableFind = True
-			elif isTableFind and not isInsertOk and re.search(r'TABLE_NAME = ' + TABLE_NAME_PATTERN, line.strip()):
-				# Создаём тело таблицы
-				tmp_db.write('#BODY\n{\n')
-				# Добавить запись
-				insert_record(tmp_db, table_name, table_schema, values)
-				tmp_db.write('}\n')
-				isInsertOk = True
-			elif isTableFind and ('#BODY' == line.strip()):
-				# Если нашли тело таблицы
-				isBodyFind = True
-			elif isBodyFind and ('{' == line.strip()):
-				# Разрешить добавление записи
-				isInsert = True
-			elif not isInsertOk and isInsert:
-				# Добавляем запись в тело таблицы
-				insert_record(tmp_db, table_name, table_schema, values)
-				isInsertOk = True
-			tmp_db.write(line)
-		else:
-			# Если это была последняя таблица без тела
-			if isTableFind and not isInsertOk:
-				# Создаём тело таблицы
-				tmp_db.write('#BODY\n{\n')
-				# Добавить запись
-				insert_record(tmp_db, table_name, table_schema, values)
-				tmp_db.write('}\n')
+	# Поля таблиц, не вошедших в соединение, имеют значение null
+	positions = {attr_name : i for i, attr_name in enumerate(root['attr_names'])}
+	if not set(schema).issubset(positions):
+		records = (record + ('null',) for record in records)
 
-	# Если удаляемая таблица не найдена
-	if not isTableFind:
-		raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table_name))
+	return selectValues(records, [positions.get(attr_name, len(positions)) for attr_name in schema])
 
-	# Переименовываем временную БД в текущую
-	os.remove(current_db_name + DB_EXTENSION)
-	os.rename(DB_TEMP_NAME, current_db_name + DB_EXTENSION)
 
 
+def selectCursor(tables, on, where=None):
+	'''
+		Построчная выборка данных из таблицы текущей БД:
+		записи читаются, отбираются, соединяются и преобразуются
+		по мере получения результата
 
-def delete(table_name, where):
+		tables - имена таблиц, и списки полей
+				 пример:
+				 (
+					 {
+						'table_name' : 'table1',
+						'attrs': (
+							'table1_attr1',
+							'table1_attr2',
+							'table1_attr3'
+						)
+					 },
+					 {
+						'table_name' : 'table2',
+						'attrs': (
+							'table2_attr1',
+							'table2_attr2',
+							'table2_attr3'
+						)
+					 },
+					 { ... }
+				 )
+
+		on - условия объединения таблиц
+			 пример:
+			 (
+			 	(table1.attr1, table2.attr1),
+			 	( ... )
+			 )
+
+		where - условия в разделе where SQL-запроса в дизъюнктивной форме:
+				группы условий, объединённые OR, внутри группы - AND
+				пример:
+				(
+					(
+						{
+							'attr_name' : 'table1.attr1',
+							'operator'  : '>',		# допустимые: '=' '<>' '<' '>'
+							'value'     : '20'
+						},
+						{ ... }
+					),
+					( ... )
+				)
+
+		return - результат выборки (см. select),
+				 в котором 'body' - генератор кортежей значений
 	'''
-		Удаление данных из таблицы текущей БД
+
+	plan = planSelect(tables, on, where)
+
+	return {
+		'schema' : plan['schema'],
+		'body'   : planValues(plan)
+	}
+
+
+
+def selectValues(body, fields):
+	'''
+		Отбор полей выборки и преобразование их значений для python
+
+		body - записи выборки (см. recordParse), итератор
+		fields - номера выбираемых полей в записи
+
+		return - генератор кортежей значений полей в порядке fields
+	'''
+
+	for record in body:
+		yield tuple([unserializeValue(record[i]) for i in fields])
+
+
+
+def fileStamp(path):
+	'''
+		Отметка файла: номер inode, время изменения в нс, размер
+
+		path - путь к файлу
+
+		return - кортеж отметки, None - файл не существует
+	'''
+
+	try:
+		stat = os.stat(path)
+	except FileNotFoundError:
+		return None
+
+	return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+
+def tableVersion(table_name):
+	'''
+		Версия зафиксированного содержимого таблицы текущей БД для кеша
+		результатов: схема таблицы, отметки файлов, в которых она хранится,
+		и размер журнала после последней фиксации, изменившей таблицу.
+		Версия одинакова во всех соединениях, видящих одно состояние БД,
+		и меняется при фиксации изменений таблицы, переносе журнала
+		(файлы заменяются), удалении и создании таблицы
 
 		table_name - имя таблицы
-		where -	условие в разделе where SQL-запроса
-				пример:
-				{
-					'attr_name' : 'возраст',
-					'operator'  : '=',		# допустимые: '=' '<>'
-					'value'     : '20'
-				}
 
+		return - версия таблицы (кортеж)
+	'''
+
+	if session.current_db_storage == DB_STORAGE_PAGE:
+		paths = [dbPath()]
+	else:
+		paths = [tablePath(table_name), tablePath(table_name, DB_TAIL_EXTENSION)]
+
+	journal = session.journal_tables.get(table_name)
+
+	return (readTableSchema(table_name), tuple(fileStamp(path) for path in paths),
+			journal['offset'] if journal != None else 0)
+
+
+
+def resultVersions(tables, on, where):
+	'''
+		Версии таблиц выборки для кеша результатов
+
+		tables, on, where - см. select
+
+		return - {имя таблицы : версия (см. tableVersion)}, None - результат
+				 не кешируется: кеш отключён, БД не выбрана, таблица не существует
+				 или изменена в текущей транзакции
+	'''
+
+	if RESULT_CACHE_MAX_SIZE == 0 or session.current_db_name == None:
 		return None
+
+	versions = {}
+	for table_name in [table['table_name'] for table in tables] +\
+					  [attr.split('.')[0] for attrs in (on or ()) for attr in attrs] +\
+					  [condition['attr_name'].split('.')[0] for group in (where or ()) for condition in group]:
+		if table_name in versions:
+			continue
+		if session.transaction != None and table_name in session.transaction['tables']:
+			return None
+		try:
+			versions[table_name] = tableVersion(table_name)
+		except SQL_DB_Exception:
+			return None
+
+	return versions
+
+
+
+def resultSize(result):
 	'''
+		Оценка размера результата выборки в памяти по первым записям
 
-	global current_db_name
+		result - результат выборки (см. select)
 
-	# Считывание схемы таблицы
-	table_schema = readTableSchema(table_name)
+		return - размер в байтах
+	'''
 
-	isTableFind = False
-	isBodyFind = False
-	isDeleteRecord = False
-	isAttrFind = False
-	isAttrFind = False
-	# Удаление записей таблицы
-	with open(current_db_name + DB_EXTENSION, 'r') as db,\
-	     open(DB_TEMP_NAME, 'w') as tmp_db:
-		for line in db:
-			# Если нашли заданую таблицу
-			if 'TABLE_NAME = ' + table_name == line.strip():
-				isTableFind = True			
-			elif isTableFind and ('#BODY' == line.strip()):
-				# Найдено тело таблицы
-				isBodyFind = True
-			elif isBodyFind and ('{' == line.strip()):
-				# Разрешить удалять записи из таблицы
-				isDeleteRecord = True
-			elif isDeleteRecord and (line.strip() == '}'):
-				# Завершить модификацию записей
-				isTableFind = False
-				isDeleteRecord = False
-				isBodyFind = False 
-			elif isDeleteRecord:
-				# В зависимости от условия в where, удалять записи из таблицы
-				if where == None:	
-					isAttrFind = True
-					continue
-				else:
-					isWhere = False
-					attrs = recordParse(line.strip())
-					for attr in attrs:
-						if (attr['attr_name'] == where['attr_name']):
-							isAttrFind = True
-							if ((where['operator'] == '='  and attr['value'] == where['value']) or
-								(where['operator'] == '<>' and attr['value'] != where['value'])):
-								isWhere = True
-								break
-					if isWhere:
-						continue
-			tmp_db.write(line)
-
-	# Если поле в where не было найдено
-	if not isAttrFind:
-		raise SQL_DB_Exception('В таблице \'{0}\' поля \'{1}\' не существует !'.format(table_name, where['attr_name']))
-
-	# Переименовываем временную БД в текущую
-	os.remove(current_db_name + DB_EXTENSION)
-	os.rename(DB_TEMP_NAME, current_db_name + DB_EXTENSION)
+	body = result['body']
+	sample = body[:100]
+	size = sys.getsizeof(body) + sys.getsizeof(result['schema'])
+	if sample != []:
+		size += sum(sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record)
+					for record in sample) * len(body) // len(sample)
 
+	return size
 
 
-def update(table_name, set_val, where):
+
+def readResult(key, versions):
 	'''
-		Обновление данных в таблице текущей БД
+		Чтение результата выборки из кеша результатов
+
+		key - ключ запроса (путь к БД, запрос)
+		versions - текущие версии таблиц выборки (см. resultVersions)
+
+		return - копия результата выборки, None - результата нет в кеше или он устарел
+	'''
+
+	global result_cache_size
+
+	with result_cache_lock:
+		cached = result_cache.get(key)
+		if cached == None:
+			return None
+
+		if cached['versions'] != versions:
+			del result_cache[key]
+			result_cache_size -= cached['size']
+			return None
+
+		result_cache.move_to_end(key)
+
+	return {'schema' : list(cached['result']['schema']), 'body' : list(cached['result']['body'])}
+
 
-		table_name - имя таблицы
-		set_val - устанавливаемое значение поля
-				  пример:
-				  {
-						# Было ... set зарплата *= 20 ...
-						'attr_name' : 'зарплата',
-						'operator'	: '*=', 			# допустимые '=' '*=' '+=' '-=' '/='
-						'dvalue'    : '20'
-				  }	  
-		where -	условие в разделе where SQL-запроса
-				пример:
-				{
-					'attr_name' : 'возраст',
-					'operator'  : '=',		# допустимые: '=' '<>'
-					'value'     : '20'
-				}
+
+def writeResult(key, versions, result):
+	'''
+		Запись результата выборки в кеш результатов, при превышении
+		RESULT_CACHE_MAX_SIZE вытесняются давно не использованные результаты
+
+		key - ключ запроса (путь к БД, запрос)
+		versions - версии таблиц выборки (см. resultVersions)
+		result - результат выборки (см. select)
 
 		return None
 	'''
 
-	global current_db_name
+	global result_cache_size
 
-	# Считывание схемы таблицы
-	table_schema = readTableSchema(table_name)
+	size = resultSize(result)
+	if size > RESULT_CACHE_MAX_SIZE:
+		return
 
-	isTableFind = False
-	isBodyFind = False
-	isUpdateRecord = False
-	isAttrFind = False
-	# Обновление записей таблицы
-	with open(current_db_name + DB_EXTENSION, 'r') as db,\
-	     open(DB_TEMP_NAME, 'w') as tmp_db:
-		for line in db:
-			# Если нашли заданую таблицу
-			if 'TABLE_NAME = ' + table_name == line.strip():
-				isTableFind = True			
-			elif isTableFind and ('#BODY' == line.strip()):
-				# Найдено тело таблицы
-				isBodyFind = True
-			elif isBodyFind and ('{' == line.strip()):
-				# Разрешить обновлять записи из таблицы
-				isUpdateRecord = True
-			elif isUpdateRecord and (line.strip() == '}'):
-				# Завершить модификацию записей
-				isTableFind = False
-				isUpdateRecord = False
-				isBodyFind = False 
-			elif isUpdateRecord:
-				# В зависимости от условия в where, обновлять записи из таблицы
-				isUpdate = False
-				attrs = recordParse(line.strip())
-				if where != None:
-					for attr in attrs:
-						if (attr['attr_name'] == where['attr_name']):
-							isAttrFind = True
-							if ((where['operator'] == '='  and attr['value'] == where['value']) or
-								(where['operator'] == '<>' and attr['value'] != where['value'])):
-								isUpdate = True
-								break
-				else:
-					isUpdate = True
-					isAttrFind = True
-				# Если поле в where не было найдено
-				if not isAttrFind:
-					raise SQL_DB_Exception('В таблице \'{0}\' поля \'{1}\' не существует !'.format(table_name, where['attr_name']), tmp_db)
-				if isUpdate:
-					if attrIsPrimaryKey(table_schema, set_val['attr_name']):
-						raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' является первичным ключом, его обновлять нельзя !'.format(table_name, set_val['attr_name']), tmp_db)
-					if attrIsUnique(table_schema, set_val['attr_name']):
-						raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' является альтернативным ключом, его обновлять нельзя !'.format(table_name, set_val['attr_name']), tmp_db)
-					isSetValFind = False
-					for attr in attrs:
-						if attr['attr_name'] == set_val['attr_name']:
-							isSetValFind = True
-							if (set_val['operator'] == '='):
-								if attrIsInteger(table_schema, attr['attr_name']):
-									# Если поле integer - новое значение должно быть тоже integer
-									try:
-										set_val['dvalue'] = int(set_val['dvalue'])
-									except TypeError:
-										if attrIsNull(table_schema, attr['attr_name']) and set_val['dvalue'] != 'null':
-											raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа integer !'.format(table_name, set_val['attr_name']), tmp_db)
-								elif attrIsString(table_schema, attr['attr_name']):			
-									# Если поле string - новое значение должно быть тоже string
-									if (attrIsNull(table_schema, attr['attr_name']) and 
-										set_val['dvalue'] != 'null' and
-									    (set_val['dvalue'][0] != '\'' or set_val['dvalue'][-1] != '\'')):
-										raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа string !'.format(table_name, set_val['attr_name']), tmp_db)
-								attr['value'] = set_val['dvalue']
-							elif set_val['operator'] in ('*=', '+=', '-=', '/='):
-								if attrIsString(table_schema, attr['attr_name']):
-									raise SQL_DB_Exception('В таблице \'{0}\' к полю \'{1}\' типа string нельзя применять данную операцию !'.format(table_name, set_val['attr_name']), tmp_db)
-								elif attrIsInteger(table_schema, attr['attr_name']):
-									# Если поле integer - новое значение должно быть тоже integer
-									try:
-										set_val['dvalue'] = int(set_val['dvalue'])
-										attr['value'] = int(attr['value'])
-										if set_val['operator'] == '*=':
-											attr['value'] *= set_val['dvalue']
-										elif set_val['operator'] == '+=':
-											attr['value'] += set_val['dvalue']
-										elif set_val['operator'] == '-=':
-											attr['value'] -= set_val['dvalue']
-										elif set_val['operator'] == '/=':
-											attr['value'] /= set_val['dvalue']
-									except TypeError:
-										raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' может принимать только значение типа integer !'.format(table_name, set_val['attr_name']), tmp_db)
-							line = '\t' + recordUnparse(attrs) + '\n'
-					# Если поле в set не было найдено
-					if not isSetValFind:
-						raise SQL_DB_Exception('В таблице \'{0}\' поля \'{1}\' не существует !'.format(table_name, set_val['attr_name']), tmp_db)
-			tmp_db.write(line)
-
-	# Переименовываем временную БД в текущую
-	os.remove(current_db_name + DB_EXTENSION)
-	os.rename(DB_TEMP_NAME, current_db_name + DB_EXTENSION)
-
-
-
-def select(tables, on):
+	cached = {
+		'versions' : versions,
+		'result'   : {'schema' : list(result['schema']), 'body' : list(result['body'])},
+		'size'     : size
+	}
+
+	with result_cache_lock:
+		previous = result_cache.pop(key, None)
+		if previous != None:
+			result_cache_size -= previous['size']
+
+		result_cache[key] = cached
+		result_cache_size += size
+
+		while result_cache_size > RESULT_CACHE_MAX_SIZE:
+			_, previous = result_cache.popitem(last=False)
+			result_cache_size -= previous['size']
+
+
+
+def select(tables, on, where=None):
 	'''
 		Выборка данных из таблицы текущей БД
 
@@ -870,6 +5316,21 @@ def select(tables, on):
 			 	( ... )
 			 )
 
+		where - условия в разделе where SQL-запроса в дизъюнктивной форме:
+				группы условий, объединённые OR, внутри группы - AND
+				пример:
+				(
+					(
+						{
+							'attr_name' : 'table1.attr1',
+							'operator'  : '>',		# допустимые: '=' '<>' '<' '>'
+							'value'     : '20'
+						},
+						{ ... }
+					),
+					( ... )
+				)
+
 		return - результат выборки
 				 пример:
 				 {
@@ -889,169 +5350,81 @@ def select(tables, on):
 				 			 string  -> str() без кавычек вокруг
 	'''
 
-	global current_db_name
+	# Результат повторной выборки из неизменённых таблиц берётся из кеша
+	versions = resultVersions(tables, on, where)
+	if versions != None:
+		key = (os.path.abspath(session.current_db_name), repr((tables, on, where)))
+		result = readResult(key, versions)
+		if result != None:
+			return result
+
+	result = selectCursor(tables, on, where)
+	result['body'] = list(result['body'])
+
+	if versions != None:
+		writeResult(key, versions, result)
+
+	return result
+
+
+
+def explain(tables, on, where=None):
+	'''
+		Выполнение выборки с выводом её плана (EXPLAIN SELECT)
+
+		tables, on, where - см. select
+
+		return - результат выборки (см. select) с полями plan, estimated, actual:
+				 по записи на узел плана (см. planSelect) с отступом по вложенности,
+				 оценкой числа записей узла и числом его записей при выполнении
+				 пример:
+				 {
+					'schema' : ['plan', 'estimated', 'actual'],
+					'body'   : [
+						('select table1.attr1, table2.attr2', 100, 97),
+						('  hash join table1.attr1 = table2.attr1', 100, 97),
+						('    scan table1 (column cache): table1.attr1', 1000, 1000),
+						('    scan table2 (index) where table2.attr2 = 5: table2.attr1, table2.attr2', 100, 97)
+					]
+				 }
+	'''
+
+	plan = planSelect(tables, on, where)
+	count = 0
+	for _ in planValues(plan, True):
+		count += 1
 
-	# Результирующая таблица
-	result = {
-		'schema' : list(),
-		'body'   : list()
+	return {
+		'schema' : ['plan', 'estimated', 'actual'],
+		'body'   : [('select ' + ', '.join(plan['schema']), plan['root']['estimate'], count)] + explainNode(plan['root'], 1)
 	}
 
-	# Заполнение схемы
-	for table in tables:
-		for attr_name in table['attrs']:
-			table_name = attr_name.split('.')[0]
-			if table_name != table['table_name']:
-				raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table_name))
-			result['schema'].append(attr_name)
-	
-	# Заполнение имён выбираемых таблиц
-	tmp_tables = []
-	for table in tables:
-		tmp_tables.append({
-			'table_name' : table['table_name'],
-			'body' : [],
-			'isFind' : False
-		})
 
-	# Выборка данных из таблиц
-	isBodyFind = False
-	isSelectRecord = False
-	isTableFind = False
-	with open(current_db_name + DB_EXTENSION, 'r') as db:
-		for line in db:
-			# Если нашли таблицу
-			if line.startswith('TABLE_NAME = '):
-				isTableFind = False
-				table_name = line.split(' = ')[1].strip()
-				for i in range(len(tmp_tables)):
-					if table_name == tmp_tables[i]['table_name']:
-						isTableFind = True		
-						tmp_table_name = table_name
-						tmp_table_num = i
-						tmp_tables[i]['isFind'] = True
-						break
-			elif isTableFind and ('#BODY' == line.strip()):
-				# Найдено тело таблицы
-				isBodyFind = True
-			elif isBodyFind and ('{' == line.strip()):
-				# Разрешить выбирать записи из таблицы
-				isSelectRecord = True
-			elif isSelectRecord and (line.strip() == '}'):
-				# Завершить выборку записей
-				isSelectRecord = False
-				isBodyFind = False
-			elif isSelectRecord:
-				# Выборка записей
-				attrs = list(recordParse(line.strip()))
-				for attr in attrs:
-					attr['attr_name'] = tmp_table_name + '.' + attr['attr_name']
-				# Проверка правильности полей в tables
-				for table in tables:
-					if table['table_name'] == tmp_table_name:
-						table_attrs = [attr for attr in table['attrs']]
-						break
-				for table_attr in table_attrs:
-					if table_attr not in [attr['attr_name'] for attr in attrs]:
-						raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' не существует !'.format(tmp_table_name, table_attr))
-				tmp_tables[tmp_table_num]['body'].append(attrs)
-
-	# Проверка найдены ли все таблицы
-	for tmp_table in tmp_tables:
-		if not tmp_table['isFind']:
-			raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(tmp_table['table_name']))
-
-	# Выполняем inner join таблиц по условию в on
-	if on != None:
-		for attr1, attr2 in on:
-			table1_name = attr1.split('.')[0]
-			attr1_name = attr1
-			table2_name = attr2.split('.')[0]
-			attr2_name = attr2
-			# Проверка совместимости типов полей
-			table1_schema = readTableSchema(table1_name)
-			table2_schema = readTableSchema(table2_name)
-			if (not (attrIsInteger(table1_schema, attr1_name.split('.')[1]) and attrIsInteger(table2_schema, attr2_name.split('.')[1])) and
-			    not (attrIsString(table1_schema, attr1_name.split('.')[1])  and attrIsString(table2_schema, attr2_name.split('.')[1]))):
-				raise SQL_DB_Exception('Поля \'{0}\' и \'{1}\' имеют разные типы !'.format(attr1_name, attr2_name))
-			tmp_table1 = None
-			tmp_table2 = None
-			# Поиск нужных таблиц
-			# from pprint import pprint
-			# pprint(tmp_tables)
-			for tmp_table in tmp_tables:
-				if tmp_table['table_name'] == table1_name:
-					tmp_table1 = tmp_table
-				elif tmp_table['table_name'] == table2_name:
-					tmp_table2 = tmp_table
-			# Если какая-то из таблиц не была найдена
-			if tmp_table1 == None:
-				raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table1_name))
-			if tmp_table2 == None:
-				raise SQL_DB_Exception('Таблица \'{0}\' не существует !'.format(table2_name))
-			# Фильтрация не подходящих условию записей
-			body = []
-			i1 = 0
-			len1 = len(tmp_table1['body'])
-			while i1 < len1:
-				record1 = tmp_table1['body'][i1]
-				for attr in record1:
-					if attr['attr_name'] == attr1_name:
-						attr1_value = attr['value']
-						break
-				else:
-					raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' не существует !'.format(table1_name, attr1_name))
-				i2 = 0
-				len2 = len(tmp_table2['body'])
-				while i2 < len2:
-					record2 = tmp_table2['body'][i2]
-					for attr in record2:
-						if attr['attr_name'] == attr2_name:
-							attr2_value = attr['value']
-							break
-					else:
-						raise SQL_DB_Exception('В таблице \'{0}\' поле \'{1}\' не существует !'.format(table2_name, attr2_name))
-					# Если значения полей в таблицах совпали
-					if attr1_value == attr2_value:
-						body.append(record1 + record2)
-					i2 += 1
-				i1 += 1
-			tmp_table1['body'] = body
-			tmp_table2['body'] = body
-	
-	# Оставляем только результирующие записи	
-	if on == None:
-		body = tmp_tables[0]['body']
-	else:		
-		for tmp_table in tmp_tables:
-			if tmp_table['table_name'] == table2_name:
-				body = tmp_table['body']
-				break
 
-	# Фильтрация лишних полей
-	for record in body:
-		i = 0
-		count_attrs = len(record)
-		while i < count_attrs:
-			if record[i]['attr_name'] not in result['schema']:
-				del record[i]
-				i -= 1
-				count_attrs -= 1
-			else:
-				i += 1
+def explainNode(node, depth):
+	'''
+		Записи плана выборки для узла и вложенных в него узлов (см. explain)
 
-	# Преобразование значений для python
-	for record in body:
-		new_record = [None for i in range(len(result['schema']))]
-		for attr in record:
-			if attr['value'] == 'null':
-				attr_value = None
-			elif attr['value'][0] == '\'' and attr['value'][-1] == '\'':
-				attr_value = attr['value'][1:-1]
-			else:
-				attr_value = int(attr['value'])
-			new_record[result['schema'].index(attr['attr_name'])] = attr_value
-		result['body'].append(tuple(new_record))
-	
-	return result
-		
\ No newline at end of file
+		node - узел плана (см. planSelect)
+		depth - вложенность узла
+
+		return - список записей (описание узла, оценка числа записей, число записей)
+	'''
+
+	if node['operator'] == 'scan':
+		text = 'scan {0} ({1})'.format(node['table_name'], node['access'])
+		if node['where'] != None:
+			text += ' where ' + whereText(node['where'])
+		text += ': ' + ', '.join(node['attr_names'])
+	else:
+		text = node['operator'] + ' ' + node['condition']
+		if node['operator'] == 'hash join':
+			build_node = node['input'] if node['isBuildInput'] else node['table']
+			text += ' (hash: ' + ', '.join(dict.fromkeys(attr_name.split('.')[0] for attr_name in build_node['attr_names'])) + ')'
+
+	lines = [('  ' * depth + text, node['estimate'], node['actual'])]
+	for key in ('input', 'table'):
+		if key in node:
+			lines += explainNode(node[key], depth + 1)
+
+	return lines
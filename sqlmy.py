@@ -5,13 +5,50 @@
     Пользователь СУБД может:
         1) Выбрать базу данных - setDB
         2) Исполнить запрос к текущей базе данных - exec
+        3) Построчно получить результат выборки - cursor
+        4) Загрузить записи в таблицу из файла CSV или JSON Lines - load
+        5) Подготовить запрос с параметрами ? для многократного выполнения - prepare
+        6) Открыть соединение со своим выбором БД и транзакцией - connect
+        7) Переиспользовать соединения с одной БД между вызовами - Pool
+
+    Функции модуля работают через общее соединение по умолчанию,
+    потокам и процессам, одновременно работающим с БД, следует
+    открывать свои соединения: выборки соединений разных потоков
+    выполняются одновременно, изменения БД внутри процесса - по очереди
 '''
 
 
+import contextlib
+import itertools
+import threading
+import time
+import sqldb
 import sqlparser
 
 
 
+# Число записей, возвращаемых Cursor.fetchmany по умолчанию
+CURSOR_ARRAY_SIZE = 100
+
+
+# Наибольшее число соединений пула по умолчанию (см. Pool)
+POOL_SIZE = 8
+
+
+# Время простоя соединения пула в секундах по умолчанию,
+# после которого соединение закрывается
+POOL_IDLE_TIMEOUT = 60
+
+
+# Блокировка изменений БД внутри процесса: состояние соединения загружается
+# только в свой поток (см. sqldb.session), поэтому выборки соединений
+# выполняются одновременно под разделяемой блокировкой БД, а изменения
+# соединений одного процесса - по очереди. Без fcntl блокировки файлов БД
+# нет, и под engine_lock выполняются все операции соединений
+engine_lock = threading.RLock()
+
+
+
 
 
 class SQLMY_Exception(Exception):
@@ -25,6 +62,439 @@ class SQLMY_Exception(Exception):
 
 
 
+class Connection:
+    '''
+        Соединение с СУБД: хранит свой выбор БД, транзакцию, каталог и индексы.
+        Соединения одной БД согласуются блокировкой файла БД (см. sqldb.lockDB):
+        выборки выполняются под разделяемой блокировкой, изменения -
+        под исключительной, которая держится до конца явной транзакции,
+        курсор держит разделяемую блокировку до закрытия
+
+        database_name - имя выбранной БД или None
+    '''
+
+    def __init__(self, database_name=None):
+        self.database_name = None
+        self._state = sqldb.sessionState(True)
+        self._mutex = threading.RLock()
+        self._lock = None            # открытый файл блокировки БД
+        self._lock_db_name = None    # имя БД, файл блокировки которой открыт
+        self._lock_version = None    # версия БД при установке блокировки
+        self._locks = 0              # число операций, курсоров и транзакций под блокировкой
+        self._isLocked = False
+        self._isExclusive = False
+        self._isTransaction = False
+        self._version = None         # (имя БД, версия), по которой построено состояние
+
+        if database_name != None:
+            self.setDB(database_name)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    @contextlib.contextmanager
+    def _activate(self, isExclusive=False):
+        '''
+            Загрузка состояния соединения в sqldb для текущего потока
+            на время блока with, после блока в потоке восстанавливается
+            прежнее состояние; изменение БД выполняется под engine_lock
+
+            isExclusive - True - операция изменяет БД
+
+            return None
+        '''
+
+        with engine_lock if isExclusive or sqldb.fcntl == None else contextlib.nullcontext():
+            state = sqldb.sessionState()
+            sqldb.setSessionState(self._state)
+            try:
+                yield
+            finally:
+                sqldb.setSessionState(state)
+
+
+    def _acquire(self, db_name, isExclusive):
+        '''
+            Установка блокировки БД для операции, блокировка
+            уже установленная соединением при необходимости усиливается
+
+            db_name - имя БД или None - операция без выбранной БД
+            isExclusive - True - операция изменяет БД
+
+            return None
+        '''
+
+        if self._locks > 0 and self._isLocked and db_name != self._lock_db_name:
+            raise SQLMY_Exception('Соединение занято выборкой или транзакцией БД \'{0}\' !'.format(
+                                  self._lock_db_name))
+
+        if db_name != None and (not self._isLocked or isExclusive and not self._isExclusive):
+            if self._lock_db_name != db_name:
+                if self._lock != None:
+                    self._lock.close()
+                self._lock = sqldb.openLock(db_name)
+                self._lock_db_name = db_name
+            self._lock_version = sqldb.lockDB(self._lock, isExclusive)
+            self._isExclusive = isExclusive or self._isLocked and self._isExclusive
+            self._isLocked = True
+
+        self._locks += 1
+
+
+    def _release(self):
+        '''
+            Завершение операции под блокировкой, после последней
+            блокировка снимается
+
+            return None
+        '''
+
+        self._locks -= 1
+        if self._locks > 0 or not self._isLocked:
+            return
+
+        self._isLocked = False
+        version = sqldb.unlockDB(self._lock, self._isExclusive)
+
+        # Состояние соединения соответствует БД после его изменений
+        if self._version == (self._lock_db_name, self._lock_version):
+            self._version = (self._lock_db_name, version)
+
+
+    def _refresh(self):
+        '''
+            Построение состояния заново, если БД изменена
+            другим соединением, и учёт изменения состояния операцией,
+            вызывается с загруженным состоянием соединения (см. _activate)
+
+            return None
+        '''
+
+        if self._isLocked and sqldb.session.current_db_name == self._lock_db_name:
+            if self._version != (self._lock_db_name, self._lock_version):
+                sqldb.refreshDB()
+            self._version = (self._lock_db_name, self._lock_version)
+
+        self.database_name = sqldb.session.current_db_name
+
+        # Явная транзакция держит блокировку до фиксации или отката
+        isTransaction = sqldb.session.transaction != None
+        if isTransaction != self._isTransaction:
+            self._isTransaction = isTransaction
+            self._locks += 1 if isTransaction else -1
+
+
+    def _run(self, db_name, isExclusive, function, *args, isCursor=False):
+        '''
+            Выполнение операции sqlparser под блокировкой БД
+            с загруженным состоянием соединения
+
+            db_name - имя блокируемой БД
+            isExclusive - True - операция изменяет БД
+            function - функция sqlparser (sqldb)
+            args - аргументы функции
+            isCursor - True - результат - выборка, блокировка
+                       держится до закрытия курсора
+
+            return - результат функции, для выборки - курсор (см. Cursor)
+        '''
+
+        try:
+            with self._mutex:
+                self._acquire(db_name, isExclusive)
+                try:
+                    with self._activate(isExclusive):
+                        self._refresh()
+                        try:
+                            result = function(*args)
+                        finally:
+                            self._refresh()
+                except:
+                    self._release()
+                    raise
+
+                if not isCursor:
+                    self._release()
+                    return result
+        except SQLMY_Exception:
+            raise
+        except Exception as e:
+            raise SQLMY_Exception(e)
+
+        return Cursor(result, self)
+
+
+    def setDB(self, database_name):
+        '''
+            Выбор базы данных для выполнения запросов (см. setDB)
+
+            database_name - имя базы данных
+
+            return None
+        '''
+
+        # Смена БД завершает транзакцию
+        if self._isTransaction:
+            self._run(self.database_name, True, sqldb.commit)
+
+        self._run(database_name, True, sqlparser.setDB, database_name)
+
+
+    def exec(self, querys):
+        '''
+            Парсинг SQL запросов (см. exec)
+
+            querys - SQL запросы, разделённые ;
+
+            return - результат выборки для SELECT, иначе None
+        '''
+
+        try:
+            isExclusive = not sqlparser.isReadOnly(querys)
+        except Exception as e:
+            raise SQLMY_Exception(e)
+
+        return self._run(self.database_name, isExclusive, sqlparser.parse, querys)
+
+
+    def cursor(self, query):
+        '''
+            Выполнение запроса SELECT с построчным получением результата
+
+            query - один запрос SELECT
+
+            return - курсор (см. Cursor)
+        '''
+
+        return self._run(self.database_name, False, sqlparser.cursor, query, isCursor=True)
+
+
+    def load(self, table_name, path, file_format=None):
+        '''
+            Массовая загрузка записей в таблицу текущей БД из файла (см. load)
+
+            return - число загруженных записей
+        '''
+
+        return self._run(self.database_name, True, sqlparser.load, table_name, path, file_format)
+
+
+    def prepare(self, query):
+        '''
+            Подготовка запроса с параметрами ? (см. prepare)
+
+            query - один SQL запрос
+
+            return - подготовленный запрос (см. Statement)
+        '''
+
+        try:
+            return Statement(query, self)
+        except Exception as e:
+            raise SQLMY_Exception(e)
+
+
+    def close(self):
+        '''
+            Закрытие соединения: незавершённая явная транзакция
+            откатывается, файл блокировки БД закрывается
+
+            return None
+        '''
+
+        if self._isTransaction:
+            self._run(self.database_name, True, sqldb.rollback)
+
+        with self._mutex:
+            if self._locks == 0 and self._lock != None:
+                self._lock.close()
+                self._lock = None
+                self._lock_db_name = None
+
+
+
+def connect(database_name=None):
+    '''
+        Открытие соединения с СУБД
+
+        database_name - имя выбираемой базы данных или None
+
+        return - соединение (см. Connection)
+    '''
+
+    return Connection(database_name)
+
+
+
+class Pool:
+    '''
+        Пул соединений с одной БД: соединения с построенными каталогом,
+        индексами, изменениями журнала и открытыми файлами таблиц
+        переиспользуются между вызовами, а не открываются заново.
+        Простаивающие дольше idle_timeout соединения закрываются
+        при получении и возврате соединений
+
+        database_name - имя БД
+        size - наибольшее число открытых соединений, при их занятости
+               получение соединения ожидает возврата другого
+        idle_timeout - время простоя соединения в секундах
+    '''
+
+    def __init__(self, database_name, size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT):
+        if size < 1:
+            raise SQLMY_Exception('Размер пула должен быть положительным !')
+
+        self.database_name = database_name
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = []              # [(время возврата, соединение)], последние - в конце
+        self._count = 0              # число открытых соединений
+        self._isClosed = False
+        self._condition = threading.Condition()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def _evict(self):
+        '''
+            Закрытие соединений, простаивающих дольше idle_timeout,
+            вызывается под self._condition
+
+            return None
+        '''
+
+        now = time.monotonic()
+        while self._idle != [] and now - self._idle[0][0] > self.idle_timeout:
+            self._idle.pop(0)[1].close()
+            self._count -= 1
+
+
+    def acquire(self):
+        '''
+            Получение соединения: последнего возвращённого из простаивающих
+            или нового, если пул не заполнен
+
+            return - соединение (см. Connection), после работы
+                     его нужно вернуть в пул - release
+        '''
+
+        with self._condition:
+            self._evict()
+            while self._idle == [] and self._count >= self.size and not self._isClosed:
+                self._condition.wait()
+            if self._isClosed:
+                raise SQLMY_Exception('Пул соединений закрыт !')
+            if self._idle != []:
+                return self._idle.pop()[1]
+            self._count += 1
+
+        try:
+            return Connection(self.database_name)
+        except:
+            with self._condition:
+                self._count -= 1
+                self._condition.notify()
+            raise
+
+
+    def release(self, connection):
+        '''
+            Возврат соединения в пул: незавершённая явная транзакция
+            откатывается; соединение с незакрытым курсором
+            или другой выбранной БД закрывается
+
+            connection - соединение, полученное из пула
+
+            return None
+        '''
+
+        try:
+            if connection._isTransaction:
+                connection._run(connection.database_name, True, sqldb.rollback)
+            isReusable = connection._locks == 0 and connection.database_name == self.database_name
+        except SQLMY_Exception:
+            isReusable = False
+
+        with self._condition:
+            if isReusable and not self._isClosed:
+                self._idle.append((time.monotonic(), connection))
+            else:
+                connection.close()
+                self._count -= 1
+            self._evict()
+            self._condition.notify()
+
+
+    @contextlib.contextmanager
+    def connection(self):
+        '''
+            Получение соединения на время блока with,
+            после блока соединение возвращается в пул
+
+            return - соединение (см. Connection)
+        '''
+
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+
+    def exec(self, querys):
+        '''
+            Парсинг SQL запросов соединением пула (см. exec)
+
+            querys - SQL запросы, разделённые ;
+
+            return - результат выборки для SELECT, иначе None
+        '''
+
+        with self.connection() as connection:
+            return connection.exec(querys)
+
+
+    def load(self, table_name, path, file_format=None):
+        '''
+            Массовая загрузка записей в таблицу соединением пула (см. load)
+
+            return - число загруженных записей
+        '''
+
+        with self.connection() as connection:
+            return connection.load(table_name, path, file_format)
+
+
+    def close(self):
+        '''
+            Закрытие пула: простаивающие соединения закрываются сразу,
+            занятые - при возврате
+
+            return None
+        '''
+
+        with self._condition:
+            self._isClosed = True
+            for _, connection in self._idle:
+                connection.close()
+            self._count -= len(self._idle)
+            self._idle = []
+            self._condition.notify_all()
+
+
+
 def setDB(database_name):
     '''
         Выбор базы данных для выполнения запросов
@@ -34,10 +504,7 @@ def setDB(database_name):
         return None
     '''
     
-    try:
-        sqlparser.setDB(database_name)
-    except Exception as e:
-        raise SQLMY_Exception(e)
+    default_connection.setDB(database_name)
 
 
 
@@ -46,6 +513,8 @@ def exec(querys):
         Парсинг SQL запросов
 
         querys - SQL запросы, разделённые ;
+                   вне явной транзакции (BEGIN ... COMMIT) запросы выполняются
+                   пакетом: изменения записываются в БД вместе, при ошибке - отменяются
                    пример:
                    CREATE DATABASE school;
                    CREATE TABLE student (
@@ -73,7 +542,211 @@ def exec(querys):
                     { ... }
                   ]
     '''
-    try:
-        sqlparser.parse(querys)
-    except Exception as e:
-        raise SQLMY_Exception(e)
\ No newline at end of file
+    return default_connection.exec(querys)
+
+
+
+class Cursor:
+    '''
+        Курсор для построчного получения результата выборки,
+        записи читаются из БД по мере их получения,
+        до закрытия курсора соединение держит блокировку БД
+
+        schema - имена выбираемых полей
+    '''
+
+    def __init__(self, result, connection):
+        self.schema = result['schema']
+        self._body = result['body']
+        self._connection = connection
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        if self._connection == None:
+            raise StopIteration
+
+        try:
+            with self._connection._mutex, self._connection._activate():
+                return next(self._body)
+        except StopIteration:
+            self.close()
+            raise
+        except Exception as e:
+            self.close()
+            raise SQLMY_Exception(e)
+
+
+    def fetchone(self):
+        '''
+            Получение следующей записи
+
+            return - кортеж значений полей или None, если записи закончились
+        '''
+
+        return next(self, None)
+
+
+    def fetchmany(self, size=CURSOR_ARRAY_SIZE):
+        '''
+            Получение следующих записей
+
+            size - наибольшее число записей
+
+            return - список кортежей значений полей
+        '''
+
+        return self._fetch(size)
+
+
+    def fetchall(self):
+        '''
+            Получение всех оставшихся записей
+
+            return - список кортежей значений полей
+        '''
+
+        return self._fetch(None)
+
+
+    def _fetch(self, size):
+        '''
+            Получение следующих записей за одно обращение к БД,
+            после последней записи курсор закрывается
+
+            size - наибольшее число записей, None - все записи
+
+            return - список кортежей значений полей
+        '''
+
+        if self._connection == None:
+            return []
+
+        try:
+            with self._connection._mutex, self._connection._activate():
+                records = list(itertools.islice(self._body, size))
+        except Exception as e:
+            self.close()
+            raise SQLMY_Exception(e)
+
+        if size == None or len(records) < size:
+            self.close()
+
+        return records
+
+
+    def close(self):
+        '''
+            Завершение выборки, освобождение файлов БД
+
+            return None
+        '''
+
+        connection = self._connection
+        if connection == None:
+            return
+        self._connection = None
+
+        with connection._mutex:
+            try:
+                with connection._activate():
+                    self._body.close()
+            finally:
+                connection._release()
+
+
+
+def cursor(query):
+    '''
+        Выполнение запроса SELECT с построчным получением результата
+
+        query - один запрос SELECT
+
+        return - курсор (см. Cursor)
+    '''
+
+    return default_connection.cursor(query)
+
+
+
+def load(table_name, path, file_format=None):
+    '''
+        Массовая загрузка записей в таблицу текущей БД из файла
+
+        table_name - имя таблицы
+        path - путь к файлу CSV (первая строка - имена полей)
+               или JSON Lines (в каждой строке - объект JSON)
+        file_format - 'csv' или 'jsonl', None - по расширению файла
+
+        return - число загруженных записей
+    '''
+
+    return default_connection.load(table_name, path, file_format)
+
+
+
+class Statement:
+    '''
+        Подготовленный запрос: парсится один раз,
+        при выполнении в план подставляются значения параметров ?
+
+        query - текст запроса
+        params - число параметров
+    '''
+
+    def __init__(self, query, connection):
+        self.query = query
+        self._statement = sqlparser.prepare(query)
+        self._connection = connection
+        self._isSelect = self._statement['plan'][0] in (sqldb.select, sqldb.explain, sqldb.count)
+        self.params = self._statement['params']
+
+
+    def execute(self, *params):
+        '''
+            Выполнение запроса
+
+            params - значения параметров: None, int() или str()
+
+            return - для SELECT - результат выборки (см. exec), иначе None
+        '''
+
+        return self._connection._run(self._connection.database_name, not self._isSelect,
+                                    sqlparser.execute, self._statement, params)
+
+
+    def cursor(self, *params):
+        '''
+            Выполнение запроса SELECT с построчным получением результата
+
+            params - значения параметров
+
+            return - курсор (см. Cursor)
+        '''
+
+        return self._connection._run(self._connection.database_name, False,
+                                    sqlparser.preparedCursor, self._statement, params, isCursor=True)
+
+
+
+def prepare(query):
+    '''
+        Подготовка запроса с параметрами ?
+
+        query - один SQL запрос, пример:
+                INSERT INTO student (id, name) VALUES (?, ?)
+
+        return - подготовленный запрос (см. Statement)
+    '''
+
+    return default_connection.prepare(query)
+
+
+
+# Соединение функций модуля, его состояние - состояние sqldb главного
+# потока, общее с прямыми вызовами sqlparser в этом потоке
+default_connection = Connection()
+default_connection._state = sqldb.sessionState()
@@ -0,0 +1,789 @@
+'''
+	Страничное (двоичное) хранение БД
+
+	БД представляется в виде файла (db_name.dbp),
+	который состоит из страниц размером PAGE_SIZE байт:
+
+	Страница 0 - заголовок файла:
+		MAGIC, размер страницы, число страниц в файле,
+		первая свободная страница, первая страница каталога
+
+	Остальные страницы начинаются с заголовка страницы:
+		тип страницы, следующая страница цепочки (0 - нет), занято байт
+	за которым следуют данные страницы
+
+	Каталог - цепочка страниц, в которой записаны таблицы:
+		имя таблицы, схема таблицы,
+		первая и последняя страницы тела таблицы, число страниц и записей
+	и за ними статистика таблиц (см. sqldb.analyze), если она собрана:
+		имя таблицы, число записей, для каждого поля в порядке схемы -
+		число различных значений, число null, наименьшее и наибольшее
+		значения integer (varint zigzag, если они есть)
+
+	Тело таблицы - цепочка страниц с записями, каждая запись:
+		длина записи (varint),
+		битовая карта null-полей,
+		значения остальных полей в порядке схемы:
+			integer - varint (zigzag),
+			string  - длина в байтах (varint) + строка в utf-8
+
+	Освобождённые страницы образуют цепочку свободных страниц
+	и используются повторно
+
+	Записи передаются и возвращаются кортежами значений python
+	в порядке полей схемы: null -> None, integer -> int(), string -> str()
+'''
+
+
+import struct
+
+
+
+# Сигнатура файла страничной БД
+MAGIC = b'SQLMYPG1'
+
+
+# Размер страницы в байтах
+PAGE_SIZE = 4096
+
+
+# Заголовок файла: сигнатура, размер страницы, число страниц,
+# первая свободная страница, первая страница каталога
+HEADER_FORMAT = '<8sIIII'
+
+
+# Заголовок страницы: тип, следующая страница, занято байт
+PAGE_HEADER_FORMAT = '<BIH'
+PAGE_HEADER_SIZE = struct.calcsize(PAGE_HEADER_FORMAT)
+
+
+# Место под данные на странице
+PAGE_DATA_SIZE = PAGE_SIZE - PAGE_HEADER_SIZE
+
+
+# Типы страниц
+PAGE_DIRECTORY = 1
+PAGE_DATA = 2
+PAGE_FREE = 3
+
+
+# Флаги ограничений поля в каталоге
+FLAG_PRIMARY_KEY = 1
+FLAG_UNIQUE = 2
+FLAG_NULL = 4
+
+
+
+
+
+class SQL_PAGE_Exception(Exception):
+	'''
+		Исключение для отлова ошибок работы со страничными файлами БД
+	'''
+
+	...
+
+
+
+
+
+def encodeVarint(value, buffer):
+	'''
+		Запись неотрицательного целого числа переменной длины (varint)
+
+		value - число
+		buffer - bytearray, в конец которого дописывается число
+
+		return None
+	'''
+
+	while value >= 0x80:
+		buffer.append((value & 0x7f) | 0x80)
+		value >>= 7
+	buffer.append(value)
+
+
+
+def decodeVarint(data, pos):
+	'''
+		Чтение неотрицательного целого числа переменной длины (varint)
+
+		data - данные
+		pos - позиция числа в данных
+
+		return - (число, позиция за числом)
+	'''
+
+	result = 0
+	shift = 0
+	while True:
+		byte = data[pos]
+		pos += 1
+		result |= (byte & 0x7f) << shift
+		if byte < 0x80:
+			return result, pos
+		shift += 7
+
+
+
+def encodeString(value, buffer):
+	'''
+		Запись строки: длина в байтах (varint) + строка в utf-8
+
+		value - строка
+		buffer - bytearray, в конец которого дописывается строка
+
+		return None
+	'''
+
+	value = value.encode()
+	encodeVarint(len(value), buffer)
+	buffer += value
+
+
+
+def decodeString(data, pos):
+	'''
+		Чтение строки: длина в байтах (varint) + строка в utf-8
+
+		data - данные
+		pos - позиция строки в данных
+
+		return - (строка, позиция за строкой)
+	'''
+
+	size, pos = decodeVarint(data, pos)
+	return bytes(data[pos:pos+size]).decode(), pos + size
+
+
+
+def encodeSigned(value, buffer):
+	'''
+		Запись целого числа со знаком (varint zigzag)
+
+		value - число
+		buffer - bytearray, в конец которого дописывается число
+
+		return None
+	'''
+
+	encodeVarint(value * 2 if value >= 0 else -value * 2 - 1, buffer)
+
+
+
+def decodeSigned(data, pos):
+	'''
+		Чтение целого числа со знаком (varint zigzag)
+
+		data - данные
+		pos - позиция числа в данных
+
+		return - (число, позиция за числом)
+	'''
+
+	value, pos = decodeVarint(data, pos)
+	return (value >> 1 if not value & 1 else -((value + 1) >> 1)), pos
+
+
+
+def encodeRecord(record, table_schema):
+	'''
+		Кодирование записи таблицы
+
+		record - кортеж значений полей в порядке схемы
+		table_schema - схема таблицы
+
+		return - закодированная запись (без длины)
+	'''
+
+	buffer = bytearray((len(table_schema) + 7) // 8)
+	for i, attr in enumerate(table_schema):
+		value = record[i]
+		if value == None:
+			buffer[i // 8] |= 1 << (i % 8)
+		elif attr['type'] == 'integer':
+			# zigzag: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ...
+			encodeVarint(value * 2 if value >= 0 else -value * 2 - 1, buffer)
+		else:
+			encodeString(value, buffer)
+
+	return bytes(buffer)
+
+
+
+def recordSize(record, table_schema):
+	'''
+		Размер записи таблицы на странице вместе с длиной записи,
+		запись размером больше PAGE_DATA_SIZE не помещается на страницу
+
+		record - кортеж значений полей в порядке схемы
+		table_schema - схема таблицы
+
+		return - размер в байтах
+	'''
+
+	row = encodeRecord(record, table_schema)
+	entry = bytearray()
+	encodeVarint(len(row), entry)
+	return len(entry) + len(row)
+
+
+
+def decodeRecord(data, pos, table_schema):
+	'''
+		Декодирование записи таблицы
+
+		data - данные страницы
+		pos - позиция записи (без длины)
+		table_schema - схема таблицы
+
+		return - кортеж значений полей в порядке схемы
+	'''
+
+	nulls = pos
+	pos += (len(table_schema) + 7) // 8
+	record = []
+	for i, attr in enumerate(table_schema):
+		if data[nulls + i // 8] & (1 << (i % 8)):
+			record.append(None)
+		elif attr['type'] == 'integer':
+			value, pos = decodeVarint(data, pos)
+			record.append(value >> 1 if not value & 1 else -((value + 1) >> 1))
+		else:
+			value, pos = decodeString(data, pos)
+			record.append(value)
+
+	return tuple(record)
+
+
+
+def readHeader(db):
+	'''
+		Чтение заголовка файла БД
+
+		db - открытый файл БД
+
+		return - {
+					'pages'     : число страниц в файле,
+					'free'      : первая свободная страница (0 - нет),
+					'directory' : первая страница каталога
+				 }
+	'''
+
+	db.seek(0)
+	data = db.read(struct.calcsize(HEADER_FORMAT))
+	try:
+		magic, page_size, pages, free, directory = struct.unpack(HEADER_FORMAT, data)
+	except struct.error:
+		raise SQL_PAGE_Exception('Файл БД повреждён !')
+	if magic != MAGIC or page_size != PAGE_SIZE:
+		raise SQL_PAGE_Exception('Файл не является страничной БД !')
+
+	return {
+		'pages'     : pages,
+		'free'      : free,
+		'directory' : directory
+	}
+
+
+
+def writeHeader(db, header):
+	'''
+		Запись заголовка файла БД
+
+		db - открытый файл БД
+		header - заголовок (см. readHeader)
+
+		return None
+	'''
+
+	db.seek(0)
+	db.write(struct.pack(HEADER_FORMAT, MAGIC, PAGE_SIZE,
+			 header['pages'], header['free'], header['directory']).ljust(PAGE_SIZE, b'\0'))
+
+
+
+def readPage(db, page_num):
+	'''
+		Чтение страницы
+
+		db - открытый файл БД
+		page_num - номер страницы
+
+		return - (тип страницы, следующая страница, данные страницы)
+	'''
+
+	db.seek(page_num * PAGE_SIZE)
+	page = db.read(PAGE_SIZE)
+	page_type, next_page, used = struct.unpack_from(PAGE_HEADER_FORMAT, page)
+	return page_type, next_page, memoryview(page)[PAGE_HEADER_SIZE:PAGE_HEADER_SIZE+used]
+
+
+
+def writePage(db, page_num, page_type, next_page, data):
+	'''
+		Запись страницы
+
+		db - открытый файл БД
+		page_num - номер страницы
+		page_type - тип страницы
+		next_page - следующая страница цепочки (0 - нет)
+		data - данные страницы, не более PAGE_DATA_SIZE байт
+
+		return None
+	'''
+
+	db.seek(page_num * PAGE_SIZE)
+	db.write((struct.pack(PAGE_HEADER_FORMAT, page_type, next_page, len(data)) +
+			  bytes(data)).ljust(PAGE_SIZE, b'\0'))
+
+
+
+def allocPage(db, header):
+	'''
+		Выделение страницы: из цепочки свободных страниц или в конце файла
+
+		db - открытый файл БД
+		header - заголовок файла (изменяется)
+
+		return - номер страницы
+	'''
+
+	if header['free'] != 0:
+		page_num = header['free']
+		_, header['free'], _ = readPage(db, page_num)
+	else:
+		page_num = header['pages']
+		header['pages'] += 1
+
+	return page_num
+
+
+
+def freeChain(db, header, page_num):
+	'''
+		Освобождение цепочки страниц
+
+		db - открытый файл БД
+		header - заголовок файла (изменяется)
+		page_num - первая страница цепочки (0 - цепочка пуста)
+
+		return None
+	'''
+
+	while page_num != 0:
+		_, next_page, _ = readPage(db, page_num)
+		writePage(db, page_num, PAGE_FREE, header['free'], b'')
+		header['free'] = page_num
+		page_num = next_page
+
+
+
+def readChain(db, page_num):
+	'''
+		Чтение цепочки страниц
+
+		db - открытый файл БД
+		page_num - первая страница цепочки (0 - цепочка пуста)
+
+		return - генератор данных страниц
+	'''
+
+	while page_num != 0:
+		_, page_num, data = readPage(db, page_num)
+		yield data
+
+
+
+def readDirectory(db, header):
+	'''
+		Чтение каталога таблиц
+
+		db - открытый файл БД
+		header - заголовок файла
+
+		return - таблицы БД
+				 пример:
+				 {
+				 	'table_name_1' : {
+				 		'schema'     : [...],	# см. sqldb.readTableSchema
+				 		'first_page' : 2,
+				 		'last_page'  : 7,
+				 		'pages'      : 6,
+				 		'rows'       : 300,
+				 		'stats'      : {...}	# см. sqldb.analyze, None - не собрана
+				 	}
+				 }
+	'''
+
+	data = b''.join(bytes(page) for page in readChain(db, header['directory']))
+	tables = {}
+	count, pos = decodeVarint(data, 0)
+	for _ in range(count):
+		table_name, pos = decodeString(data, pos)
+		attrs_count, pos = decodeVarint(data, pos)
+		table_schema = []
+		for _ in range(attrs_count):
+			attr_name, pos = decodeString(data, pos)
+			attr_type = 'integer' if data[pos] == 0 else 'string'
+			flags = data[pos + 1]
+			pos += 2
+			table_schema.append({
+				'name' : attr_name,
+				'type' : attr_type,
+				'attr' : {
+					'primary key' : bool(flags & FLAG_PRIMARY_KEY),
+					'unique'      : bool(flags & FLAG_UNIQUE),
+					'null'        : bool(flags & FLAG_NULL)
+				}
+			})
+		table = {'schema' : table_schema}
+		for key in ('first_page', 'last_page', 'pages', 'rows'):
+			table[key], pos = decodeVarint(data, pos)
+		table['stats'] = None
+		tables[table_name] = table
+
+	# Статистика таблиц (в файлах без статистики раздела нет)
+	if pos < len(data):
+		count, pos = decodeVarint(data, pos)
+		for _ in range(count):
+			table_name, pos = decodeString(data, pos)
+			rows, pos = decodeVarint(data, pos)
+			attrs = {}
+			for attr in tables[table_name]['schema']:
+				distinct, pos = decodeVarint(data, pos)
+				nulls, pos = decodeVarint(data, pos)
+				low, high = None, None
+				pos += 1
+				if data[pos - 1]:
+					low, pos = decodeSigned(data, pos)
+					high, pos = decodeSigned(data, pos)
+				attrs[attr['name']] = {
+					'distinct' : distinct,
+					'nulls'    : nulls,
+					'min'      : low,
+					'max'      : high
+				}
+			tables[table_name]['stats'] = {'rows' : rows, 'attrs' : attrs}
+
+	return tables
+
+
+
+def writeDirectory(db, header, tables):
+	'''
+		Запись каталога таблиц в новую цепочку страниц,
+		старая цепочка освобождается
+
+		db - открытый файл БД
+		header - заголовок файла (изменяется)
+		tables - таблицы БД (см. readDirectory)
+
+		return None
+	'''
+
+	data = bytearray()
+	encodeVarint(len(tables), data)
+	for table_name, table in tables.items():
+		encodeString(table_name, data)
+		encodeVarint(len(table['schema']), data)
+		for attr in table['schema']:
+			encodeString(attr['name'], data)
+			data.append(0 if attr['type'] == 'integer' else 1)
+			data.append((FLAG_PRIMARY_KEY if attr['attr']['primary key'] else 0) |
+						(FLAG_UNIQUE if attr['attr']['unique'] else 0) |
+						(FLAG_NULL if attr['attr']['null'] else 0))
+		for key in ('first_page', 'last_page', 'pages', 'rows'):
+			encodeVarint(table[key], data)
+
+	stats = {table_name : table['stats'] for table_name, table in tables.items()
+			 if table.get('stats') != None}
+	if stats != {}:
+		encodeVarint(len(stats), data)
+		for table_name, table_stats in stats.items():
+			encodeString(table_name, data)
+			encodeVarint(table_stats['rows'], data)
+			for attr in tables[table_name]['schema']:
+				attr_stats = table_stats['attrs'][attr['name']]
+				encodeVarint(attr_stats['distinct'], data)
+				encodeVarint(attr_stats['nulls'], data)
+				if attr_stats['min'] != None:
+					data.append(1)
+					encodeSigned(attr_stats['min'], data)
+					encodeSigned(attr_stats['max'], data)
+				else:
+					data.append(0)
+
+	freeChain(db, header, header['directory'])
+
+	chunks = [data[i:i+PAGE_DATA_SIZE] for i in range(0, len(data), PAGE_DATA_SIZE)]
+	pages = [allocPage(db, header) for _ in chunks]
+	for i in range(len(chunks)):
+		writePage(db, pages[i], PAGE_DIRECTORY, pages[i+1] if i + 1 < len(pages) else 0, chunks[i])
+	header['directory'] = pages[0]
+
+
+
+def writeRecords(db, header, table, records):
+	'''
+		Дописывание записей в конец цепочки страниц тела таблицы,
+		при ошибке записи, уже записанные в тело, остаются в нём
+
+		db - открытый файл БД
+		header - заголовок файла (изменяется)
+		table - таблица из каталога (изменяется)
+		records - итератор кортежей значений полей
+				  или уже закодированных записей (см. readRecords)
+
+		return None
+	'''
+
+	if table['last_page'] != 0:
+		page_num = table['last_page']
+		_, _, data = readPage(db, page_num)
+		data = bytearray(data)
+	else:
+		page_num = 0
+		data = bytearray()
+
+	try:
+		for record in records:
+			row = record if isinstance(record, bytes) else encodeRecord(record, table['schema'])
+			entry = bytearray()
+			encodeVarint(len(row), entry)
+			entry += row
+			if len(entry) > PAGE_DATA_SIZE:
+				raise SQL_PAGE_Exception('Запись размером {0} байт не помещается на страницу !'.format(len(entry)))
+			# Если запись не помещается на текущую страницу - начать новую
+			if page_num == 0 or len(data) + len(entry) > PAGE_DATA_SIZE:
+				new_page = allocPage(db, header)
+				if page_num != 0:
+					writePage(db, page_num, PAGE_DATA, new_page, data)
+				else:
+					table['first_page'] = new_page
+				page_num = new_page
+				data = bytearray()
+				table['pages'] += 1
+			data += entry
+			table['rows'] += 1
+	finally:
+		if page_num != 0:
+			writePage(db, page_num, PAGE_DATA, 0, data)
+			table['last_page'] = page_num
+
+
+
+def createFile(path):
+	'''
+		Создание пустого файла БД
+
+		path - путь к файлу БД
+
+		return None
+	'''
+
+	header = {
+		'pages'     : 1,
+		'free'      : 0,
+		'directory' : 0
+	}
+	with open(path, 'w+b') as db:
+		writeDirectory(db, header, {})
+		writeHeader(db, header)
+
+
+
+def readTables(path):
+	'''
+		Чтение каталога таблиц
+
+		path - путь к файлу БД
+
+		return - таблицы БД (см. readDirectory)
+	'''
+
+	with open(path, 'rb') as db:
+		return readDirectory(db, readHeader(db))
+
+
+
+def createTable(path, table_name, table_schema):
+	'''
+		Создание таблицы
+
+		path - путь к файлу БД
+		table_name - имя таблицы
+		table_schema - схема таблицы (см. sqldb.readTableSchema)
+
+		return - таблицы БД (см. readDirectory)
+	'''
+
+	with open(path, 'r+b') as db:
+		header = readHeader(db)
+		tables = readDirectory(db, header)
+		if table_name in tables:
+			raise SQL_PAGE_Exception('Таблица \'{0}\' уже существует !'.format(table_name))
+		tables[table_name] = {
+			'schema'     : table_schema,
+			'first_page' : 0,
+			'last_page'  : 0,
+			'pages'      : 0,
+			'rows'       : 0,
+			'stats'      : None
+		}
+		writeDirectory(db, header, tables)
+		writeHeader(db, header)
+
+	return tables
+
+
+
+def dropTable(path, table_name):
+	'''
+		Удаление таблицы, страницы её тела освобождаются
+
+		path - путь к файлу БД
+		table_name - имя таблицы
+
+		return - таблицы БД (см. readDirectory)
+	'''
+
+	with open(path, 'r+b') as db:
+		header = readHeader(db)
+		tables = readDirectory(db, header)
+		if table_name not in tables:
+			raise SQL_PAGE_Exception('Таблица \'{0}\' не существует !'.format(table_name))
+		freeChain(db, header, tables.pop(table_name)['first_page'])
+		writeDirectory(db, header, tables)
+		writeHeader(db, header)
+
+	return tables
+
+
+
+def readRecords(path, table_name, rows=None, isRaw=False):
+	'''
+		Чтение записей таблицы
+
+		path - путь к файлу БД
+		table_name - имя таблицы
+		rows - отсортированные номера записей, которые нужно прочитать,
+			   None - все записи (остальные записи пропускаются без декодирования)
+		isRaw - True, если записи нужны в закодированном виде (без длины),
+				например, для копирования в другое тело без перекодирования
+
+		return - генератор кортежей значений полей или закодированных записей
+	'''
+
+	wanted = iter(() if rows == None else rows)
+	row = next(wanted, None)
+	if rows != None and row == None:
+		return
+
+	with open(path, 'rb') as db:
+		table = readDirectory(db, readHeader(db))[table_name]
+		row_num = 0
+		for data in readChain(db, table['first_page']):
+			pos = 0
+			while pos < len(data):
+				size, pos = decodeVarint(data, pos)
+				if rows == None or row_num == row:
+					if isRaw:
+						yield bytes(data[pos:pos+size])
+					else:
+						yield decodeRecord(data, pos, table['schema'])
+					if rows != None:
+						row = next(wanted, None)
+						if row == None:
+							return
+				pos += size
+				row_num += 1
+
+
+
+def appendRecords(path, table_name, records):
+	'''
+		Добавление записей в конец тела таблицы
+
+		path - путь к файлу БД
+		table_name - имя таблицы
+		records - итератор кортежей значений полей
+
+		return - таблицы БД (см. readDirectory)
+	'''
+
+	with open(path, 'r+b') as db:
+		header = readHeader(db)
+		tables = readDirectory(db, header)
+		try:
+			writeRecords(db, header, tables[table_name], records)
+		finally:
+			writeDirectory(db, header, tables)
+			writeHeader(db, header)
+
+	return tables
+
+
+
+def rewriteTable(path, table_name, records):
+	'''
+		Замена тела таблицы: записи пишутся в новую цепочку страниц,
+		старая цепочка освобождается,
+		при ошибке тело таблицы остаётся прежним
+
+		path - путь к файлу БД
+		table_name - имя таблицы
+		records - итератор кортежей значений полей,
+				  может читать старое тело таблицы
+
+		return - таблицы БД (см. readDirectory)
+	'''
+
+	with open(path, 'r+b') as db:
+		header = readHeader(db)
+		tables = readDirectory(db, header)
+		table = tables[table_name]
+		new_table = {
+			'schema'     : table['schema'],
+			'first_page' : 0,
+			'last_page'  : 0,
+			'pages'      : 0,
+			'rows'       : 0,
+			'stats'      : table['stats']
+		}
+		try:
+			writeRecords(db, header, new_table, records)
+		except:
+			freeChain(db, header, new_table['first_page'])
+			writeHeader(db, header)
+			raise
+		freeChain(db, header, table['first_page'])
+		tables[table_name] = new_table
+		writeDirectory(db, header, tables)
+		writeHeader(db, header)
+
+	return tables
+
+
+
+def writeStats(path, stats):
+	'''
+		Запись статистики таблиц в каталог
+
+		path - путь к файлу БД
+		stats - статистика по именам таблиц (см. sqldb.analyze)
+
+		return - таблицы БД (см. readDirectory)
+	'''
+
+	with open(path, 'r+b') as db:
+		header = readHeader(db)
+		tables = readDirectory(db, header)
+		for table_name, table_stats in stats.items():
+			if table_name not in tables:
+				raise SQL_PAGE_Exception('Таблица \'{0}\' не существует !'.format(table_name))
+			tables[table_name]['stats'] = table_stats
+		writeDirectory(db, header, tables)
+		writeHeader(db, header)
+
+	return tables
@@ -6,12 +6,13 @@
         -- Имена БД, таблиц, полей - регистрозависимы
         -- SQL-код регистронезависим
         -- Все строковые значение записываются в одинарных кавычках: 'this is a string'
-        -- Ограничение: разделы WHERE могут иметь только одно условие
+        -- Ограничение: разделы WHERE (кроме SELECT) могут иметь только одно условие
         --              и допустимы операции: =, <>
 
 
         -- СОЗДАНИЕ БД
-        CREATE DATABASE database_name_1
+        -- Формат хранения: TEXT - текстовый (поумолчанию), PAGE - двоичный страничный
+        CREATE DATABASE database_name_1 [TEXT|PAGE]
 
 
         -- УДАЛЕНИЕ БД
@@ -30,11 +31,23 @@
         DROP TABLE table_name_1
 
 
-        -- ВСТАВКА ЗАПИСИ В ТАБЛИЦУ
+        -- СОЗДАНИЕ ИНДЕКСА
+        -- Индекс используется для поиска записей по условиям =, <, >
+        -- в разделах WHERE операторов SELECT, DELETE и UPDATE
+        CREATE INDEX index_name_1 ON table_name_1 (attr_name_1)
+
+
+        -- УДАЛЕНИЕ ИНДЕКСА
+        DROP INDEX index_name_1
+
+
+        -- ВСТАВКА ЗАПИСЕЙ В ТАБЛИЦУ
         -- Важное замечание: нельзя использовать только VALUES, опуская имена аттрибутов в скобках
+        -- Несколько записей вставляются вместе: при ошибке в одной не вставляется ни одна
         INSERT INTO table_name_1
                    (attr_name_1,  attr_name_2,  ...)
             VALUES (attr_value_1, attr_value_2, ...)
+                   [, (attr_value_3, attr_value_4, ...) ...]
 
 
         -- УДАЛЕНИЕ ЗАПИСЕЙ
@@ -43,6 +56,13 @@
             [WHERE attr_name_1 {=|<>} value_1]
 
 
+        -- МАССОВАЯ ЗАГРУЗКА ЗАПИСЕЙ ИЗ ФАЙЛА
+        -- Формат файла по умолчанию определяется расширением: .csv - CSV, иначе - JSONL
+        -- Первая строка CSV содержит имена полей, если они не указаны в скобках
+        COPY table_name_1 [(attr_name_1, attr_name_2, ...)]
+            FROM 'file_path' [CSV|JSONL]
+
+
         -- ОБНОВЛЕНИЕ ЗАПИСЕЙ
         -- Если опустить WHERE, все записи в таблице будут обновлены
         -- Ограничение: раздел SET может иметь только 1 поле,
@@ -57,7 +77,8 @@
         -- ВЫБОРКА ЗАПИСЕЙ
         -- Допускается множественое объединение таблиц
         -- Имена полей записываются ввиде: table_name_1.attr_name_1
-        -- Ограничение: раздела WHERE нет
+        -- Условия раздела WHERE объединяются AND и OR (AND имеет больший приоритет),
+        -- допустимы операции: =, <>, <, >
         SELECT table_name1.attr_name_1, 
                table_name1.attr_name_2,
                table_name2.attr_name_2,
@@ -65,16 +86,113 @@
         FROM table_name_1
         [INNER JOIN table_name_2 
             ON table_name_1.attr_name_2 = table_name_2.attr_name_2]
+        [WHERE table_name_1.attr_name_1 {=|<>|<|>} value_1
+            [{AND|OR} table_name_2.attr_name_2 {=|<>|<|>} value_2 ...]]
+
+
+        -- ЧИСЛО ЗАПИСЕЙ ТАБЛИЦЫ
+        -- Записи не читаются: число берётся из статистики таблицы (см. ANALYZE),
+        -- из каталога страничной БД или подсчётом строк файла таблицы
+        SELECT COUNT(*) FROM table_name_1
+
+
+        -- ПЛАН ВЫБОРКИ
+        -- Выборка выполняется, результат - узлы плана выборки (поле plan)
+        -- с оценкой числа записей (estimated) и их числом при выполнении (actual)
+        EXPLAIN SELECT ...
+
+
+        -- СБОР СТАТИСТИКИ
+        -- Для таблицы (без имени - для всех таблиц БД) в каталог записываются
+        -- число записей и для каждого поля число различных значений, число null,
+        -- для integer - наименьшее и наибольшее значения. По статистике
+        -- оцениваются планы выборок, при изменении записей она уточняется
+        ANALYZE [table_name_1]
+
+
+        -- ПОДГОТОВЛЕННЫЕ ЗАПРОСЫ (см. prepare)
+        -- Вместо значений в INSERT, SET и WHERE можно указать параметр ?,
+        -- значения параметров подставляются при выполнении без повторного парсинга
+        INSERT INTO table_name_1 (attr_name_1, attr_name_2) VALUES (?, ?)
+
+
+        -- ТРАНЗАКЦИИ
+        -- Изменения записей между BEGIN и COMMIT записываются в БД одной перезаписью,
+        -- ROLLBACK их отменяет. CREATE и DROP фиксируют текущую транзакцию.
+        -- Запросы одного вызова parse вне явной транзакции выполняются пакетом:
+        -- они фиксируются вместе в конце, а при ошибке - отменяются
+        BEGIN [TRANSACTION]
+        COMMIT
+        ROLLBACK
 '''
 
 
 
+import collections
 import re
+import threading
 import sqldb
 from sqldb import SQL_DB_Exception
 
 
 
+# Наибольшее число планов запросов в кеше
+QUERY_CACHE_SIZE = 256
+
+
+# Кеш планов запросов (см. planQuery) по нормализованному тексту запроса,
+# первыми идут давно не использованные запросы
+query_cache = collections.OrderedDict()
+
+
+# Блокировка кеша планов: соединения разных потоков парсят запросы одновременно
+query_cache_lock = threading.Lock()
+
+
+# Шаблон параметра подготовленного запроса после нумерации (см. prepare)
+PARAM_PATTERN = re.compile(r'^\?(\d+)$')
+
+
+# Шаблон одного запроса: до ; вне строковых значений (см. splitQuerys)
+QUERY_PATTERN = re.compile(r"[^';]*(?:'[^']*'[^';]*)*")
+
+
+# Шаблон лексем SQL запроса (см. tokenize): пробельные символы перед лексемой пропускаются,
+# порядок вариантов важен: операторы проверяются раньше чисел, чтобы -= не стал началом числа;
+# строковое значение не может содержать переводов строк - записи, журнал и хвосты хранятся построчно
+TOKEN_PATTERN = re.compile(r'''\s*(?:
+      (?P<string>'[^'\r\n]*')
+    | (?P<param>\?\d+)
+    | (?P<operator><>|[*+\-/]=|[=<>])
+    | (?P<number>-?\d+(?!\w))
+    | (?P<name>\w+)
+    | (?P<punct>[(),.*])
+    | (?P<error>\S)
+)''', re.X)
+
+
+# Методы Parser для разбора запросов по команде
+STATEMENT_METHODS = {
+    'create database' : 'parseCreateDB',
+    'drop database'   : 'parseDropDB',
+    'create table'    : 'parseCreateTable',
+    'drop table'      : 'parseDropTable',
+    'create index'    : 'parseCreateIndex',
+    'drop index'      : 'parseDropIndex',
+    'insert'          : 'parseInsert',
+    'copy'            : 'parseCopy',
+    'delete'          : 'parseDelete',
+    'update'          : 'parseUpdate',
+    'select'          : 'parseSelect',
+    'explain'         : 'parseExplain',
+    'analyze'         : 'parseAnalyze',
+    'begin'           : 'parseBegin',
+    'commit'          : 'parseEnd',
+    'rollback'        : 'parseEnd'
+}
+
+
+
 
 
 class SQL_PARSER_Exception(Exception):
@@ -121,72 +239,263 @@ def parse(sql_code):
                       ]
     '''
 
-    # Разбиение всего SQL-кода на отдельные запросы
-    querys = []
-    i_cur = 0       
-    i_prev = 0
-    isQuoteOpen = False
-    sql_code = sql_code.strip()
-    if sql_code == '':
-        raise SQL_PARSER_Exception("Ожидался SQL код !")
-    for i_cur in range(len(sql_code)):
-        if sql_code[i_cur] == "'":
-            isQuoteOpen = not isQuoteOpen
-        if not isQuoteOpen:
-            if sql_code[i_cur] == ';':
-                query = sql_code[i_prev:i_cur].strip()
-            elif i_cur == len(sql_code)-1:
-                query = sql_code[i_prev:i_cur+1].strip()
-            else:
-                continue
-            querys.append(query)
-            i_prev = i_cur + 1
-
-    if isQuoteOpen:
-        raise SQL_PARSER_Exception('Фатальная ошибка в SQL запросе: незакрытая "\'" !')
-
     # Выполнение запросов
     result = None
-    for query in querys:
-        # Определение типа запроса
-        if query == '':
-            raise SQL_PARSER_Exception('Фатальная ошибка в SQL запросе: лишния ";" !')
-        query_cmd = query.split()[0].lower()
-        if query_cmd == 'create':
-            # Создание БД или таблицы
-            query_cmd = query.split()[1].lower()
-            if query_cmd == 'database':
-                createDB(query)
-            elif query_cmd == 'table':
-                createTable(query)
-            else:
-                raise SQL_PARSER_Exception("Неизвестная команда SQL '{0}' !".format(query.split()[1]))
-        elif query_cmd == 'drop':
-            # Удаление БД или таблицы
-            query_cmd = query.split()[1].lower()
-            if query_cmd == 'database':
-                dropDB(query)
-            elif query_cmd == 'table':
-                dropTable(query)
-            else:
-                raise SQL_PARSER_Exception("Неизвестная команда SQL '{0}' !".format(query.split()[1]))
-        elif query_cmd == 'insert':
-            insert(query)
-        elif query_cmd == 'delete':
-            delete(query)
-        elif query_cmd == 'update':
-            update(query)
-        elif query_cmd == 'select':
-            if result == None:
-                result = []
-            result.append(select(query))
-        else:
-            raise SQL_PARSER_Exception("Неизвестная команда SQL '{0}' !".format(query.split()[0]))
+    try:
+        for query in splitQuerys(sql_code):
+            result = parseQuery(query, result)
+    except:
+        # Отмена пакета запросов
+        if sqldb.session.transaction != None and not sqldb.session.transaction['isExplicit']:
+            sqldb.rollback()
+        raise
+
+    # Фиксация пакета запросов
+    if sqldb.session.transaction != None and not sqldb.session.transaction['isExplicit']:
+        sqldb.commit()
 
     return result
 
 
 
+def parseQuery(query, result):
+    '''
+        Выполнение одного SQL запроса,
+        вне явной транзакции запрос добавляется в пакет запросов
+
+        query - SQL запрос без ;
+        result - накопленный список результатов выборки или None
+
+        return - накопленный список результатов выборки или None (см. parse)
+    '''
+
+    return executePlan(planQuery(query), result)
+
+
+
+def executePlan(plan, result):
+    '''
+        Выполнение плана запроса,
+        вне явной транзакции запрос добавляется в пакет запросов
+
+        plan - план запроса (см. planQuery)
+        result - накопленный список результатов выборки или None
+
+        return - накопленный список результатов выборки или None (см. parse)
+    '''
+
+    # Начало пакета запросов
+    if sqldb.session.transaction == None and sqldb.session.current_db_name != None:
+        sqldb.begin(False)
+
+    function, args = plan
+    if function in (sqldb.select, sqldb.explain, sqldb.count):
+        if result == None:
+            result = []
+        result.append(function(*args))
+    else:
+        function(*args)
+
+    return result
+
+
+
+def isReadOnly(sql_code):
+    '''
+        Проверка, что SQL-код только читает БД
+
+        sql_code - SQL запросы, разделённые ;
+
+        return - True, если все запросы - SELECT или EXPLAIN,
+                 иначе (и при ошибке в запросе) - False
+    '''
+
+    try:
+        return all(planQuery(query)[0] in (sqldb.select, sqldb.explain, sqldb.count) for query in splitQuerys(sql_code))
+    except SQL_PARSER_Exception:
+        return False
+
+
+
+def normalizeQuery(query):
+    '''
+        Нормализация текста запроса для кеша планов:
+        пробельные символы вне строковых значений сжимаются до одного пробела
+
+        query - SQL запрос
+
+        return - нормализованный запрос
+    '''
+
+    parts = query.split("'")
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i])
+
+    return "'".join(parts).strip()
+
+
+
+def planQuery(query):
+    '''
+        Парсинг одного SQL запроса в план,
+        планы повторяющихся запросов берутся из кеша без парсинга
+
+        query - SQL запрос без ;
+
+        return - план запроса: (функция sqldb, кортеж её аргументов),
+                 план не должен изменяться, так как хранится в кеше
+    '''
+
+    if query == '':
+        raise SQL_PARSER_Exception('Фатальная ошибка в SQL запросе: лишния ";" !')
+
+    key = normalizeQuery(query)
+    with query_cache_lock:
+        if key in query_cache:
+            query_cache.move_to_end(key)
+            return query_cache[key]
+
+    plan = planStatement(Parser(query).parseStatement())
+
+    with query_cache_lock:
+        query_cache[key] = plan
+        if len(query_cache) > QUERY_CACHE_SIZE:
+            query_cache.popitem(last=False)
+
+    return plan
+
+
+
+def prepare(query):
+    '''
+        Подготовка одного SQL запроса с параметрами ? для многократного выполнения
+
+        query - SQL запрос, параметры ? допустимы на месте значений
+
+        return - подготовленный запрос:
+                 {
+                    'plan'   : план запроса с параметрами ?0, ?1, ...,
+                    'params' : число параметров
+                 }
+    '''
+
+    query = query.strip()
+    if query.endswith(';'):
+        query = query[:-1].strip()
+
+    # Нумерация параметров вне строковых значений
+    count = 0
+    parts = re.split(r"('[^']*')", query)
+    if len(parts) % 2 == 0:
+        raise SQL_PARSER_Exception('Фатальная ошибка в SQL запросе: незакрытая "\'" !')
+    for i in range(0, len(parts), 2):
+        if ';' in parts[i]:
+            raise SQL_PARSER_Exception("Ожидался один запрос !")
+        params = parts[i].split('?')
+        parts[i] = params[0]
+        for param in params[1:]:
+            parts[i] += '?{0}'.format(count) + param
+            count += 1
+
+    return {
+        'plan'   : planQuery(''.join(parts)),
+        'params' : count
+    }
+
+
+
+def paramValue(value):
+    '''
+        Преобразование значения параметра в значение SQL запроса
+
+        value - значение python: None, int() или str() без кавычек
+                и переводов строк (нарушили бы построчный формат БД)
+
+        return - значение: 'null', '5', '\'vlad\''
+    '''
+
+    if value == None:
+        return 'null'
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    elif isinstance(value, str) and re.search(r"['\r\n]", value) == None:
+        return '\'' + value + '\''
+
+    raise SQL_PARSER_Exception("Недопустимое значение параметра {0} !".format(repr(value)))
+
+
+
+def bindParams(args, params):
+    '''
+        Подстановка значений параметров в аргументы плана запроса
+
+        args - аргументы плана или их часть
+        params - значения параметров запроса (см. paramValue)
+
+        return - копия аргументов с подставленными значениями
+    '''
+
+    if isinstance(args, str):
+        match = PARAM_PATTERN.search(args)
+        return args if match == None else params[int(match.group(1))]
+    elif isinstance(args, dict):
+        return {key : bindParams(value, params) for key, value in args.items()}
+    elif isinstance(args, (list, tuple)):
+        return type(args)(bindParams(value, params) for value in args)
+
+    return args
+
+
+
+def bindPlan(statement, params):
+    '''
+        Получение плана подготовленного запроса с подставленными параметрами
+
+        statement - подготовленный запрос (см. prepare)
+        params - значения параметров
+
+        return - план запроса (см. planQuery)
+    '''
+
+    if len(params) != statement['params']:
+        raise SQL_PARSER_Exception("Ожидалось параметров: {0}, получено: {1} !".format(
+                                   statement['params'], len(params)))
+
+    function, args = statement['plan']
+    if statement['params'] == 0:
+        return function, args
+
+    return function, bindParams(args, [paramValue(value) for value in params])
+
+
+
+def execute(statement, params):
+    '''
+        Выполнение подготовленного запроса
+
+        statement - подготовленный запрос (см. prepare)
+        params - значения параметров
+
+        return - результат выборки для SELECT (см. sqldb.select), иначе None
+    '''
+
+    plan = bindPlan(statement, params)
+    try:
+        result = executePlan(plan, None)
+    except:
+        # Отмена пакета запросов
+        if sqldb.session.transaction != None and not sqldb.session.transaction['isExplicit']:
+            sqldb.rollback()
+        raise
+
+    # Фиксация пакета запросов
+    if sqldb.session.transaction != None and not sqldb.session.transaction['isExplicit']:
+        sqldb.commit()
+
+    return None if result == None else result[0]
+
+
+
 def isNameOk(attr_name):
     '''
         Проверка допустимости имени
@@ -215,353 +524,771 @@ def setDB(db_name):
 
 
 
-def createDB(query):
+def load(table_name, path, file_format=None):
     '''
-        -- СОЗДАНИЕ БД
-        CREATE DATABASE database_name_1
+        Массовая загрузка записей в таблицу текущей БД из файла
 
-        query - запрос на создание БД
+        table_name - имя таблицы
+        path - путь к файлу CSV или JSON Lines
+        file_format - 'csv' или 'jsonl', None - по расширению файла
 
-        return None
+        return - число загруженных записей
     '''
 
-    # Разбить запрос на части
-    # И убрать лишние пробельные символы
-    try:
-        _, database, database_name = [token.strip() for token in query.split()]
-    except ValueError:
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-
-    if database.lower() == 'database':
-        # Проверка допустимости имени
-        if not isNameOk(database_name):
-            raise SQL_PARSER_Exception("Недопустимое имя БД '{0}' !".format(database_name))
-        # Выполнить запрос
-        sqldb.createDB(database_name)
-    else:
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(database))
+    if not isNameOk(table_name):
+        raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table_name))
+
+    return sqldb.load(table_name, path, file_format)
 
 
 
-def dropDB(query):
+def splitQuerys(sql_code):
     '''
-        -- УДАЛЕНИЕ БД
-        DROP DATABASE database_name_1
+        Разбиение SQL-кода на отдельные запросы по ;
+        вне строковых значений за один проход
 
-        query - запрос на удаление БД
+        sql_code - SQL запросы, разделённые ;
 
-        return None
+        return - генератор запросов без ;
     '''
 
-    # Разбить запрос на части
-    # И убрать лишние пробельные символы
-    try:
-        _, database, database_name = [token.strip() for token in query.split()]
-    except ValueError:
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-
-    if database.lower() == 'database':
-        # Проверка допустимости имени
-        if not isNameOk(database_name):
-            raise SQL_PARSER_Exception("Недопустимое имя БД '{0}' !".format(database_name))
-        # Выполнить запрос
-        sqldb.dropDB(database_name)
-    else:
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(database))
+    sql_code = sql_code.strip()
+    if sql_code == '':
+        raise SQL_PARSER_Exception("Ожидался SQL код !")
+
+    pos = 0
+    while pos < len(sql_code):
+        end = QUERY_PATTERN.match(sql_code, pos).end()
+        if end < len(sql_code) and sql_code[end] == "'":
+            raise SQL_PARSER_Exception('Фатальная ошибка в SQL запросе: незакрытая "\'" !')
+        yield sql_code[pos:end].strip()
+        pos = end + 1
 
 
 
-def createTable(query):
+def tokenize(query):
     '''
-        -- СОЗДАНИЕ ТАБЛИЦЫ
-        -- Если [null|not_null] не указан, то поумолчанию not_null
-        CREATE TABLE table_name_1 (
-            attr_name_1 type_name_1{integer|string} [null|not_null] [primary_key|unique],
-            ...
-        )
+        Лексический анализ SQL запроса за один проход
 
-        query - запрос на создание таблицы
+        query - SQL запрос без ;
 
-        return None
+        return - список лексем (вид, текст) без пробельных символов,
+                 виды лексем: 'string', 'param', 'operator', 'number', 'name', 'punct'
     '''
-    
-    # Разбить запрос на части:
-    # До скобок(заголовок), и в скобках(тело)
-    try:
-        header, body = [token.strip() for token in query.split("(")]
-    except ValueError:
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
 
-    # Проверить заголовок
-    try:
-        _, table, table_name = [token.strip() for token in header.split()]
-    except ValueError:
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-    if table.lower() != 'table':
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(table))
-    # Проверка допустимости имени
-    if not isNameOk(table_name):
-        raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table_name))
+    tokens = [(match.lastgroup, match.group(match.lastindex)) for match in TOKEN_PATTERN.finditer(query)]
 
-    # Парсинг тела таблицы
-    table_schema = []
-
-    body = [line.strip() for line in body[:-1].split(',') if line.strip() != '']
-    if body == []:
-        raise SQL_PARSER_Exception("Схема таблицы '{0}' не может быть пустой !".format(table_name))
-
-    for line in body:   
-        # Разбиваем строку на части
-        # 2 первые части: имя поля, тип
-        isOtherEmpty = False
-        attr_name, attr_type, *other = [token.strip() for token in line.split()]
-        attr_type = attr_type.lower()
-        # Проверка допустимости имени
-        if not isNameOk(attr_name):
-            raise SQL_PARSER_Exception("Недопустимое имя поля '{0}' !".format(attr_name))
-        # Проверка совпадения имён полей
-        for attr in table_schema:
-            if attr['name'] == attr_name:
-                raise SQL_PARSER_Exception("Повторное использование имени поля '{0}' !".format(attr_name))
-        # Проверка правильности типов данных
-        if attr_type != 'integer' and attr_type != 'string':
-            raise SQL_PARSER_Exception("Несуществующий тип '{0}' поля '{1}' !".format(attr_type, attr_name))
-
-        isNull = False
-        isPrimaryKey = False
-        isUnique = False
-        if other != []:
-            # Парсинг остальной части поля
-            for token in other:
-                token = token.strip().lower()
-                if token == 'not_null':
-                    continue
-                elif token == 'null':
-                    isNull = True
-                elif token == 'primary_key':
-                    isPrimaryKey = True
-                elif token == 'unique':
-                    isUnique = True
-                else:
-                    raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(token))
-            # Проверка коректности атрибутов поля
-            # Primary Key, Unique не могут быть Null
-            if isNull and (isUnique or isPrimaryKey):
-                raise SQL_PARSER_Exception('Ошибка в синтаксисе SQL, потенцильный ключ не может быть null !')   
-
-        # Добавить поле в схему
-        table_schema.append({
-            'name' : attr_name,
-            'type' : attr_type,
-            'attr' : {
-                'primary key' : isPrimaryKey,
-                'unique'      : isUnique,
-                'null'        : isNull
-            }
-        })
+    for kind, text in tokens:
+        if kind == 'error':
+            if text == "'":
+                raise SQL_PARSER_Exception('Фатальная ошибка в SQL запросе: незакрытая "\'" '
+                                           'или перевод строки в строковом значении !')
+            raise SQL_PARSER_Exception("Недопустимый символ '{0}' в SQL запросе '{1}' !".format(text, query))
 
-    # Выполнить запрос
-    sqldb.createTable(table_name, table_schema)
+    return tokens
 
 
 
-def dropTable(query):
+class Parser:
     '''
-        -- УДАЛЕНИЕ ТАБЛИЦЫ
-        DROP TABLE table_name_1
+        Парсер одного SQL запроса методом рекурсивного спуска,
+        строит дерево запроса (см. parseStatement)
 
-        query - запрос на удаление таблицы
-
-        return None
+        query - SQL запрос без ;
     '''
 
-    # Разбить запрос на части
-    # И убрать лишние пробельные символы
-    try:
-        _, table, table_name = [token.strip() for token in query.split()]
-    except ValueError:
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-
-    if table.lower() == 'table':
-        # Проверка допустимости имени
-        if not isNameOk(table_name):
-            raise SQL_PARSER_Exception("Недопустимое имя '{0}' !".format(table_name))
-        # Выполнить запрос
-        sqldb.dropTable(table_name)
-    else:
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(table))
+    def __init__(self, query):
+        self.query = query
+        self.tokens = tokenize(query)
+        self.pos = 0
 
 
+    def peek(self):
+        '''
+            Текущая лексема
 
-def insert(query):
-    '''
-        -- ВСТАВКА ЗАПИСИ В ТАБЛИЦУ
-        -- Важное замечание: нельзя использовать только VALUES, опуская имена аттрибутов в скобках
-        INSERT INTO table_name_1
-                   (attr_name_1,  attr_name_2,  ...)
-            VALUES (attr_value_1, attr_value_2, ...)
+            return - (вид, текст), в конце запроса - ('end', '')
+        '''
+
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return ('end', '')
+
+
+    def next(self):
+        '''
+            Переход к следующей лексеме
+
+            return - текущая лексема (см. peek)
+        '''
+
+        token = self.peek()
+        self.pos += 1
+        return token
+
+
+    def error(self, expected):
+        '''
+            Исключение о синтаксической ошибке в текущей лексеме
+
+            expected - описание ожидаемой лексемы
+        '''
 
-        query - запрос добавление записи
+        kind, text = self.peek()
+        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL '{0}': ожидалось {1}, получено {2} !".format(
+                                   self.query, expected, 'конец запроса' if kind == 'end' else "'" + text + "'"))
 
+
+    def acceptKeyword(self, *keywords):
+        '''
+            Пропуск ключевого слова, если оно текущее
+
+            keywords - допустимые ключевые слова в нижнем регистре
+
+            return - ключевое слово в нижнем регистре или None
+        '''
+
+        kind, text = self.peek()
+        if kind == 'name' and text.lower() in keywords:
+            self.pos += 1
+            return text.lower()
         return None
-    '''
 
-    # Разбить запрос на части
-    pattern = r'^\s*(\w{6})\s+(\w{4})\s+(\S+)\s*(\(.+\))\s*(\w{6})\s*(\(.+\))\s*$'
-    try:
-        _, into, table_name, attr_names, values, attr_values = re.findall(pattern, query, re.I | re.M)[0]
-    except:
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
 
-    if into.lower() != 'into':
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(into))
+    def expectKeyword(self, *keywords):
+        '''
+            Пропуск обязательного ключевого слова
 
-    if values.lower() != 'values':
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(values))
+            keywords - допустимые ключевые слова в нижнем регистре
 
-    if not isNameOk(table_name):
-        raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table_name))    
+            return - ключевое слово в нижнем регистре
+        '''
 
-    # Извлечение имён полей
-    if attr_names[0] != '(' or attr_names[-1] != ')':
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, список имён полей должен быть в скобках '{0}' !".format(query))
-    attr_names = attr_names[1:-1].strip() + ','
-    pattern = r'^(?:\s*\w[\w_\d]*\s*,\s*)+$'
-    if not re.search(pattern, attr_names,  re.I | re.M):
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неправильный список имён полей '{0}' !".format(query))
-    pattern = r'\b(\w[\w_\d]*)\b'
-    attr_names = re.findall(pattern, attr_names,  re.I | re.M)
+        keyword = self.acceptKeyword(*keywords)
+        if keyword == None:
+            self.error(' или '.join(keyword.upper() for keyword in keywords))
+        return keyword
 
-    # Извлекаем значения полей
-    if attr_values[0] != '(' or attr_values[-1] != ')':
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, список значений полей должен быть в скобках '{0}' !".format(query))
-    attr_values = attr_values[1:-1].strip() + ','
-    pattern = r'^(?:\s*(?:\'.*\'|\w[\w\d_]*)\s*,)+$'
-    if not re.search(pattern, attr_values,  re.I | re.M):
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неправильный список значений полей '{0}' !".format(query))
-    pattern = r'(\'.*?\'|\w[\w\d_]*)'
-    attr_values = re.findall(pattern, attr_values,  re.I | re.M)
-    if len(attr_values) != len(attr_names):
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неправильный список значений полей '{0}' !".format(query))
 
-    values = {name:value for name, value in zip(attr_names, attr_values)}
+    def acceptPunct(self, punct):
+        '''
+            Пропуск знака препинания, если он текущий
 
-    # Выполнение запроса
-    sqldb.insert(table_name, values)
+            punct - знак: ( ) , .
 
+            return - True, если знак пропущен
+        '''
 
+        if self.peek() == ('punct', punct):
+            self.pos += 1
+            return True
+        return False
 
-def delete(query):
-    '''
-        -- УДАЛЕНИЕ ЗАПИСЕЙ
-        -- Если опустить WHERE, все записи в таблице будут удалены
-        DELETE FROM table_name_1 
+
+    def expectPunct(self, punct):
+        '''
+            Пропуск обязательного знака препинания
+
+            punct - знак: ( ) , .
+        '''
+
+        if not self.acceptPunct(punct):
+            self.error("'" + punct + "'")
+
+
+    def expectOperator(self, *operators):
+        '''
+            Пропуск обязательного оператора
+
+            operators - допустимые операторы
+
+            return - оператор
+        '''
+
+        kind, text = self.peek()
+        if kind != 'operator':
+            self.error('оператор ' + ' '.join(operators))
+        if text not in operators:
+            raise SQL_PARSER_Exception("Несуществующий оператор '{0}' !".format(text))
+        self.pos += 1
+        return text
+
+
+    def parseName(self, what):
+        '''
+            Имя БД, таблицы или поля
+
+            what - что именуется (для сообщений об ошибках): 'БД', 'таблицы', 'поля'
+
+            return - имя
+        '''
+
+        kind, text = self.peek()
+        if kind not in ('name', 'number'):
+            self.error('имя ' + what)
+        if not isNameOk(text):
+            raise SQL_PARSER_Exception("Недопустимое имя {0} '{1}' !".format(what, text))
+        self.pos += 1
+        return text
+
+
+    def parseNames(self):
+        '''
+            Список имён полей в скобках: (attr_name_1, attr_name_2, ...)
+
+            return - список имён полей
+        '''
+
+        self.expectPunct('(')
+        attr_names = [self.parseName('поля')]
+        while self.acceptPunct(','):
+            attr_names.append(self.parseName('поля'))
+        self.expectPunct(')')
+        return attr_names
+
+
+    def parseAttrName(self):
+        '''
+            Имя поля с именем таблицы: table_name.attr_name
+
+            return - (имя таблицы, имя поля)
+        '''
+
+        table_name = self.parseName('таблицы')
+        self.expectPunct('.')
+        return table_name, self.parseName('поля')
+
+
+    def parseValue(self):
+        '''
+            Значение: 'строка', целое число, null или параметр ?N
+
+            return - значение в виде, в котором оно записано в запросе,
+                     null - в нижнем регистре
+        '''
+
+        kind, text = self.peek()
+        if kind in ('string', 'number', 'param'):
+            self.pos += 1
+            return text
+        if kind == 'name' and text.lower() == 'null':
+            self.pos += 1
+            return 'null'
+        if kind == 'end':
+            self.error('значение')
+        raise SQL_PARSER_Exception("Недопустимое значение '{0}' !".format(text))
+
+
+    def parseStatement(self):
+        '''
+            Запрос целиком
+
+            return - дерево запроса: словарь с видом запроса в 'statement'
+                     и его частями, пример:
+                     {
+                        'statement'  : 'insert',
+                        'table_name' : 'student',
+                        'records'    : [{'id' : '1', 'name' : '\'vlad\''}]
+                     }
+        '''
+
+        kind, text = self.peek()
+        command = self.acceptKeyword('create', 'drop', 'insert', 'copy', 'delete',
+                                     'update', 'select', 'explain', 'analyze', 'begin', 'commit', 'rollback')
+        if command == None:
+            raise SQL_PARSER_Exception("Неизвестная команда SQL '{0}' !".format(text))
+
+        if command in ('create', 'drop'):
+            kind, text = self.peek()
+            target = self.acceptKeyword('database', 'table', 'index')
+            if target == None:
+                raise SQL_PARSER_Exception("Неизвестная команда SQL '{0}' !".format(text))
+            command += ' ' + target
+
+        statement = getattr(self, STATEMENT_METHODS[command])()
+        statement['statement'] = command
+
+        if self.peek()[0] != 'end':
+            self.error('конец запроса')
+        return statement
+
+
+    def parseCreateDB(self):
+        '''
+            -- СОЗДАНИЕ БД
+            CREATE DATABASE database_name_1 [TEXT|PAGE]
+        '''
+
+        database_name = self.parseName('БД')
+        kind, text = self.peek()
+        storage = self.acceptKeyword('text', 'page')
+        if storage == None and kind != 'end':
+            raise SQL_PARSER_Exception("Неизвестный формат хранения БД '{0}' !".format(text))
+
+        return {
+            'database_name' : database_name,
+            'storage'       : storage
+        }
+
+
+    def parseDropDB(self):
+        '''
+            -- УДАЛЕНИЕ БД
+            DROP DATABASE database_name_1
+        '''
+
+        return {'database_name' : self.parseName('БД')}
+
+
+    def parseCreateTable(self):
+        '''
+            -- СОЗДАНИЕ ТАБЛИЦЫ
+            -- Если [null|not_null] не указан, то поумолчанию not_null
+            CREATE TABLE table_name_1 (
+                attr_name_1 type_name_1{integer|string} [null|not_null] [primary_key|unique],
+                ...
+            )
+        '''
+
+        table_name = self.parseName('таблицы')
+        self.expectPunct('(')
+        if self.peek() == ('punct', ')'):
+            raise SQL_PARSER_Exception("Схема таблицы '{0}' не может быть пустой !".format(table_name))
+
+        table_schema = []
+        while self.peek() != ('punct', ')'):
+            attr_name = self.parseName('поля')
+            # Проверка совпадения имён полей
+            for attr in table_schema:
+                if attr['name'] == attr_name:
+                    raise SQL_PARSER_Exception("Повторное использование имени поля '{0}' !".format(attr_name))
+            # Проверка правильности типов данных
+            kind, text = self.peek()
+            attr_type = self.acceptKeyword('integer', 'string')
+            if attr_type == None:
+                raise SQL_PARSER_Exception("Несуществующий тип '{0}' поля '{1}' !".format(text, attr_name))
+
+            # Атрибуты поля
+            attr = {
+                'primary key' : False,
+                'unique'      : False,
+                'null'        : False
+            }
+            while self.peek()[0] == 'name':
+                token = self.acceptKeyword('null', 'not_null', 'primary_key', 'unique')
+                if token == None:
+                    raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(self.peek()[1]))
+                if token == 'null':
+                    attr['null'] = True
+                elif token == 'primary_key':
+                    attr['primary key'] = True
+                elif token == 'unique':
+                    attr['unique'] = True
+            # Primary Key, Unique не могут быть Null
+            if attr['null'] and (attr['unique'] or attr['primary key']):
+                raise SQL_PARSER_Exception('Ошибка в синтаксисе SQL, потенцильный ключ не может быть null !')
+
+            table_schema.append({
+                'name' : attr_name,
+                'type' : attr_type,
+                'attr' : attr
+            })
+            if not self.acceptPunct(','):
+                break
+        self.expectPunct(')')
+
+        return {
+            'table_name'   : table_name,
+            'table_schema' : table_schema
+        }
+
+
+    def parseDropTable(self):
+        '''
+            -- УДАЛЕНИЕ ТАБЛИЦЫ
+            DROP TABLE table_name_1
+        '''
+
+        return {'table_name' : self.parseName('таблицы')}
+
+
+    def parseCreateIndex(self):
+        '''
+            -- СОЗДАНИЕ ИНДЕКСА
+            CREATE INDEX index_name_1 ON table_name_1 (attr_name_1)
+        '''
+
+        index_name = self.parseName('индекса')
+        self.expectKeyword('on')
+        table_name = self.parseName('таблицы')
+        self.expectPunct('(')
+        attr_name = self.parseName('поля')
+        self.expectPunct(')')
+
+        return {
+            'index_name' : index_name,
+            'table_name' : table_name,
+            'attr_name'  : attr_name
+        }
+
+
+    def parseDropIndex(self):
+        '''
+            -- УДАЛЕНИЕ ИНДЕКСА
+            DROP INDEX index_name_1
+        '''
+
+        return {'index_name' : self.parseName('индекса')}
+
+
+    def parseInsert(self):
+        '''
+            -- ВСТАВКА ЗАПИСЕЙ В ТАБЛИЦУ
+            INSERT INTO table_name_1
+                       (attr_name_1,  attr_name_2,  ...)
+                VALUES (attr_value_1, attr_value_2, ...)
+                       [, (attr_value_3, attr_value_4, ...) ...]
+        '''
+
+        self.expectKeyword('into')
+        table_name = self.parseName('таблицы')
+        attr_names = self.parseNames()
+        self.expectKeyword('values')
+
+        records = []
+        while True:
+            self.expectPunct('(')
+            attr_values = [self.parseValue()]
+            while self.acceptPunct(','):
+                attr_values.append(self.parseValue())
+            self.expectPunct(')')
+            if len(attr_values) != len(attr_names):
+                raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неправильный список значений полей '{0}' !".format(self.query))
+            records.append(dict(zip(attr_names, attr_values)))
+            if not self.acceptPunct(','):
+                break
+
+        return {
+            'table_name' : table_name,
+            'records'    : records
+        }
+
+
+    def parseCopy(self):
+        '''
+            -- МАССОВАЯ ЗАГРУЗКА ЗАПИСЕЙ ИЗ ФАЙЛА
+            COPY table_name_1 [(attr_name_1, attr_name_2, ...)]
+                FROM 'file_path' [CSV|JSONL]
+        '''
+
+        table_name = self.parseName('таблицы')
+        attr_names = self.parseNames() if self.peek() == ('punct', '(') else None
+        self.expectKeyword('from')
+        kind, path = self.next()
+        if kind != 'string':
+            self.pos -= 1
+            self.error('путь к файлу в кавычках')
+
+        kind, text = self.peek()
+        file_format = self.acceptKeyword('csv', 'jsonl')
+        if file_format == None and kind != 'end':
+            raise SQL_PARSER_Exception("Неизвестный формат файла '{0}' !".format(text))
+
+        return {
+            'table_name'  : table_name,
+            'attr_names'  : attr_names,
+            'path'        : path[1:-1],
+            'file_format' : file_format
+        }
+
+
+    def parseSimpleWhere(self):
+        '''
+            -- РАЗДЕЛ WHERE ОПЕРАТОРОВ DELETE И UPDATE
             [WHERE attr_name_1 {=|<>} value_1]
 
-        query - запрос на удаление записей
+            return - условие (см. sqldb.delete) или None
+        '''
 
-        return None
-    '''
+        if self.acceptKeyword('where') == None:
+            return None
 
-    # Разбить запрос на части
-    pattern = r'^\s*(\w{6})\s+(\w{4})\s+(\S+)(?:\s+(\w{5})\s+(\S+?)\b\s*(\S+?)\s*(\'.*\'|\w[\w\d_]*))\s*$'
-    try:
-        _, from_, table_name, where_, attr_name, operator, attr_value = re.findall(pattern, query,  re.I | re.M)[0]
-    except (ValueError, IndexError):
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
+        return {
+            'attr_name' : self.parseName('поля'),
+            'operator'  : self.expectOperator('=', '<>'),
+            'value'     : self.parseValue()
+        }
 
-    if from_.lower() != 'from':
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(from_))
 
-    if not isNameOk(table_name):
-        raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table_name))
+    def parseDelete(self):
+        '''
+            -- УДАЛЕНИЕ ЗАПИСЕЙ
+            DELETE FROM table_name_1
+                [WHERE attr_name_1 {=|<>} value_1]
+        '''
 
-    # Проверка правильности раздела WHERE
-    where = None
-    if where_ != '':
-        if where_.lower() != 'where':
-            raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(where_))
-        if not isNameOk(attr_name):
-            raise SQL_PARSER_Exception("Недопустимое имя поля '{0}' !".format(attr_name))
-        if operator not in ['=', '<>']:
-            raise SQL_PARSER_Exception("Несуществующий оператор '{0}' !".format(operator))
-        if not re.search(r'^\'.*\'|\w[\w\d_]*$', attr_value, re.I | re.M):
-            raise SQL_PARSER_Exception("Недопустимое значение '{0}' !".format(attr_value))
-        where = {
-            'attr_name' : attr_name,
-            'operator'  : operator,
-            'value'     : attr_value
+        self.expectKeyword('from')
+        return {
+            'table_name' : self.parseName('таблицы'),
+            'where'      : self.parseSimpleWhere()
         }
 
-    # Выполнить запрос
-    sqldb.delete(table_name, where)
 
+    def parseUpdate(self):
+        '''
+            -- ОБНОВЛЕНИЕ ЗАПИСЕЙ
+            UPDATE table_name_1
+                SET attr_name_1 {=|*=|+=|-=|/=} value_1
+                [WHERE attr_name2 {=|<>} value_2]
+        '''
+
+        table_name = self.parseName('таблицы')
+        self.expectKeyword('set')
+        set_value = {
+            'attr_name' : self.parseName('поля'),
+            'operator'  : self.expectOperator('=', '*=', '+=', '-=', '/='),
+            'dvalue'    : self.parseValue()
+        }
 
+        return {
+            'table_name' : table_name,
+            'set'        : set_value,
+            'where'      : self.parseSimpleWhere()
+        }
 
-def update(query):
-    '''
-        -- ОБНОВЛЕНИЕ ЗАПИСЕЙ
-        -- Если опустить WHERE, все записи в таблице будут обновлены
-        -- Ограничение: раздел SET может иметь только 1 поле,
-                        допустимые операции: =, *=, +=, /=, -= (умножить, увеличить... на какое-то число)
-                        для string только =
-                        для integer все
-        UPDATE table_name_1 
-            SET attr_name_1 += value_1
-            [WHERE attr_name2 = value_2]
 
-        query - запрос на удаление записей
+    def parseSelect(self):
+        '''
+            -- ВЫБОРКА ЗАПИСЕЙ
+            SELECT table_name1.attr_name_1, ...
+            FROM table_name_1
+            [INNER JOIN table_name_2
+                ON table_name_1.attr_name_2 = table_name_2.attr_name_2]
+            [WHERE ...]
+
+            -- ЧИСЛО ЗАПИСЕЙ ТАБЛИЦЫ
+            SELECT COUNT(*) FROM table_name_1
+
+            return - части запроса: 'tables', 'on', 'where' - аргументы sqldb.select,
+                     для COUNT(*) - 'count' - имя таблицы
+        '''
+
+        # COUNT(*), а не поле таблицы count
+        if self.peek()[0] == 'name' and self.peek()[1].lower() == 'count' and\
+           self.tokens[self.pos+1:self.pos+2] == [('punct', '(')]:
+            self.pos += 2
+            self.expectPunct('*')
+            self.expectPunct(')')
+            self.expectKeyword('from')
+            return {'count' : self.parseName('таблицы')}
+
+        # Имена выбираемых полей по таблицам
+        attrs = {}
+        while True:
+            table_name, attr_name = self.parseAttrName()
+            attrs.setdefault(table_name, []).append(table_name + '.' + attr_name)
+            if not self.acceptPunct(','):
+                break
+        if self.acceptKeyword('from') == None:
+            raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, отсутсвует раздел FROM !")
+        table_names = {self.parseName('таблицы')}
+
+        # Раздел(ы) INNER JOIN
+        on = []
+        while self.acceptKeyword('inner') != None:
+            self.expectKeyword('join')
+            table_names.add(self.parseName('таблицы'))
+            self.expectKeyword('on')
+            attr1_name = '.'.join(self.parseAttrName())
+            if self.peek() != ('operator', '='):
+                raise SQL_PARSER_Exception("Неизвестный оператор в разделе ON !")
+            self.pos += 1
+            attr2_name = '.'.join(self.parseAttrName())
+            on.append((attr1_name, attr2_name))
+
+        for table_name in attrs:
+            if table_name not in table_names:
+                raise SQL_PARSER_Exception("Неизвестное имя таблицы '{0}' !".format(table_name))
+
+        return {
+            'tables' : tuple({'table_name' : table_name, 'attrs' : tuple(attrs[table_name])}
+                             for table_name in attrs),
+            'on'     : None if on == [] else tuple(on),
+            'where'  : self.parseWhere() if self.acceptKeyword('where') != None else None
+        }
 
-        return None
-    '''
 
-    # Разбиваем запрос на части
-    pattern = r'^\s*(\w{6})\s+(\S+)\s+(\w{3})\s+(\S+?)\b\s*(\S+?)\s*((?:\'.*\'|\S+))(?:\s+(\w{5})\s+(\S+?)\b\s*(\S+?)\s*(\'.*\'|\S+))?\s*$'
-    try:
-        _, table_name, set_, set_attr_name, set_operator, set_attr_value,\
-        where_, where_attr_name, where_operator, where_attr_value = re.findall(pattern, query, re.I | re.M)[0]
-    except (ValueError, IndexError):
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-    if set_.lower() != 'set':
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(set_))
+    def parseExplain(self):
+        '''
+            -- ПЛАН ВЫБОРКИ
+            EXPLAIN SELECT ...
 
-    if not isNameOk(table_name):
-        raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table_name))
+            return - части запроса SELECT (см. parseSelect)
+        '''
 
-    if not isNameOk(set_attr_name):
-        raise SQL_PARSER_Exception("Недопустимое имя поля '{0}' !".format(set_attr_name))
+        self.expectKeyword('select')
+        statement = self.parseSelect()
+        if 'count' in statement:
+            raise SQL_PARSER_Exception("EXPLAIN для COUNT(*) не поддерживается !")
+        return statement
 
-    if set_operator not in ['=', '*=', '+=', '-=', '/=']:
-        raise SQL_PARSER_Exception("Несуществующий оператор '{0}' !".format(set_operator))
 
-    if not re.search(r'^\'.*\'|\w[\w\d_]*$', set_attr_value, re.I | re.M):
-        raise SQL_PARSER_Exception("Недопустимое значение '{0}' !".format(set_attr_value))
+    def parseAnalyze(self):
+        '''
+            -- СБОР СТАТИСТИКИ
+            ANALYZE [table_name_1]
+        '''
 
-    set_value = {
-        'attr_name' : set_attr_name,
-        'operator'  : set_operator,
-        'dvalue'    : set_attr_value
-    }
+        return {'table_name' : self.parseName('таблицы') if self.peek()[0] != 'end' else None}
+
+
+    def parseWhere(self):
+        '''
+            -- РАЗДЕЛ WHERE ОПЕРАТОРА SELECT
+            -- AND имеет больший приоритет, чем OR
+            table_name_1.attr_name_1 {=|<>|<|>} value_1
+                [{AND|OR} table_name_2.attr_name_2 {=|<>|<|>} value_2 ...]
+
+            return - условия в дизъюнктивной форме:
+                     группы условий, объединённые OR, внутри группы - AND
+                     пример:
+                     (
+                        (
+                            {
+                                'attr_name' : 'table_name_1.attr_name_1',
+                                'operator'  : '>',
+                                'value'     : '20'
+                            },
+                            { ... }
+                        ),
+                        ( ... )
+                     )
+        '''
+
+        groups = [self.parseConditions()]
+        while self.acceptKeyword('or') != None:
+            groups.append(self.parseConditions())
+
+        return tuple(groups)
+
+
+    def parseConditions(self):
+        '''
+            Группа условий, объединённых AND
+
+            return - кортеж условий (см. parseWhere)
+        '''
 
-    # Проверка правильности раздела WHERE
-    where = None
-    if where_ != '':
-        if where_.lower() != 'where':
-            raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(where_))
-        if not isNameOk(where_attr_name):
-            raise SQL_PARSER_Exception("Недопустимое имя поля '{0}' !".format(where_attr_name))
-        if where_operator not in ['=', '<>']:
-            raise SQL_PARSER_Exception("Несуществующий оператор '{0}' !".format(where_operator))
-        if not re.search(r'^\'.*\'|\w[\w\d_]*$', where_attr_value, re.I | re.M):
-            raise SQL_PARSER_Exception("Недопустимое значение '{0}' !".format(where_attr_value))
-        where = {
-            'attr_name' : where_attr_name,
-            'operator'  : where_operator,
-            'value'     : where_attr_value
+        conditions = [self.parseCondition()]
+        while self.acceptKeyword('and') != None:
+            conditions.append(self.parseCondition())
+
+        return tuple(conditions)
+
+
+    def parseCondition(self):
+        '''
+            Условие: table_name.attr_name {=|<>|<|>} value
+
+            return - условие (см. parseWhere)
+        '''
+
+        return {
+            'attr_name' : '.'.join(self.parseAttrName()),
+            'operator'  : self.expectOperator('=', '<>', '<', '>'),
+            'value'     : self.parseValue()
         }
 
-    # Выполнить запрос
-    sqldb.update(table_name, set_value, where)
+
+    def parseBegin(self):
+        '''
+            -- НАЧАЛО ТРАНЗАКЦИИ
+            BEGIN [TRANSACTION]
+        '''
+
+        self.acceptKeyword('transaction')
+        return {}
+
+
+    def parseEnd(self):
+        '''
+            -- ФИКСАЦИЯ И ОТКАТ ТРАНЗАКЦИИ
+            COMMIT
+            ROLLBACK
+        '''
+
+        return {}
+
+
+
+def planStatement(statement):
+    '''
+        Построение плана запроса по дереву запроса
+
+        statement - дерево запроса (см. Parser.parseStatement)
+
+        return - план запроса (см. planQuery)
+    '''
+
+    command = statement['statement']
+    if command == 'create database':
+        storage = {
+            None   : None,
+            'text' : sqldb.DB_STORAGE_TEXT,
+            'page' : sqldb.DB_STORAGE_PAGE
+        }[statement['storage']]
+        return sqldb.createDB, (statement['database_name'], storage)
+    elif command == 'drop database':
+        return sqldb.dropDB, (statement['database_name'],)
+    elif command == 'create table':
+        return sqldb.createTable, (statement['table_name'], statement['table_schema'])
+    elif command == 'drop table':
+        return sqldb.dropTable, (statement['table_name'],)
+    elif command == 'create index':
+        return sqldb.createIndex, (statement['index_name'], statement['table_name'], statement['attr_name'])
+    elif command == 'drop index':
+        return sqldb.dropIndex, (statement['index_name'],)
+    elif command == 'insert':
+        return sqldb.insertRecords, (statement['table_name'], tuple(statement['records']))
+    elif command == 'copy':
+        file_format = {
+            None    : None,
+            'csv'   : sqldb.LOAD_FORMAT_CSV,
+            'jsonl' : sqldb.LOAD_FORMAT_JSONL
+        }[statement['file_format']]
+        return sqldb.load, (statement['table_name'], statement['path'], file_format, statement['attr_names'])
+    elif command == 'delete':
+        return sqldb.delete, (statement['table_name'], statement['where'])
+    elif command == 'update':
+        return sqldb.update, (statement['table_name'], statement['set'], statement['where'])
+    elif command == 'select' and 'count' in statement:
+        return sqldb.count, (statement['count'],)
+    elif command == 'select':
+        return sqldb.select, (statement['tables'], statement['on'], statement['where'])
+    elif command == 'explain':
+        return sqldb.explain, (statement['tables'], statement['on'], statement['where'])
+    elif command == 'analyze':
+        return sqldb.analyze, (statement['table_name'],)
+    elif command == 'begin':
+        return sqldb.begin, ()
+    elif command == 'commit':
+        return sqldb.commit, ()
+    else:
+        return rollbackTransaction, ()
+
+
+
+def rollbackTransaction():
+    '''
+        Откат явной транзакции, пакет запросов не отменяется, а фиксируется
+
+        return None
+    '''
+
+    if sqldb.session.transaction != None and not sqldb.session.transaction['isExplicit']:
+        sqldb.commit()
+    else:
+        sqldb.rollback()
 
 
 
@@ -570,7 +1297,8 @@ def select(query):
         -- ВЫБОРКА ЗАПИСЕЙ
         -- Допускается множественое объединение таблиц
         -- Имена полей записываются ввиде: table_name_1.attr_name_1
-        -- Ограничение: раздела WHERE нет
+        -- Условия раздела WHERE объединяются AND и OR (AND имеет больший приоритет),
+        -- допустимы операции: =, <>, <, >
         SELECT table_name1.attr_name_1, 
                table_name1.attr_name_2,
                table_name2.attr_name_2,
@@ -578,120 +1306,80 @@ def select(query):
         FROM table_name_1
         [INNER JOIN table_name_2 
             ON table_name_1.attr_name_2 = table_name_2.attr_name_2]
+        [WHERE table_name_1.attr_name_1 {=|<>|<|>} value_1
+            [{AND|OR} table_name_2.attr_name_2 {=|<>|<|>} value_2 ...]]
 
-        query - запрос на удаление записей
+        query - запрос на выборку записей
 
-        return None
+        return - результат выборки (см. sqldb.select)
     '''
 
-    try:
-        _, *other = [token.strip() for token in query.split()]
-        other = ' '.join(other)
-    except (ValueError, IndexError):
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-
-    # Парсинг имён выбираемых полей
-    attrs = {}
-    table_name = ''
-    attr_name = ''
-    i_prev = 0
-    for i_cur in range(len(other)):
-        # Если найден раздел FROM, конец отбора полей
-        if other[i_cur] == ',' or other[i_cur:i_cur+4].lower() == 'from':
-            try:
-                attr_name = other[i_prev:i_cur].strip()
-                table_name, attr_name = attr_name.split('.')
-            except:
-                raise SQL_PARSER_Exception("Неправильный список выбираемых полей '{0}' !".format(query))
-            if not isNameOk(table_name):
-                raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table_name))
-            if not isNameOk(attr_name):
-                raise SQL_PARSER_Exception("Недопустимое имя поля '{0}' !".format(attr_name))
-            if table_name not in attrs:
-                attrs[table_name] = { 
-                    'attrs' : [table_name+'.'+attr_name],
-                    'isOk'  : False
-                }
-            else:
-                attrs[table_name]['attrs'].append(table_name+'.'+attr_name)
-            if other[i_cur] == ',':   
-                i_prev = i_cur+1
-            else: 
-                other = other[i_cur+4:]
-                break    
-    else:
-        raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, отсутсвует раздел FROM !")
+    function, args = planQuery(query)
 
-    try:
-        table_name, *other = [token.strip() for token in other.split()]
-        other = ' '.join(other)
-    except (ValueError, IndexError):
-        raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-    if not isNameOk(table_name):
-        raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table_name))
-    if table_name in attrs:
-        attrs[table_name]['isOk'] = True
-
-    # Парсинг раздела(ов) INNER JOIN
-    on = []
-    while len(other) != 0:
-        try:
-            inner, join, *other = [token.strip() for token in other.split()]
-        except (ValueError, IndexError):
-            raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-        other = ' '.join(other)
-        if inner.lower() != 'inner':
-            raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(inner))
-        if join.lower() != 'join':
-            raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(join))
-        
-        try:
-            table_name, on_, *other = [token.strip() for token in other.split()]
-            other = ' '.join(other)
-        except (ValueError, IndexError):
-            raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-        if not isNameOk(table_name):
-            raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table_name))
-        if table_name in attrs:
-            attrs[table_name]['isOk'] = True
-        if on_.lower() != 'on':
-            raise SQL_PARSER_Exception("Ошибка в синтаксисе SQL, неизвестная команда '{0}' !".format(on_))
-        try:
-            index = other.index('=')
-            other = other[:index] + " = " + other[index+1:]
-        except (ValueError, IndexError):
-            raise SQL_PARSER_Exception("Неизвестный оператор в разделе ON !")
-        pattern = r'\s*(\S+)\b\s*(\S+?)\s*(\S+)\b'
-        try:
-            attr1_name, operator, attr2_name = re.findall(pattern, other, re.I | re.M)[0]
-        except (ValueError, IndexError):
-            raise SQL_PARSER_Exception("Неправильный синтаксис команды SQL '{0}' !".format(query))
-        other = other[other.index(attr2_name)+len(attr2_name):]
-        table1_name, attr1_name = attr1_name.split('.')
-        if not isNameOk(table1_name):
-            raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table1_name))
-        if not isNameOk(attr1_name):
-            raise SQL_PARSER_Exception("Недопустимое имя поля '{0}' !".format(attr1_name))
-        table2_name, attr2_name = attr2_name.split('.')
-        if not isNameOk(table2_name):
-            raise SQL_PARSER_Exception("Недопустимое имя таблицы '{0}' !".format(table2_name))
-        if not isNameOk(attr2_name):
-            raise SQL_PARSER_Exception("Недопустимое имя поля '{0}' !".format(attr2_name))
-        on.append((table1_name+'.'+attr1_name, table2_name+'.'+attr2_name))
-
-    for table_name in attrs:
-        if not attrs[table_name]['isOk']:
-            raise SQL_PARSER_Exception("Неизвестное имя таблицы '{0}' !".format(table_name))
-    
-    tables = []
-    for table_name in attrs:
-        tables.append({
-            'table_name' : table_name,
-            'attrs'      : tuple(attrs[table_name]['attrs'])
-        })
-    tables = tuple(tables)
-
-    on = None if on == [] else tuple(on)
+    # SELECT COUNT(*) выполняется без чтения записей
+    if function == sqldb.count:
+        return sqldb.count(*args)
 
     # Выполнить запрос
-    return sqldb.select(tables, on)
+    return sqldb.select(*args)
+
+
+
+def cursor(query):
+    '''
+        Построчная выборка записей
+
+        query - один запрос SELECT (см. select)
+
+        return - результат выборки (см. sqldb.selectCursor),
+                 в котором 'body' - генератор кортежей значений
+    '''
+
+    query = query.strip()
+    if query.endswith(';'):
+        query = query[:-1].strip()
+
+    if query == '' or query.split()[0].lower() != 'select':
+        raise SQL_PARSER_Exception("Ожидался один запрос SELECT !")
+
+    function, args = planQuery(query)
+    if function == sqldb.count:
+        return countCursor(args)
+
+    return sqldb.selectCursor(*args)
+
+
+
+def preparedCursor(statement, params):
+    '''
+        Построчная выборка записей подготовленным запросом
+
+        statement - подготовленный запрос SELECT (см. prepare)
+        params - значения параметров
+
+        return - результат выборки (см. sqldb.selectCursor)
+    '''
+
+    function, args = bindPlan(statement, params)
+    if function == sqldb.count:
+        return countCursor(args)
+    if function != sqldb.select:
+        raise SQL_PARSER_Exception("Ожидался один запрос SELECT !")
+
+    return sqldb.selectCursor(*args)
+
+
+
+def countCursor(args):
+    '''
+        Результат SELECT COUNT(*) для построчного получения
+
+        args - аргументы sqldb.count
+
+        return - результат выборки (см. sqldb.count),
+                 в котором 'body' - генератор кортежей значений
+    '''
+
+    result = sqldb.count(*args)
+    result['body'] = (record for record in result['body'])
+    return result
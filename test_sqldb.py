@@ -0,0 +1,149 @@
+'''
+    Проверки СУБД SQLMY с повторным открытием БД в новом процессе
+
+    Запуск:
+        python -m unittest test_sqldb
+'''
+
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+
+# Каталог модулей СУБД
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Строки со служебными символами формата записей текстовой БД и журнала
+AWKWARD_STRINGS = ('x), (y, z', 'a, (k, 5), (b', '((id, 9), (k, 1))', '{', '}', '#BODY', 'a\tb', '')
+
+
+
+
+
+
+def runSQL(directory, queries, database_name=None):
+    '''
+        Выполнение запросов в отдельном процессе, как при повторном открытии БД
+
+        directory - каталог БД
+        queries - SQL запросы, разделённые ;
+        database_name - имя выбираемой БД или None
+
+        return - результат запросов (repr)
+    '''
+
+    code = ('import sys; sys.path.insert(0, {0!r}); import sqlmy\n'
+            'print(repr(sqlmy.connect({1!r}).exec({2!r})))').format(PACKAGE_DIR, database_name, queries)
+    result = subprocess.run([sys.executable, '-c', code], cwd=directory,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    return result.stdout.strip()
+
+
+
+class ReopenTest(unittest.TestCase):
+    '''
+        БД, записанная одним процессом, открывается другим
+    '''
+
+    def checkAwkwardStrings(self, storage):
+        with tempfile.TemporaryDirectory() as directory:
+            values = ', '.join("({0}, '{1}')".format(i, value) for i, value in enumerate(AWKWARD_STRINGS))
+            runSQL(directory, 'CREATE DATABASE test {0}; '
+                              'CREATE TABLE t (id integer primary_key, s string unique); '
+                              'INSERT INTO t (id, s) VALUES {1};'.format(storage, values))
+            expected = repr([{'schema': ['t.id', 't.s'], 'body': list(enumerate(AWKWARD_STRINGS))}])
+
+            # Записи из журнала изменений
+            self.assertEqual(runSQL(directory, 'SELECT t.id, t.s FROM t;', 'test'), expected)
+            # Записи из файлов БД после переноса журнала (ANALYZE переносит журнал)
+            runSQL(directory, 'ANALYZE;', 'test')
+            self.assertEqual(runSQL(directory, 'SELECT t.id, t.s FROM t;', 'test'), expected)
+            self.assertEqual(runSQL(directory, "SELECT t.id FROM t WHERE t.s = 'x), (y, z';", 'test'),
+                             repr([{'schema': ['t.id'], 'body': [(0,)]}]))
+            # Уникальный индекс строится по файлам БД
+            with self.assertRaises(AssertionError):
+                runSQL(directory, "INSERT INTO t (id, s) VALUES (100, 'x), (y, z');", 'test')
+
+    def testAwkwardStringsText(self):
+        self.checkAwkwardStrings('TEXT')
+
+    def testAwkwardStringsPage(self):
+        self.checkAwkwardStrings('PAGE')
+
+    def testPageRecordSize(self):
+        with tempfile.TemporaryDirectory() as directory:
+            runSQL(directory, 'CREATE DATABASE test PAGE; '
+                              'CREATE TABLE t (id integer primary_key, s string null); '
+                              "INSERT INTO t (id, s) VALUES (1, 'a');")
+            big = 'x' * 5000
+            # Запись, которая не помещается на страницу, не попадает в журнал
+            for query in ("INSERT INTO t (id, s) VALUES (2, '{0}');", "UPDATE t SET s = '{0}' WHERE id = 1;"):
+                with self.assertRaises(AssertionError):
+                    runSQL(directory, query.format(big), 'test')
+            runSQL(directory, 'ANALYZE; DROP TABLE t;', 'test')
+
+    def testFailedCommit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            runSQL(directory, 'CREATE DATABASE test TEXT; '
+                              'CREATE TABLE t (id integer primary_key); '
+                              'INSERT INTO t (id) VALUES (1);')
+            # Запись, сброс которой на диск не удался, не остаётся в журнале
+            code = ('import sys; sys.path.insert(0, {0!r}); import sqldb, sqlmy\n'
+                    'def syncFile(db): raise OSError(5, "EIO")\n'
+                    'connection = sqlmy.connect("test")\n'
+                    'sqldb.syncFile, syncFile = syncFile, sqldb.syncFile\n'
+                    'try: connection.exec("INSERT INTO t (id) VALUES (2);")\n'
+                    'except sqlmy.SQLMY_Exception: pass\n'
+                    'sqldb.syncFile = syncFile\n'
+                    'connection.exec("INSERT INTO t (id) VALUES (3);")').format(PACKAGE_DIR)
+            subprocess.run([sys.executable, '-c', code], cwd=directory, check=True)
+            self.assertEqual(runSQL(directory, 'SELECT t.id FROM t;', 'test'),
+                             repr([{'schema': ['t.id'], 'body': [(1,), (3,)]}]))
+
+
+
+class ThreadTest(unittest.TestCase):
+    '''
+        Соединения разных потоков одного процесса
+    '''
+
+    def testConcurrentReads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            runSQL(directory, 'CREATE DATABASE test TEXT; '
+                              'CREATE TABLE t (id integer primary_key); '
+                              'INSERT INTO t (id) VALUES (1), (2);')
+            # Выборка одного потока остановлена внутри sqldb.select,
+            # пока выборка другого соединения не выполнится
+            code = ('import sys, threading; sys.path.insert(0, {0!r}); import sqldb, sqlmy\n'
+                    'select, started, finished = sqldb.select, threading.Event(), threading.Event()\n'
+                    'def blockedSelect(*args):\n'
+                    '    if threading.current_thread().name == "reader":\n'
+                    '        started.set()\n'
+                    '        assert finished.wait(10), "выборки выполняются по очереди"\n'
+                    '    return select(*args)\n'
+                    'sqldb.select = blockedSelect\n'
+                    'first, second, results = sqlmy.connect("test"), sqlmy.connect("test"), []\n'
+                    'reader = threading.Thread(target=lambda: results.append(first.exec("SELECT t.id FROM t;")),\n'
+                    '                          name="reader")\n'
+                    'reader.start()\n'
+                    'started.wait(10)\n'
+                    'results.append(second.exec("SELECT t.id FROM t;"))\n'
+                    'finished.set()\n'
+                    'reader.join()\n'
+                    'print(repr(results))').format(PACKAGE_DIR)
+            result = subprocess.run([sys.executable, '-c', code], cwd=directory,
+                                    capture_output=True, text=True, timeout=60)
+            self.assertEqual(result.stderr, '')
+            self.assertEqual(result.stdout.strip(), repr([[{'schema': ['t.id'], 'body': [(1,), (2,)]}]] * 2))
+
+
+
+if __name__ == '__main__':
+    unittest.main()